@@ -1,14 +1,26 @@
 import streamlit as st
-import tensorflow as tf
 import numpy as np
 from PIL import Image
 import plotly.graph_objects as go
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import time
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from cache_predicciones import CachePredicciones, huella_modelo, CARPETA_CACHE_PREDICCIONES
+import cargador_modelo
+import metricas
+import micro_lotes
 
 # CONFIGURACIÓN
 RUTA_MODELO = "models/modelo_frutas.h5"
 RUTA_ETIQUETAS = "models/etiquetas.txt"
 TAMANO_IMAGEN = (224, 224)
+TAMANO_LOTE = 32          # Imágenes por llamada al modelo al analizar varias a la vez
+COLUMNAS_MINIATURAS = 6
 
 # PÁGINA
 st.set_page_config(
@@ -51,26 +63,182 @@ st.markdown("""
 
 # UTILIDADES
 @st.cache_resource
+def iniciar_metricas():
+    """
+    Tiempos por etapa (METRICAS_LATENCIA=1): se guardan en metricas/app.json y
+    metricas/app.prom, y con METRICAS_PUERTO también se sirven por HTTP
+    """
+    registro = metricas.configurar("app")
+    if registro.activas and metricas.PUERTO_HTTP:
+        registro.servir_http(metricas.PUERTO_HTTP)
+    return registro
+
+registro_metricas = iniciar_metricas()
+
 def cargar_modelo():
-    return tf.keras.models.load_model(RUTA_MODELO)
+    # Usa models/modelo_frutas.tflite si existe (ver scripts/exportar_modelo.py).
+    # Lo llama el hilo de MicroLotes, no la sesión
+    with registro_metricas.medir("cargar_modelo"):
+        return cargador_modelo.cargar_modelo(RUTA_MODELO)
+
+@st.cache_resource(max_entries=1)
+def obtener_micro_lotes(version_modelo):
+    """
+    Hilo de inferencia compartido por todas las sesiones: junta en un solo
+    predict las imágenes que piden varios usuarios a la vez. Con otra versión
+    del modelo se crea uno nuevo; el anterior suelta su modelo al quedar inactivo
+    """
+    return micro_lotes.MicroLotes(cargar_modelo, lote_maximo=TAMANO_LOTE, registro=registro_metricas)
+
+def micro_lotes_actual():
+    ruta = cargador_modelo.ruta_artefacto(RUTA_MODELO)
+    return obtener_micro_lotes(huella_modelo(ruta) if os.path.exists(ruta) else "")
 
 @st.cache_data
 def cargar_clases():
+    # Las incrustadas en el .tflite exportado; con el modelo Keras, etiquetas.txt
+    clases = cargador_modelo.leer_clases(RUTA_MODELO, None)
+    if clases:
+        return clases
     with open(RUTA_ETIQUETAS, "r", encoding="utf-8") as f:
         return [line.strip() for line in f.readlines()]
 
-def procesar_imagen(imagen):
+@st.cache_resource
+def obtener_cache_predicciones():
+    """Caché de predicciones compartida por todas las sesiones de la app"""
+    return CachePredicciones(carpeta_disco=CARPETA_CACHE_PREDICCIONES)
+
+def clave_prediccion(cache, contenido):
+    """Clave de caché: bytes de la imagen + versión del modelo (mismo preprocesamiento que predecir.py)"""
+    ruta = cargador_modelo.ruta_artefacto(RUTA_MODELO)
+    if not os.path.exists(ruta):
+        return None
+    return cache.clave(contenido, huella_modelo(ruta, f"{TAMANO_IMAGEN[0]}x{TAMANO_IMAGEN[1]}"))
+
+def preparar_imagen(imagen):
+    """RGB y redimensionada a TAMANO_IMAGEN ('nearest', como en el entrenamiento), como arreglo uint8"""
     if imagen.mode != "RGB":
         imagen = imagen.convert("RGB")
-    imagen = imagen.resize(TAMANO_IMAGEN)
-    img_array = np.array(imagen) / 255.0
-    img_array = np.expand_dims(img_array, axis=0)
+    return np.array(imagen.resize(TAMANO_IMAGEN, Image.NEAREST))
+
+def procesar_imagen(imagen):
+    with registro_metricas.medir("procesar_imagen"):
+        # Lote de una imagen uint8: el modelo normaliza por dentro
+        img_array = np.expand_dims(preparar_imagen(imagen), axis=0)
     return img_array
 
 def separar_clase(nombre):
     fruta, estado = nombre.split("_")
     return fruta.capitalize(), estado.capitalize()
 
+# ANÁLISIS DE VARIAS IMÁGENES
+def leer_archivo_lote(archivo, cache):
+    """
+    Busca una imagen subida en la caché o la decodifica (se ejecuta en un pool de hilos).
+    Devuelve (clave, probabilidades_en_cache, imagen uint8, error).
+    """
+    try:
+        contenido = archivo.getvalue()
+        clave = clave_prediccion(cache, contenido)
+        probs = cache.obtener(clave) if clave else None
+        if probs is not None:
+            return clave, probs, None, None
+        with registro_metricas.medir("procesar_imagen"), Image.open(BytesIO(contenido)) as imagen:
+            return clave, None, preparar_imagen(imagen), None
+    except Exception as e:
+        return None, None, None, str(e)
+
+def predecir_lote(archivos, clases):
+    """
+    Analiza varias imágenes con pocas llamadas al modelo: se decodifican en
+    paralelo, se apilan y se predicen de TAMANO_LOTE en TAMANO_LOTE. Las que
+    ya están en la caché de predicciones no pasan por el modelo.
+    """
+    inicio = time.perf_counter()
+    cache = obtener_cache_predicciones()
+    with ThreadPoolExecutor() as pool:
+        leidas = list(pool.map(lambda a: leer_archivo_lote(a, cache), archivos))
+
+    probabilidades = [probs for _, probs, _, _ in leidas]
+    registro_metricas.contar("aciertos_cache", sum(probs is not None for probs in probabilidades))
+    pendientes = [i for i, (_, probs, img, _) in enumerate(leidas) if probs is None and img is not None]
+    if pendientes:
+        # Se encolan todos los bloques a la vez; el hilo compartido los predice
+        # junto con lo que pidan las demás sesiones
+        lotes = micro_lotes_actual()
+        futuros = []
+        for desde in range(0, len(pendientes), TAMANO_LOTE):
+            indices = pendientes[desde:desde + TAMANO_LOTE]
+            futuros.append((indices, lotes.enviar(np.stack([leidas[i][2] for i in indices]))))
+        for indices, futuro in futuros:
+            for i, probs in zip(indices, futuro.result()):
+                probabilidades[i] = probs
+                if leidas[i][0]:
+                    cache.guardar(leidas[i][0], probs)
+
+    filas = []
+    for archivo, probs, (_, _, _, error) in zip(archivos, probabilidades, leidas):
+        if probs is None:
+            filas.append({"Archivo": archivo.name, "Clase": "error", "Fruta": None, "Estado": None,
+                          "Confianza (%)": None, "Error": error})
+            continue
+        idx = int(np.argmax(probs))
+        fruta, estado = separar_clase(clases[idx])
+        filas.append({
+            "Archivo": archivo.name,
+            "Clase": clases[idx],
+            "Fruta": fruta,
+            "Estado": estado,
+            "Confianza (%)": round(float(probs[idx]) * 100, 2),
+        })
+
+    return {
+        "filas": filas,
+        "segundos": time.perf_counter() - inicio,
+        "predichas": len(pendientes),
+        "desde_cache": sum(probs is not None for _, probs, _, _ in leidas),
+    }
+
+def mostrar_resultados_lote(lote, archivos):
+    """Resumen, conteo por clase, tabla ordenable y miniaturas opcionales"""
+    st.markdown("---")
+    st.markdown("## 📊 Resultados")
+
+    filas = lote["filas"]
+    tabla = pd.DataFrame(filas)
+    validas = tabla[tabla["Clase"] != "error"]
+    velocidad = len(filas) / lote["segundos"] if lote["segundos"] > 0 else 0
+    st.success(f"✅ {len(validas)} de {len(filas)} imágenes analizadas en {lote['segundos']:.2f} s "
+               f"({velocidad:.0f} imágenes/s, {lote['desde_cache']} desde la caché)")
+
+    # Cuántas imágenes hay de cada clase (p. ej. cuántas papaya_podrida)
+    st.markdown("### 🧮 Conteo por Clase")
+    conteo = validas["Clase"].value_counts().rename_axis("Clase").reset_index(name="Imágenes")
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.dataframe(conteo, use_container_width=True, hide_index=True)
+    with col2:
+        st.bar_chart(conteo, x="Clase", y="Imágenes")
+
+    # Tabla (se ordena haciendo clic en el encabezado de cada columna)
+    st.markdown("### 📋 Detalle")
+    st.dataframe(tabla, use_container_width=True, hide_index=True)
+    st.download_button("⬇️ Descargar resultados (CSV)", tabla.to_csv(index=False).encode("utf-8"),
+                       file_name="resultados.csv", mime="text/csv")
+
+    if st.checkbox("🖼️ Mostrar miniaturas"):
+        for desde in range(0, len(archivos), COLUMNAS_MINIATURAS):
+            columnas = st.columns(COLUMNAS_MINIATURAS)
+            for columna, archivo, fila in zip(columnas, archivos[desde:], filas[desde:]):
+                with columna:
+                    if fila["Clase"] == "error":
+                        st.caption(f"❌ {archivo.name}")
+                        continue
+                    miniatura = Image.open(archivo)
+                    miniatura.thumbnail((200, 200))
+                    emoji = obtener_emoji_fruta(fila["Fruta"])
+                    st.image(miniatura, caption=f"{emoji} {fila['Estado']} ({fila['Confianza (%)']:.0f}%)")
+
 # Mapeo de frutas a emojis
 def obtener_emoji_fruta(fruta):
     """Retorna el emoji correspondiente a cada fruta"""
@@ -189,15 +357,23 @@ if "resultado" not in st.session_state:
     st.session_state.resultado = None
 if "uploader_key" not in st.session_state:
     st.session_state.uploader_key = 0
+if "resultados_lote" not in st.session_state:
+    st.session_state.resultados_lote = None
+if "firma_lote" not in st.session_state:
+    st.session_state.firma_lote = None
 
 # CARGA
 st.subheader("📤 Cargar Imagen")
 
-archivo = st.file_uploader(
-    "Selecciona una imagen de fruta",
+archivos = st.file_uploader(
+    "Selecciona una o varias imágenes de fruta",
     type=["jpg", "jpeg", "png"],
+    accept_multiple_files=True,
+    help="Con varias imágenes se analizan todas juntas",
     key=f"uploader_{st.session_state.uploader_key}"
 )
+# Una sola imagen: resultado detallado. Varias: análisis por lotes (más abajo)
+archivo = archivos[0] if len(archivos) == 1 else None
 
 # Limpiar resultados cuando se elimina la imagen del uploader
 if archivo is None and st.session_state.imagen is not None:
@@ -206,7 +382,8 @@ if archivo is None and st.session_state.imagen is not None:
     st.rerun()
 
 if archivo:
-    imagen = Image.open(archivo)
+    with registro_metricas.medir("abrir_imagen"):
+        imagen = Image.open(archivo)
     st.session_state.imagen = imagen
     st.session_state.resultado = None
 
@@ -222,11 +399,24 @@ if archivo:
     with col_btn1:
         if st.button("🔮 Predecir", use_container_width=True):
             with st.spinner("🤖 Analizando imagen..."):
-                modelo = cargar_modelo()
                 clases = cargar_clases()
-                img_array = procesar_imagen(imagen)
 
-                probs = modelo.predict(img_array, verbose=0)[0]
+                # La misma imagen con el mismo modelo no se vuelve a predecir
+                with registro_metricas.medir("cache"):
+                    cache = obtener_cache_predicciones()
+                    clave = clave_prediccion(cache, archivo.getvalue())
+                    probs = cache.obtener(clave) if clave else None
+
+                if probs is None:
+                    img_array = procesar_imagen(imagen)
+                    # Espera a que el hilo compartido la incluya en un lote
+                    with registro_metricas.medir("predict"):
+                        probs = micro_lotes_actual().predecir(img_array)[0]
+                    if clave:
+                        cache.guardar(clave, probs)
+                else:
+                    registro_metricas.contar("aciertos_cache")
+
                 idx = np.argmax(probs)
 
                 fruta, estado = separar_clase(clases[idx])
@@ -270,9 +460,41 @@ if st.session_state.resultado:
     st.markdown(" ")
     st.markdown("### 📈 Distribución de Probabilidades (Top 5)")
     
-    fig = grafica_top5_barras(r["clases"], r["probs"])
+    with registro_metricas.medir("grafica"):
+        fig = grafica_top5_barras(r["clases"], r["probs"])
     st.plotly_chart(fig, use_container_width=True)
 
+# VARIAS IMÁGENES
+if len(archivos) > 1:
+    # Limpiar resultados anteriores si cambió el conjunto de imágenes
+    firma = tuple((a.name, a.size) for a in archivos)
+    if st.session_state.firma_lote != firma:
+        st.session_state.resultados_lote = None
+        st.session_state.firma_lote = firma
+
+    st.subheader(f"🖼️ {len(archivos)} imágenes seleccionadas")
+    st.subheader("🎯 Acciones")
+
+    col_btn1, col_btn2 = st.columns(2)
+
+    with col_btn1:
+        if st.button("🔮 Predecir todas", use_container_width=True):
+            with st.spinner(f"🤖 Analizando {len(archivos)} imágenes..."):
+                st.session_state.resultados_lote = predecir_lote(archivos, cargar_clases())
+
+    with col_btn2:
+        if st.button("🔄 Escoger otras", use_container_width=True):
+            st.session_state.resultados_lote = None
+            st.session_state.firma_lote = None
+            st.session_state.uploader_key += 1
+            st.rerun()
+
+    if st.session_state.resultados_lote is not None:
+        mostrar_resultados_lote(st.session_state.resultados_lote, archivos)
+
 # MENSAJE INICIAL
-if not archivo and st.session_state.imagen is None:
+if not archivos and st.session_state.imagen is None:
     st.info("👆 Carga una imagen de una fruta para comenzar.")
+
+# Tiempos por etapa hasta ahora (no hace nada si las métricas están desactivadas)
+registro_metricas.guardar()
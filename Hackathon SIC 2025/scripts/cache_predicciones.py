@@ -0,0 +1,153 @@
+"""
+Caché de predicciones indexada por el contenido de la imagen.
+
+La clave es un hash de los bytes de la imagen más la huella del modelo
+(ruta, tamaño y fecha de modificación del archivo), así que la caché deja de
+coincidir sola cuando se reentrena o reemplaza el modelo. Tiene dos niveles:
+un LRU en memoria y, opcionalmente, una carpeta en disco con límite de tamaño
+(se borran primero los archivos usados hace más tiempo).
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+CARPETA_CACHE_PREDICCIONES = "cache/predicciones"
+CAPACIDAD_MEMORIA = 1024
+TAMAÑO_MAX_DISCO_MB = 50
+
+
+def huella_modelo(ruta_modelo, extra=''):
+    """Identifica la versión del modelo sin leerlo: ruta, tamaño y fecha de cada archivo"""
+    if os.path.isdir(ruta_modelo):
+        archivos = sorted(
+            os.path.join(raiz, nombre)
+            for raiz, _, nombres in os.walk(ruta_modelo) for nombre in nombres
+        )
+    else:
+        archivos = [ruta_modelo]
+    partes = [extra]
+    for archivo in archivos:
+        info = os.stat(archivo)
+        partes.append(f"{os.path.abspath(archivo)}|{info.st_size}|{info.st_mtime_ns}")
+    return '\n'.join(partes)
+
+
+class CachePredicciones:
+    """LRU en memoria + nivel opcional en disco para vectores de probabilidades"""
+
+    def __init__(self, capacidad=CAPACIDAD_MEMORIA, carpeta_disco=None, tamaño_max_disco_mb=TAMAÑO_MAX_DISCO_MB):
+        self.capacidad = capacidad
+        self.memoria = OrderedDict()
+        self.bloqueo = threading.Lock()
+        self.carpeta_disco = carpeta_disco
+        self.tamaño_max_disco = int(tamaño_max_disco_mb * 1024 * 1024)
+        self.aciertos = 0
+        self.fallos = 0
+        # Se calcula al guardar por primera vez: recorrer la carpeta al crear la
+        # caché retrasaría el arranque aunque solo se vayan a leer resultados
+        self.tamaño_disco = None
+
+    @staticmethod
+    def clave(contenido, huella):
+        """Hash de los bytes de la imagen junto con la huella del modelo"""
+        h = hashlib.blake2b(digest_size=20)
+        h.update(huella.encode('utf-8'))
+        h.update(b'\0')
+        h.update(contenido)
+        return h.hexdigest()
+
+    def obtener(self, clave):
+        """Probabilidades guardadas para la clave, o None"""
+        with self.bloqueo:
+            if clave in self.memoria:
+                self.memoria.move_to_end(clave)
+                self.aciertos += 1
+                return self.memoria[clave]
+
+        if self.carpeta_disco:
+            ruta = self._ruta_disco(clave)
+            try:
+                probabilidades = np.load(ruta)
+                os.utime(ruta)  # Marca el archivo como usado recientemente
+            except (OSError, ValueError):
+                probabilidades = None
+            if probabilidades is not None:
+                self._guardar_memoria(clave, probabilidades)
+                with self.bloqueo:
+                    self.aciertos += 1
+                return probabilidades
+
+        with self.bloqueo:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave, probabilidades):
+        probabilidades = np.asarray(probabilidades, dtype=np.float32)
+        self._guardar_memoria(clave, probabilidades)
+        if self.carpeta_disco:
+            ruta = self._ruta_disco(clave)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            if self.tamaño_disco is None:
+                self.tamaño_disco = sum(os.path.getsize(r) for r in self._archivos_disco())
+            try:
+                anterior = os.path.getsize(ruta)  # Al sobrescribir se descuenta el archivo viejo
+            except OSError:
+                anterior = 0
+            ruta_tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(ruta_tmp, 'wb') as f:
+                np.save(f, probabilidades)
+            os.replace(ruta_tmp, ruta)
+            with self.bloqueo:
+                self.tamaño_disco += os.path.getsize(ruta) - anterior
+                excedido = self.tamaño_disco > self.tamaño_max_disco
+            if excedido:
+                self._desalojar_disco()
+
+    def _guardar_memoria(self, clave, probabilidades):
+        with self.bloqueo:
+            self.memoria[clave] = probabilidades
+            self.memoria.move_to_end(clave)
+            while len(self.memoria) > self.capacidad:
+                self.memoria.popitem(last=False)
+
+    def _ruta_disco(self, clave):
+        return os.path.join(self.carpeta_disco, clave[:2], f"{clave}.npy")
+
+    def _archivos_disco(self):
+        for raiz, _, nombres in os.walk(self.carpeta_disco):
+            for nombre in nombres:
+                if nombre.endswith('.npy'):
+                    yield os.path.join(raiz, nombre)
+
+    def _desalojar_disco(self):
+        """Borra los archivos usados hace más tiempo hasta quedar en el 90% del límite"""
+        archivos = []
+        for ruta in self._archivos_disco():
+            try:
+                info = os.stat(ruta)
+                archivos.append((info.st_mtime, info.st_size, ruta))
+            except OSError:
+                continue
+        total = sum(tamaño for _, tamaño, _ in archivos)
+        for _, tamaño, ruta in sorted(archivos):
+            if total <= 0.9 * self.tamaño_max_disco:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamaño
+            except OSError:
+                pass
+        with self.bloqueo:
+            self.tamaño_disco = total
+
+    def estadisticas(self):
+        with self.bloqueo:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'en_memoria': len(self.memoria),
+                'disco_mb': round((self.tamaño_disco or 0) / (1024 * 1024), 2),
+            }
@@ -0,0 +1,300 @@
+"""
+Clasificación en tiempo real desde un video o una cámara (por ejemplo, la
+cámara de una cinta transportadora).
+
+Dos hilos: el de decodificación lee los cuadros con OpenCV, los pasa a RGB y
+los redimensiona al tamaño del modelo; el principal los predice. Entre ambos hay
+una ranura de un solo cuadro en lugar de una cola: si la inferencia va más lenta
+que la fuente, el cuadro que esperaba se reemplaza por el más nuevo, así que la
+latencia no crece aunque el modelo no dé abasto. Si va más rápida que
+FPS_OBJETIVO, el decodificador solo deja pasar un cuadro cada 1/FPS_OBJETIVO
+segundos y el resto se salta sin redimensionarlo.
+
+Las probabilidades se suavizan con una media exponencial cuya constante de
+tiempo es SUAVIZADO_S: como depende del tiempo entre cuadros y no de cuántos se
+clasifican, la etiqueta responde igual de rápido aunque se salten cuadros.
+
+La latencia de extremo a extremo va desde que se leyó el cuadro hasta que se
+tiene su predicción suavizada. Un archivo de video se entrega por defecto a su
+velocidad original, como si fuera una cámara (sirve para probar sin conexión
+el comportamiento real); con --sin-pausa se decodifica lo más rápido posible y
+se clasifican todos los cuadros, para medir el máximo sostenido.
+
+Uso:
+    python scripts/clasificar_video.py cinta.mp4
+    python scripts/clasificar_video.py cinta.mp4 --fps 10 --suavizado 0.5
+    python scripts/clasificar_video.py cinta.mp4 --sin-pausa
+    python scripts/clasificar_video.py 0 --mostrar      # cámara 0, con ventana ('q' para salir)
+"""
+import numpy as np
+import threading
+import argparse
+import time
+import math
+import sys
+import os
+from collections import Counter
+import cv2
+from PIL import Image
+import metricas
+import predecir
+
+# CONFIGURACIÓN
+FPS_OBJETIVO = 15         # Cuadros por segundo que se intentan clasificar (0: todos los que se pueda)
+SUAVIZADO_S = 0.3         # Constante de tiempo de la media exponencial en segundos (0: sin suavizar)
+FPS_CAMARA = 30.0         # Si la fuente no informa sus FPS
+INTERVALO_REPORTE_S = 1.0
+
+
+class Ranura:
+    """
+    Un solo cuadro pendiente entre el decodificador y la inferencia. Sin
+    `bloqueante`, poner() reemplaza el cuadro que no se alcanzó a tomar; con
+    `bloqueante`, espera a que se tome (no se pierde ninguno).
+    """
+
+    def __init__(self, bloqueante=False):
+        self.condicion = threading.Condition()
+        self.bloqueante = bloqueante
+        self.cuadro = None
+        self.cerrada = False
+        self.descartados = 0
+
+    def poner(self, cuadro):
+        with self.condicion:
+            while self.bloqueante and self.cuadro is not None and not self.cerrada:
+                self.condicion.wait()
+            if self.cuadro is not None:
+                self.descartados += 1
+            self.cuadro = cuadro
+            self.condicion.notify_all()
+
+    def tomar(self):
+        """El siguiente cuadro, o None cuando ya no llegarán más"""
+        with self.condicion:
+            while self.cuadro is None and not self.cerrada:
+                self.condicion.wait()
+            cuadro, self.cuadro = self.cuadro, None
+            self.condicion.notify_all()
+            return cuadro
+
+    def cerrar(self):
+        """Lo llama el decodificador al terminar la fuente, o la inferencia para detenerlo"""
+        with self.condicion:
+            self.cerrada = True
+            self.condicion.notify_all()
+
+
+class Suavizador:
+    """Media exponencial de las probabilidades con una constante de tiempo en segundos"""
+
+    def __init__(self, constante_s=SUAVIZADO_S):
+        self.constante = constante_s
+        self.media = None
+        self.anterior = None
+
+    def actualizar(self, probabilidades, tiempo):
+        if self.media is None or not self.constante:
+            self.media = np.array(probabilidades, dtype=np.float32)
+        else:
+            # Peso de la historia según el tiempo transcurrido, no el número de cuadros
+            peso = math.exp(-(tiempo - self.anterior) / self.constante)
+            self.media = peso * self.media + (1 - peso) * probabilidades
+        self.anterior = tiempo
+        return self.media
+
+
+def decodificar(captura, ranura, fps_objetivo, fps_fuente, camara, pausar, contadores):
+    """
+    Hilo de decodificación: lee, salta los cuadros que sobran para FPS
+    objetivo y deja el resto en la ranura como (índice, instante de lectura,
+    tiempo en el video, imagen RGB del tamaño del modelo, cuadro BGR original)
+    """
+    periodo = 1 / fps_objetivo if fps_objetivo else 0
+    tolerancia = 0.5 / fps_fuente  # Medio cuadro de la fuente
+    alto, ancho = predecir.TAMAÑO_IMAGEN
+    inicio = time.perf_counter()
+    siguiente = None  # Instante a partir del cual pasa el próximo cuadro
+    indice = 0
+    try:
+        while not ranura.cerrada:
+            ok, bgr = captura.read()
+            if not ok:
+                break
+            indice += 1
+            leido = time.perf_counter()
+            if pausar:
+                # Un archivo se entrega al ritmo de sus FPS, como lo haría una cámara
+                espera = inicio + indice / fps_fuente - leido
+                if espera > 0:
+                    time.sleep(espera)
+                    leido = time.perf_counter()
+            # Con una cámara vale el reloj; con un archivo, la posición en el video
+            tiempo = leido if camara else indice / fps_fuente
+            if periodo and siguiente is not None and tiempo + tolerancia < siguiente:
+                contadores["saltados"] += 1
+                continue
+            # La cuadrícula empieza en el primer cuadro (su tiempo no es 0 en una cámara)
+            siguiente = tiempo + periodo if siguiente is None else max(siguiente + periodo, tiempo)
+            with metricas.registro.medir("procesar_imagen"):
+                # Mismo redimensionado 'nearest' de PIL que datos.leer_imagen_uint8 en el
+                # entrenamiento (el INTER_NEAREST de OpenCV elige otros píxeles)
+                imagen = Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+                rgb = np.asarray(imagen.resize((ancho, alto), Image.NEAREST))
+            ranura.poner((indice, leido, tiempo, rgb, bgr))
+    finally:
+        contadores["leidos"] = indice
+        ranura.cerrar()
+
+
+def dibujar(bgr, texto, fps):
+    cv2.putText(bgr, texto, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    cv2.putText(bgr, f"{fps:.1f} FPS", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 1)
+
+
+def clasificar_video(fuente, fps_objetivo=FPS_OBJETIVO, suavizado_s=SUAVIZADO_S, tiempo_real=True,
+                     mostrar=False, max_cuadros=None):
+    """
+    Clasifica un video o una cámara (número de dispositivo) hasta que termina,
+    se llega a `max_cuadros` clasificados o se pulsa 'q' en la ventana
+
+    Returns:
+        dict: cuadros leídos, clasificados, saltados y descartados, FPS
+        sostenidos, latencias p50/p95/máx en ms y cuadros por clase;
+        None si no se pudo abrir la fuente o cargar el modelo
+    """
+    modelo = predecir.cargar_modelo()
+    if modelo is None:
+        return None
+    clases = predecir.obtener_clases()
+
+    camara = str(fuente).isdigit()
+    captura = cv2.VideoCapture(int(fuente) if camara else fuente)
+    if not captura.isOpened():
+        print(f"ERROR: No se pudo abrir {'la cámara' if camara else 'el video'} {fuente}")
+        return None
+    fps_fuente = captura.get(cv2.CAP_PROP_FPS) or FPS_CAMARA
+    # --sin-pausa solo tiene sentido con un archivo: una cámara no espera a nadie
+    pausar = tiempo_real and not camara
+    bloqueante = not tiempo_real and not camara
+    if bloqueante:
+        fps_objetivo = 0
+
+    # La primera predicción incluye inicializaciones: no debe contar como latencia
+    modelo.predict_on_batch(np.zeros((1,) + predecir.TAMAÑO_IMAGEN + (3,), dtype=np.uint8))
+
+    print(f"Fuente: {'cámara ' if camara else ''}{fuente} ({fps_fuente:.1f} FPS)")
+    print(f"FPS objetivo: {fps_objetivo or 'todos'} | suavizado: {suavizado_s} s"
+          f"{' | sin pausa' if bloqueante else ''}")
+    print("-" * 70)
+
+    ranura = Ranura(bloqueante)
+    contadores = {"leidos": 0, "saltados": 0}
+    hilo = threading.Thread(target=decodificar, name="decodificar", daemon=True,
+                            args=(captura, ranura, fps_objetivo, fps_fuente, camara, pausar, contadores))
+    suavizador = Suavizador(suavizado_s)
+    latencias = []
+    por_clase = Counter()
+    inicio = time.perf_counter()
+    ultimo_reporte, clasificados_reporte = inicio, 0
+    hilo.start()
+    try:
+        while True:
+            cuadro = ranura.tomar()
+            if cuadro is None:
+                break
+            _, leido, tiempo, rgb, bgr = cuadro
+            with metricas.registro.medir("predict"):
+                probabilidades = np.asarray(modelo.predict_on_batch(rgb[np.newaxis]))[0]
+            suaves = suavizador.actualizar(probabilidades, tiempo)
+            idx = int(np.argmax(suaves))
+            latencia = time.perf_counter() - leido
+            latencias.append(latencia)
+            metricas.registro.registrar("latencia_cuadro", latencia)
+            metricas.registro.contar("predicciones")
+            por_clase[clases[idx]] += 1
+            texto = f"{predecir.formatear_nombre_clase(clases[idx])} {suaves[idx] * 100:.1f}%"
+
+            ahora = time.perf_counter()
+            if mostrar:
+                dibujar(bgr, texto, len(latencias) / (ahora - inicio))
+                cv2.imshow("Clasificador de frutas", bgr)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+            if ahora - ultimo_reporte >= INTERVALO_REPORTE_S:
+                fps = (len(latencias) - clasificados_reporte) / (ahora - ultimo_reporte)
+                print(f"[{ahora - inicio:6.1f} s] {fps:5.1f} FPS | latencia {latencia * 1000:6.1f} ms | {texto}")
+                ultimo_reporte, clasificados_reporte = ahora, len(latencias)
+            if max_cuadros and len(latencias) >= max_cuadros:
+                break
+    finally:
+        ranura.cerrar()
+        hilo.join()
+        captura.release()
+        if mostrar:
+            cv2.destroyAllWindows()
+
+    total = time.perf_counter() - inicio
+    latencias_ms = np.array(latencias or [0.0]) * 1000
+    return {
+        "leidos": contadores["leidos"],
+        "clasificados": len(latencias),
+        "saltados": contadores["saltados"],
+        "descartados": ranura.descartados,
+        "segundos": total,
+        "fps": len(latencias) / total if total else 0.0,
+        "latencia_p50_ms": float(np.percentile(latencias_ms, 50)),
+        "latencia_p95_ms": float(np.percentile(latencias_ms, 95)),
+        "latencia_max_ms": float(latencias_ms.max()),
+        "por_clase": dict(por_clase.most_common()),
+    }
+
+
+def mostrar_resumen(resultado):
+    print("\n" + "=" * 70)
+    print("RESUMEN")
+    print("=" * 70)
+    print(f"Cuadros leídos:      {resultado['leidos']}")
+    print(f"Clasificados:        {resultado['clasificados']} en {resultado['segundos']:.1f} s")
+    print(f"Saltados (objetivo): {resultado['saltados']}")
+    print(f"Descartados (lento): {resultado['descartados']}")
+    print(f"FPS sostenidos:      {resultado['fps']:.1f}")
+    print(f"Latencia p50 / p95 / máx: {resultado['latencia_p50_ms']:.1f} / "
+          f"{resultado['latencia_p95_ms']:.1f} / {resultado['latencia_max_ms']:.1f} ms")
+    print("\nCuadros por clase:")
+    for clase, cuadros in list(resultado["por_clase"].items())[:5]:
+        print(f"   {predecir.formatear_nombre_clase(clase):<25} {cuadros:>6}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clasifica en tiempo real un video o una cámara")
+    parser.add_argument("fuente", help="Ruta del video o número de la cámara (0, 1, ...)")
+    parser.add_argument("--fps", type=float, default=FPS_OBJETIVO,
+                        help="Cuadros por segundo a clasificar; los demás se saltan (0: todos los que se pueda)")
+    parser.add_argument("--suavizado", type=float, default=SUAVIZADO_S,
+                        help="Constante de tiempo del suavizado en segundos (0: sin suavizar)")
+    parser.add_argument("--sin-pausa", action="store_true",
+                        help="Con un archivo: decodificar sin esperar y clasificar todos los cuadros")
+    parser.add_argument("--max-cuadros", type=int, default=None, help="Detenerse tras N cuadros clasificados")
+    parser.add_argument("--mostrar", action="store_true", help="Ventana con el video y la etiqueta")
+    parser.add_argument("--sin-tflite", action="store_true", help="Usar el modelo Keras aunque exista el .tflite")
+    parser.add_argument("--metricas", action="store_true", default=metricas.ACTIVAS,
+                        help="Medir el tiempo de cada etapa y guardarlo en metricas/clasificar_video.json y .prom")
+    args = parser.parse_args()
+    if not args.fuente.isdigit() and not os.path.exists(args.fuente):
+        print(f"ERROR: No se encontró el video {args.fuente}")
+        sys.exit(1)
+    predecir.USAR_TFLITE = not args.sin_tflite
+    metricas.configurar("clasificar_video", activas=args.metricas)
+
+    resultado = clasificar_video(args.fuente, args.fps, args.suavizado, not args.sin_pausa,
+                                 args.mostrar, args.max_cuadros)
+    if resultado is None:
+        sys.exit(1)
+    mostrar_resumen(resultado)
+
+    if metricas.registro.activas:
+        metricas.registro.mostrar()
+        metricas.registro.guardar()
+        print(f"Métricas en: {os.path.join(metricas.CARPETA_METRICAS, 'clasificar_video.json')} y .prom")
@@ -0,0 +1,321 @@
+"""
+Caché del dataset de frutas decodificado una sola vez.
+
+Cada imagen de data/<clase>/ se decodifica y redimensiona una vez a un archivo
+uint8 en disco (cache/<alto>x<ancho>/imagenes.npy) más un arreglo de etiquetas.
+El entrenamiento lee los lotes con memory mapping en lugar de volver a abrir
+cada JPEG/PNG en cada época. La caché se reconstruye sola si se añaden,
+eliminan o modifican imágenes.
+
+También puede guardar una copia de data/ con cada imagen ya redimensionada
+(ver construir_espejo), que sirve como carpeta de datos para cualquier cargador.
+
+Uso:
+    python scripts/datos.py            # caché uint8
+    python scripts/datos.py --espejo   # espejo en data_espejo/224x224
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+CARPETA_DATOS = "data"
+CARPETA_CACHE = "cache"
+CARPETA_ESPEJO = "data_espejo"
+FORMATO_ESPEJO = "bmp"  # Sin compresión: ~0.6 ms por imagen de 224x224 frente a ~2 ms en JPEG
+FORMATOS_ESPEJO = {"bmp": "BMP", "png": "PNG", "jpg": "JPEG"}
+TAMAÑO_IMAGEN = (224, 224)
+EXTENSIONES_VALIDAS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def listar_imagenes(carpeta_datos):
+    """
+    Lista las imágenes en el mismo orden que flow_from_directory
+    (clases en orden alfabético y archivos ordenados dentro de cada clase)
+
+    Returns:
+        tuple: (rutas, etiquetas, clases)
+    """
+    clases = sorted(
+        d for d in os.listdir(carpeta_datos)
+        if os.path.isdir(os.path.join(carpeta_datos, d))
+    )
+
+    rutas, etiquetas = [], []
+    for indice, clase in enumerate(clases):
+        for raiz, _, nombres in sorted(os.walk(os.path.join(carpeta_datos, clase)), key=lambda x: x[0]):
+            for nombre in sorted(nombres):
+                if nombre.lower().endswith(EXTENSIONES_VALIDAS):
+                    rutas.append(os.path.join(raiz, nombre))
+                    etiquetas.append(indice)
+
+    return rutas, etiquetas, clases
+
+
+def huella_dataset(carpeta_datos, rutas):
+    """Huella del contenido del dataset: rutas relativas, tamaños y fechas de modificación"""
+    h = hashlib.sha1()
+    for ruta in rutas:
+        info = os.stat(ruta)
+        h.update(f"{os.path.relpath(ruta, carpeta_datos)}|{info.st_size}|{info.st_mtime_ns}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+def leer_imagen_uint8(ruta, tamaño):
+    """Decodifica igual que load_img de Keras: RGB y redimensionado 'nearest'"""
+    with Image.open(ruta) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img = img.resize((tamaño[1], tamaño[0]), Image.NEAREST)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def construir_cache(carpeta_datos=CARPETA_DATOS, tamaño=TAMAÑO_IMAGEN,
+                    carpeta_cache=CARPETA_CACHE, trabajadores=None):
+    """
+    Decodifica todas las imágenes (en paralelo) y las guarda en
+    <carpeta_cache>/<alto>x<ancho>/ como imagenes.npy, etiquetas.npy e indice.json.
+    Si la huella del dataset no cambió, no hace nada.
+
+    Returns:
+        str: carpeta donde quedó la caché
+    """
+    rutas, etiquetas, clases = listar_imagenes(carpeta_datos)
+    huella = huella_dataset(carpeta_datos, rutas)
+    carpeta = os.path.join(carpeta_cache, f"{tamaño[0]}x{tamaño[1]}")
+    ruta_indice = os.path.join(carpeta, 'indice.json')
+
+    if os.path.exists(ruta_indice):
+        with open(ruta_indice, 'r', encoding='utf-8') as f:
+            if json.load(f).get('huella') == huella:
+                return carpeta
+        print("El dataset cambió desde la última caché, reconstruyendo...")
+
+    os.makedirs(carpeta, exist_ok=True)
+    if os.path.exists(ruta_indice):
+        os.remove(ruta_indice)  # Una caché a medio construir nunca se considera válida
+
+    print(f"Decodificando {len(rutas)} imágenes a {carpeta} ...")
+    inicio = time.perf_counter()
+    ruta_tmp = os.path.join(carpeta, 'imagenes.tmp.npy')
+    imagenes = np.lib.format.open_memmap(
+        ruta_tmp, mode='w+', dtype=np.uint8, shape=(len(rutas), tamaño[0], tamaño[1], 3)
+    )
+    bloque = 1024  # Limita cuántas imágenes decodificadas esperan en memoria
+    with ThreadPoolExecutor(max_workers=trabajadores or os.cpu_count()) as pool:
+        for inicio_bloque in range(0, len(rutas), bloque):
+            rutas_bloque = rutas[inicio_bloque:inicio_bloque + bloque]
+            for i, img in enumerate(pool.map(lambda r: leer_imagen_uint8(r, tamaño), rutas_bloque)):
+                imagenes[inicio_bloque + i] = img
+    imagenes.flush()
+    del imagenes
+    os.replace(ruta_tmp, os.path.join(carpeta, 'imagenes.npy'))
+    np.save(os.path.join(carpeta, 'etiquetas.npy'), np.asarray(etiquetas, dtype=np.int32))
+
+    with open(ruta_indice, 'w', encoding='utf-8') as f:
+        json.dump({
+            'huella': huella,
+            'tamaño': list(tamaño),
+            'clases': clases,
+            'rutas': [os.path.relpath(r, carpeta_datos) for r in rutas],
+        }, f, ensure_ascii=False)
+
+    tamaño_mb = os.path.getsize(os.path.join(carpeta, 'imagenes.npy')) / 1e6
+    print(f"Caché lista en {time.perf_counter() - inicio:.1f} s ({tamaño_mb:.0f} MB)")
+    return carpeta
+
+
+def cargar_cache(carpeta_datos=CARPETA_DATOS, tamaño=TAMAÑO_IMAGEN, carpeta_cache=CARPETA_CACHE):
+    """
+    Abre la caché (construyéndola si falta o está desactualizada).
+
+    Returns:
+        tuple: (imagenes memmap uint8, etiquetas int32, clases)
+    """
+    carpeta = construir_cache(carpeta_datos, tamaño, carpeta_cache)
+    with open(os.path.join(carpeta, 'indice.json'), 'r', encoding='utf-8') as f:
+        clases = json.load(f)['clases']
+    imagenes = np.load(os.path.join(carpeta, 'imagenes.npy'), mmap_mode='r')
+    etiquetas = np.load(os.path.join(carpeta, 'etiquetas.npy'))
+    return imagenes, etiquetas, clases
+
+
+def indices_subset(etiquetas, validation_split, subset):
+    """Índices de entrenamiento o validación con la misma regla que flow_from_directory"""
+    indices = []
+    for clase in np.unique(etiquetas):
+        de_clase = np.flatnonzero(etiquetas == clase)
+        corte = int(validation_split * len(de_clase))
+        indices.append(de_clase[:corte] if subset == 'validation' else de_clase[corte:])
+    return np.concatenate(indices)
+
+
+def _dataset_por_indices(arreglo, etiquetas, indices, tamaño_lote, mezclar, convertir):
+    """
+    tf.data.Dataset que lee cada lote directamente de `arreglo` (un memmap)
+    con una sola indexación. Solo se barajan índices, así que la memoria no
+    crece con el tamaño del dataset. `convertir(x, y)` da el elemento final.
+    """
+    import tensorflow as tf
+
+    def leer_lote(idx):
+        idx = np.sort(idx)  # Acceso en orden creciente dentro del archivo
+        return arreglo[idx], etiquetas[idx]
+
+    def leer(idx):
+        x, y = tf.numpy_function(leer_lote, [idx], (tf.as_dtype(arreglo.dtype), tf.int32))
+        x.set_shape((None,) + tuple(arreglo.shape[1:]))
+        y.set_shape((None,))
+        return convertir(x, y)
+
+    dataset = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if mezclar:
+        dataset = dataset.shuffle(len(indices), reshuffle_each_iteration=True)
+    dataset = dataset.batch(tamaño_lote).map(leer, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def crear_dataset_memmap(imagenes, etiquetas, indices, num_clases, tamaño_lote, mezclar=False):
+    """
+    tf.data.Dataset de (imágenes float32 en [0, 1], etiquetas one-hot) que lee
+    los lotes directamente del memmap. Solo se barajan índices, no imágenes.
+    """
+    import tensorflow as tf
+    return _dataset_por_indices(
+        imagenes, etiquetas, indices, tamaño_lote, mezclar,
+        lambda x, y: (tf.cast(x, tf.float32) / 255.0, tf.one_hot(y, num_clases)))
+
+
+def crear_dataset_activaciones(activaciones, etiquetas, indices, num_clases, tamaño_lote, mezclar=False):
+    """
+    Como crear_dataset_memmap, pero sobre las activaciones float32 que devuelve
+    cargar_activaciones (ya vienen listas para la cola del modelo)
+    """
+    import tensorflow as tf
+    return _dataset_por_indices(
+        activaciones, etiquetas, indices, tamaño_lote, mezclar,
+        lambda x, y: (x, tf.one_hot(y, num_clases)))
+
+
+def cargar_activaciones(extractor, carpeta_datos=CARPETA_DATOS, tamaño=TAMAÑO_IMAGEN,
+                        carpeta_cache=CARPETA_CACHE, tamaño_lote=32):
+    """
+    Activaciones de `extractor` (la parte congelada del modelo) para todas las
+    imágenes de la caché, en el mismo orden que etiquetas. Se calculan una sola
+    vez y se guardan junto a la caché; se recalculan si cambia el dataset.
+
+    Returns:
+        tuple: (activaciones memmap float32, etiquetas int32, clases)
+    """
+    imagenes, etiquetas, clases = cargar_cache(carpeta_datos, tamaño, carpeta_cache)
+    carpeta = os.path.join(carpeta_cache, f"{tamaño[0]}x{tamaño[1]}")
+    with open(os.path.join(carpeta, 'indice.json'), 'r', encoding='utf-8') as f:
+        huella = json.load(f)['huella']
+
+    nombre_capa = extractor.layers[-1].name
+    ruta = os.path.join(carpeta, f'activaciones_{nombre_capa}.npy')
+    ruta_info = os.path.join(carpeta, f'activaciones_{nombre_capa}.json')
+
+    if os.path.exists(ruta_info):
+        with open(ruta_info, 'r', encoding='utf-8') as f:
+            if json.load(f).get('huella') == huella:
+                return np.load(ruta, mmap_mode='r'), etiquetas, clases
+        os.remove(ruta_info)
+
+    print(f"Calculando activaciones de '{nombre_capa}' para {len(imagenes)} imágenes (una sola vez)...")
+    inicio = time.perf_counter()
+    forma = (len(imagenes),) + tuple(extractor.output_shape[1:])
+    activaciones = np.lib.format.open_memmap(ruta, mode='w+', dtype=np.float32, shape=forma)
+    for i in range(0, len(imagenes), tamaño_lote):
+        lote = np.asarray(imagenes[i:i + tamaño_lote], dtype=np.float32) / 255.0
+        activaciones[i:i + tamaño_lote] = extractor.predict_on_batch(lote)
+    activaciones.flush()
+    del activaciones
+
+    with open(ruta_info, 'w', encoding='utf-8') as f:
+        json.dump({'huella': huella, 'capa': nombre_capa, 'forma': list(forma)}, f)
+
+    tamaño_mb = os.path.getsize(ruta) / 1e6
+    print(f"Activaciones listas en {time.perf_counter() - inicio:.1f} s ({tamaño_mb:.0f} MB)")
+    return np.load(ruta, mmap_mode='r'), etiquetas, clases
+
+
+# ===================== ESPEJO REDIMENSIONADO =====================
+
+def construir_espejo(carpeta_datos=CARPETA_DATOS, tamaño=TAMAÑO_IMAGEN, carpeta_espejo=CARPETA_ESPEJO,
+                     formato=FORMATO_ESPEJO, trabajadores=None):
+    """
+    Copia de carpeta_datos con las mismas carpetas y cada imagen ya redimensionada a
+    `tamaño` (RGB, "nearest", igual que load_img de Keras) en un formato rápido de
+    decodificar. Se puede usar como dataset con cualquier cargador: como ya
+    tiene el tamaño final, el entrenamiento ve exactamente los mismos píxeles.
+
+    Cada archivo se llama como el original más la extensión nueva
+    (foto.jpg -> foto.jpg.bmp), así el orden y la división de validación no
+    cambian. Solo se convierten las imágenes nuevas o modificadas (el espejo
+    conserva la fecha de modificación del original) y se borran las que ya no
+    están en el original.
+
+    Returns:
+        str: carpeta del espejo (<carpeta_espejo>/<alto>x<ancho>)
+    """
+    rutas, _, clases = listar_imagenes(carpeta_datos)
+    destino = os.path.join(carpeta_espejo, f"{tamaño[0]}x{tamaño[1]}")
+    for clase in clases:
+        os.makedirs(os.path.join(destino, clase), exist_ok=True)
+
+    pendientes, esperados = [], set()
+    for ruta in rutas:
+        salida = os.path.join(destino, f"{os.path.relpath(ruta, carpeta_datos)}.{formato}")
+        esperados.add(os.path.normpath(salida))
+        modificado = os.stat(ruta).st_mtime_ns
+        if not os.path.exists(salida) or os.stat(salida).st_mtime_ns != modificado:
+            pendientes.append((ruta, salida, modificado))
+
+    sobrantes = [os.path.join(raiz, nombre)
+                 for raiz, _, nombres in os.walk(destino) for nombre in nombres
+                 if os.path.normpath(os.path.join(raiz, nombre)) not in esperados]
+    for ruta in sobrantes:
+        os.remove(ruta)
+
+    def convertir(tarea):
+        ruta, salida, modificado = tarea
+        os.makedirs(os.path.dirname(salida), exist_ok=True)
+        ruta_tmp = salida + '.tmp'
+        Image.fromarray(leer_imagen_uint8(ruta, tamaño)).save(ruta_tmp, format=FORMATOS_ESPEJO[formato])
+        os.utime(ruta_tmp, ns=(modificado, modificado))
+        os.replace(ruta_tmp, salida)  # Nunca queda un archivo a medias con el nombre final
+
+    if pendientes:
+        print(f"Redimensionando {len(pendientes)} de {len(rutas)} imágenes a {destino} ...")
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=trabajadores or os.cpu_count()) as pool:
+            for _ in pool.map(convertir, pendientes):
+                pass
+        print(f"Espejo actualizado en {time.perf_counter() - inicio:.1f} s"
+              f"{f' ({len(sobrantes)} archivos eliminados)' if sobrantes else ''}")
+    elif sobrantes:
+        print(f"Espejo al día ({len(sobrantes)} archivos eliminados)")
+    return destino
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye la caché uint8 del dataset de frutas")
+    parser.add_argument('--datos', default=CARPETA_DATOS, help="Carpeta con una subcarpeta por clase")
+    parser.add_argument('--tamaño', type=int, nargs=2, default=list(TAMAÑO_IMAGEN), metavar=('ALTO', 'ANCHO'))
+    parser.add_argument('--cache', default=CARPETA_CACHE, help="Carpeta donde guardar la caché")
+    parser.add_argument('--espejo', action='store_true',
+                        help="Construir o actualizar el espejo redimensionado de data/ en lugar de la caché")
+    parser.add_argument('--formato', choices=list(FORMATOS_ESPEJO), default=FORMATO_ESPEJO,
+                        help="Formato de las imágenes del espejo")
+    args = parser.parse_args()
+
+    if args.espejo:
+        print(f"Espejo en: {construir_espejo(args.datos, tuple(args.tamaño), formato=args.formato)}")
+    else:
+        print(f"Caché en: {construir_cache(args.datos, tuple(args.tamaño), args.cache)}")
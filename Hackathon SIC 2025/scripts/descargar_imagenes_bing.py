@@ -1,12 +1,33 @@
-from bing_image_downloader import downloader
 import os
+import io
+import re
+import json
 import time
+import argparse
+import hashlib
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # CONFIGURACIÓN 
 CARPETA_SALIDA = "data"
 LIMITE = 100  # Descargar 100 imágenes por clase
 FILTRO_ADULTO = 'on'
 
+# Modo paralelo (--paralelo)
+URL_BUSQUEDA = "https://www.bing.com/images/async"  # Se puede cambiar por un servidor local para pruebas
+HILOS_DESCARGA = 16
+PAUSA_POR_HOST = 0.5    # Segundos mínimos entre dos peticiones al mismo servidor
+TIEMPO_ESPERA = 15      # Timeout de cada petición (segundos)
+TAMAÑO_MINIMO = 2048    # Bytes; por debajo suelen ser iconos o páginas de error
+LADO_MINIMO = 64        # Píxeles; se descartan miniaturas
+PAGINAS_MAXIMAS = 10    # Páginas de resultados por búsqueda como máximo
+ARCHIVO_DIARIO = ".descarga_diario.jsonl"  # Dentro de CARPETA_SALIDA; permite reanudar
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+CABECERAS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 '
+                           '(KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11'}
+
 # Lista de búsquedas para cada clase
 CONSULTAS_BUSQUEDA = [
     # Manzanas
@@ -65,6 +86,8 @@ def descargar_todas_imagenes():
     print(f"Total aproximado: {len(CONSULTAS_BUSQUEDA) * LIMITE} imágenes\n")
     print("=" * 70)
     
+    from bing_image_downloader import downloader
+    
     for i, (consulta, carpeta) in enumerate(zip(CONSULTAS_BUSQUEDA, NOMBRES_CARPETAS), 1):
         print(f"\n[{i}/{len(CONSULTAS_BUSQUEDA)}] Descargando: {consulta}")
         print(f"    📁 Carpeta destino: {carpeta}")
@@ -109,20 +132,246 @@ def descargar_todas_imagenes():
     print("   3. Asegúrate de tener ~50-110 imágenes por carpeta")
     print("   4. Ejecuta: python scripts/validate_dataset.py")
 
+
+# DESCARGA EN PARALELO
+class LimitadorPorHost:
+    """Deja pasar como máximo una petición cada `pausa` segundos a cada servidor"""
+    def __init__(self, pausa=PAUSA_POR_HOST):
+        self.pausa = pausa
+        self.bloqueo = threading.Lock()
+        self.siguiente = {}  # host -> instante a partir del cual se puede pedir
+
+    def esperar(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self.bloqueo:
+            ahora = time.monotonic()
+            turno = max(ahora, self.siguiente.get(host, 0.0))
+            self.siguiente[host] = turno + self.pausa
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+class Diario:
+    """
+    Registro de URLs ya resueltas (una línea JSON por URL), para reanudar una
+    descarga interrumpida sin volver a pedir lo que ya se guardó o se rechazó
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.bloqueo = threading.Lock()
+        self.resueltas = {}  # url -> registro
+        if os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as f:
+                lineas = f.read().split("\n")
+            for linea in lineas:
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue  # Última línea a medias si se cortó el proceso
+                self.resueltas[registro['url']] = registro
+            if lineas[-1]:
+                # Sin salto de línea final el próximo registro se pegaría a la última línea:
+                # se reescribe el diario solo con los registros válidos
+                with open(ruta, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in self.resueltas.values())
+
+    def anotar(self, **registro):
+        with self.bloqueo:
+            self.resueltas[registro['url']] = registro
+            with open(self.ruta, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def pedir(url, limitador, tiempo_espera=TIEMPO_ESPERA):
+    """GET respetando el límite por host; falla si llegan menos bytes que Content-Length"""
+    limitador.esperar(url)
+    solicitud = urllib.request.Request(url, headers=CABECERAS)
+    with urllib.request.urlopen(solicitud, timeout=tiempo_espera) as respuesta:
+        datos = respuesta.read()
+        esperado = respuesta.headers.get('Content-Length')
+    if esperado is not None and len(datos) != int(esperado):
+        raise ValueError(f"descarga truncada ({len(datos)} de {esperado} bytes)")
+    return datos
+
+
+def buscar_enlaces(consulta, cantidad, limitador, url_busqueda=URL_BUSQUEDA):
+    """URLs de imágenes (sin repetir) de las páginas de resultados de Bing"""
+    enlaces = []
+    for pagina in range(PAGINAS_MAXIMAS):
+        if len(enlaces) >= cantidad:
+            break
+        parametros = urllib.parse.urlencode({'q': consulta, 'first': len(enlaces), 'count': cantidad,
+                                             'adlt': FILTRO_ADULTO, 'qft': ''})
+        html = pedir(f"{url_busqueda}?{parametros}", limitador).decode('utf-8', errors='replace')
+        nuevos = [e for e in re.findall(r'murl&quot;:&quot;(.*?)&quot;', html) if e not in enlaces]
+        if not nuevos:
+            break
+        enlaces.extend(dict.fromkeys(nuevos))
+    return enlaces
+
+
+def validar_imagen(datos):
+    """Devuelve la extensión si `datos` es una imagen completa y decodificable; si no, lanza ValueError"""
+    from PIL import Image
+    if len(datos) < TAMAÑO_MINIMO:
+        raise ValueError(f"archivo demasiado pequeño ({len(datos)} bytes)")
+    try:
+        with Image.open(io.BytesIO(datos)) as imagen:
+            formato = imagen.format
+            imagen.load()  # Decodifica todos los píxeles: detecta archivos truncados
+            if min(imagen.size) < LADO_MINIMO:
+                raise ValueError(f"imagen demasiado pequeña ({imagen.size[0]}x{imagen.size[1]})")
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f"no se puede decodificar: {e}")
+    return {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'BMP': '.bmp', 'WEBP': '.webp'}.get(formato, '.jpg')
+
+
+def descargar_imagen(url, carpeta, limitador):
+    """Descarga y valida una imagen; la escribe completa (archivo temporal + rename) o no la escribe"""
+    datos = pedir(url, limitador)
+    extension = validar_imagen(datos)
+    nombre = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + extension
+    ruta = os.path.join(carpeta, nombre)
+    ruta_tmp = ruta + ".part"
+    try:
+        with open(ruta_tmp, 'wb') as f:
+            f.write(datos)
+        os.replace(ruta_tmp, ruta)
+    except BaseException:
+        # Disco lleno, permisos, Ctrl+C...: no dejar el .part a medias en data/
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+        raise
+    return nombre
+
+
+def contar_imagenes(carpeta):
+    if not os.path.isdir(carpeta):
+        return 0
+    return sum(1 for f in os.listdir(carpeta) if f.lower().endswith(EXTENSIONES_IMAGEN))
+
+
+def descargar_todas_paralelo(limite=LIMITE, hilos=HILOS_DESCARGA, carpeta_salida=CARPETA_SALIDA,
+                             url_busqueda=URL_BUSQUEDA, pausa_por_host=PAUSA_POR_HOST):
+    """
+    Descarga todas las clases a la vez con un pool de hilos y límite de
+    peticiones por servidor. Se puede interrumpir y volver a ejecutar: las clases
+    que ya tienen `limite` imágenes y las URLs anotadas en el diario se saltan.
+    Devuelve {carpeta: imágenes en disco}
+    """
+    os.makedirs(carpeta_salida, exist_ok=True)
+    limitador = LimitadorPorHost(pausa_por_host)
+    diario = Diario(os.path.join(carpeta_salida, ARCHIVO_DIARIO))
+    inicio = time.time()
+
+    faltantes = {}
+    for consulta, carpeta in zip(CONSULTAS_BUSQUEDA, NOMBRES_CARPETAS):
+        ruta = os.path.join(carpeta_salida, carpeta)
+        os.makedirs(ruta, exist_ok=True)
+        falta = limite - contar_imagenes(ruta)
+        if falta > 0:
+            faltantes[carpeta] = (consulta, ruta, falta)
+        else:
+            print(f"    ✓ {carpeta}: ya tiene {limite} imágenes, saltando...")
+
+    print(f"\n🔎 Buscando enlaces para {len(faltantes)} clases...")
+    candidatos = {}
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        # Se piden el doble de enlaces porque parte de ellos fallan o se rechazan
+        busquedas = {carpeta: pool.submit(buscar_enlaces, consulta, 2 * limite, limitador, url_busqueda)
+                     for carpeta, (consulta, _, _) in faltantes.items()}
+        for carpeta, futuro in busquedas.items():
+            try:
+                enlaces = futuro.result()
+            except Exception as e:
+                print(f"Error buscando {faltantes[carpeta][0]}: {e}")
+                enlaces = []
+            candidatos[carpeta] = iter([e for e in enlaces if e not in diario.resueltas])
+
+    print(f"⬇️  Descargando con {hilos} hilos ({pausa_por_host}s mínimo entre peticiones al mismo servidor)...")
+    guardadas = {carpeta: 0 for carpeta in faltantes}
+    rechazadas = errores = 0
+    pendientes = {}  # futuro -> (carpeta, url)
+    en_curso = {carpeta: 0 for carpeta in faltantes}
+
+    def rellenar(pool):
+        # Nunca hay más descargas en curso de una clase que imágenes le faltan
+        for carpeta, (_, ruta, falta) in faltantes.items():
+            while guardadas[carpeta] + en_curso[carpeta] < falta:
+                url = next(candidatos[carpeta], None)
+                if url is None:
+                    break
+                pendientes[pool.submit(descargar_imagen, url, ruta, limitador)] = (carpeta, url)
+                en_curso[carpeta] += 1
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        rellenar(pool)
+        while pendientes:
+            listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                carpeta, url = pendientes.pop(futuro)
+                en_curso[carpeta] -= 1
+                try:
+                    nombre = futuro.result()
+                    guardadas[carpeta] += 1
+                    diario.anotar(url=url, clase=carpeta, estado='guardada', archivo=nombre)
+                except ValueError as e:
+                    # Contenido inválido: no se vuelve a intentar al reanudar
+                    rechazadas += 1
+                    diario.anotar(url=url, clase=carpeta, estado='rechazada', motivo=str(e))
+                except Exception as e:
+                    # Error de red: no se anota, se reintenta en la próxima ejecución
+                    errores += 1
+                    print(f"[!] {url}: {e}")
+            rellenar(pool)
+
+    print("\n" + "=" * 70)
+    totales = {carpeta: contar_imagenes(os.path.join(carpeta_salida, carpeta)) for carpeta in NOMBRES_CARPETAS}
+    for carpeta, total in totales.items():
+        nuevas = f" (+{guardadas[carpeta]})" if guardadas.get(carpeta) else ""
+        aviso = "" if total >= limite else "  ⚠️ incompleta"
+        print(f"    {carpeta:20} {total:>4}{nuevas}{aviso}")
+    print(f"\nNuevas: {sum(guardadas.values())} | Rechazadas: {rechazadas} | "
+          f"Errores de red: {errores} | Tiempo: {time.time() - inicio:.1f}s")
+    return totales
+
 # EJECUTAR
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Descarga el dataset de frutas desde Bing")
+    parser.add_argument('--paralelo', action='store_true',
+                        help="Descargar todas las clases a la vez, validando cada imagen y "
+                             "pudiendo reanudar (diario en <salida>/" + ARCHIVO_DIARIO + ")")
+    parser.add_argument('--hilos', type=int, default=HILOS_DESCARGA, help="Descargas simultáneas (--paralelo)")
+    parser.add_argument('--pausa-por-host', type=float, default=PAUSA_POR_HOST,
+                        help="Segundos mínimos entre peticiones al mismo servidor (--paralelo)")
+    parser.add_argument('--limite', type=int, default=LIMITE, help="Imágenes por clase")
+    parser.add_argument('--salida', default=CARPETA_SALIDA, help="Carpeta de destino")
+    parser.add_argument('--url-busqueda', default=URL_BUSQUEDA,
+                        help="URL del buscador (--paralelo), p. ej. un servidor local de prueba")
+    parser.add_argument('--sin-confirmar', action='store_true', help="No esperar ENTER al empezar ni al terminar")
+    args = parser.parse_args()
+    
     # Crear directorio de salida si no existe
-    os.makedirs(CARPETA_SALIDA, exist_ok=True)
+    os.makedirs(args.salida, exist_ok=True)
     
     print("Script de Descarga de Imágenes - Bing Image Downloader")
     print("=" * 70)
-    print("Tiempo estimado: 30-45 minutos\n")
+    if args.paralelo:
+        print("Modo paralelo: se puede interrumpir y volver a ejecutar para continuar\n")
+    else:
+        print("Tiempo estimado: 30-45 minutos\n")
     
-    input("Presiona ENTER para comenzar...")
+    if not args.sin_confirmar:
+        input("Presiona ENTER para comenzar...")
     
     # Iniciar descarga
-    descargar_todas_imagenes()
+    if args.paralelo:
+        descargar_todas_paralelo(args.limite, args.hilos, args.salida, args.url_busqueda, args.pausa_por_host)
+    else:
+        LIMITE, CARPETA_SALIDA = args.limite, args.salida
+        descargar_todas_imagenes()
     
     print("\n" + "=" * 70)
     print("Script finalizado")
-    input("\nPresiona ENTER para cerrar...")
+    if not args.sin_confirmar:
+        input("\nPresiona ENTER para cerrar...")
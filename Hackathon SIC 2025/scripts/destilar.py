@@ -0,0 +1,336 @@
+"""
+Destilación del modelo de frutas (MobileNetV2, 224x224) en una CNN pequeña.
+
+El modelo entrenado (el profesor) predice una sola vez todas las imágenes de
+data/ (desde la caché uint8) y sus probabilidades se guardan en cache/. El
+estudiante, una CNN de convoluciones separables a menor resolución, aprende de
+esas probabilidades suavizadas con una temperatura (Hinton et al., 2015) y,
+con menos peso, de las etiquetas reales.
+
+El estudiante se guarda en models/estudiante/ con el mismo formato que el
+profesor (modelo_frutas, modelo_frutas.h5, modelo_frutas.tflite y
+etiquetas.txt). Al terminar se comparan ambos: precisión en validación,
+coincidencia con el profesor, latencia de una imagen y memoria del proceso.
+
+Para usar el estudiante en scripts/predecir.py y app.py basta copiar el
+contenido de models/estudiante/ a models/. Reciben las mismas imágenes uint8 de
+224x224: el estudiante las reduce a su resolución dentro del propio modelo.
+
+Uso:
+    python scripts/destilar.py
+    python scripts/destilar.py --resolucion 96 --ancho 0.5 --epocas 40
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import cargador_modelo
+import datos
+
+# CONFIGURACIÓN
+RUTA_PROFESOR = os.path.join("models", "modelo_frutas")
+RUTA_ETIQUETAS = os.path.join("models", "etiquetas.txt")
+CARPETA_ESTUDIANTE = os.path.join("models", "estudiante")
+CARPETA_DATOS = "data"
+CARPETA_CACHE = "cache"
+TAMAÑO_IMAGEN = (224, 224)  # Resolución del profesor (y de la caché)
+RESOLUCION = 128      # Lado de la imagen que ve el estudiante
+ANCHO = 1.0           # Multiplicador de filtros del estudiante
+TEMPERATURA = 4.0     # Suaviza las probabilidades del profesor
+ALFA = 0.9            # Peso de la pérdida de destilación frente a la de las etiquetas reales
+EPOCAS = 30
+TAMAÑO_LOTE = 32
+PACIENCIA = 5         # Épocas sin mejorar val_loss antes de parar
+LOTE_PROFESOR = 64
+REPETICIONES = 30     # Predicciones de una imagen para medir la latencia
+
+
+def _archivos(ruta):
+    """El archivo, o todos los de la carpeta si es un SavedModel"""
+    if os.path.isdir(ruta):
+        return [os.path.join(raiz, n) for raiz, _, nombres in os.walk(ruta) for n in nombres]
+    return [ruta]
+
+
+def leer_etiquetas(ruta_etiquetas=RUTA_ETIQUETAS):
+    with open(ruta_etiquetas, "r", encoding="utf-8") as f:
+        return [linea.strip() for linea in f if linea.strip()]
+
+
+def crear_estudiante(num_clases, resolucion=RESOLUCION, ancho=ANCHO):
+    """
+    CNN de convoluciones separables (como los bloques de MobileNet, sin
+    expansión). Devuelve (modelo con softmax, modelo con logits): comparten
+    las capas, el segundo se usa para entrenar
+    """
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    def filtros(n):
+        return max(8, int(n * ancho))
+
+    entrada = tf.keras.Input(shape=(resolucion, resolucion, 3))
+    x = layers.Conv2D(filtros(16), 3, strides=2, padding="same", use_bias=False)(entrada)
+    x = layers.BatchNormalization()(x)
+    x = layers.ReLU()(x)
+    for n, paso in [(32, 1), (64, 2), (64, 1), (128, 2), (128, 1), (192, 2)]:
+        x = layers.SeparableConv2D(filtros(n), 3, strides=paso, padding="same", use_bias=False)(x)
+        x = layers.BatchNormalization()(x)
+        x = layers.ReLU()(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.2)(x)
+    logits = layers.Dense(num_clases, name="logits")(x)
+    probabilidades = layers.Activation("softmax", dtype="float32")(logits)
+    return (tf.keras.Model(entrada, probabilidades, name="estudiante_frutas"),
+            tf.keras.Model(entrada, logits))
+
+
+def predicciones_profesor(imagenes, carpeta_cache):
+    """
+    Probabilidades del profesor para todas las imágenes de la caché. Se guardan
+    en cache/ y se reutilizan mientras no cambien ni el dataset ni el modelo
+    """
+    ruta_modelo = cargador_modelo.ruta_artefacto(RUTA_PROFESOR)
+    with open(os.path.join(carpeta_cache, "indice.json"), "r", encoding="utf-8") as f:
+        huella_cache = json.load(f)["huella"]
+    modificado = max(os.path.getmtime(archivo) for archivo in _archivos(ruta_modelo))
+    huella = hashlib.sha1(f"{huella_cache}|{ruta_modelo}|{modificado}".encode()).hexdigest()[:16]
+    ruta = os.path.join(CARPETA_CACHE, f"profesor_{huella}.npy")
+    if os.path.exists(ruta):
+        print(f"Probabilidades del profesor: {ruta}")
+        return np.load(ruta)
+
+    profesor = cargador_modelo.cargar_modelo(RUTA_PROFESOR)
+    print(f"El profesor ({ruta_modelo}) predice {len(imagenes)} imágenes...")
+    inicio = time.perf_counter()
+    probabilidades = np.concatenate([
+        np.asarray(profesor.predict_on_batch(np.asarray(imagenes[i:i + LOTE_PROFESOR])), dtype=np.float32)
+        for i in range(0, len(imagenes), LOTE_PROFESOR)
+    ])
+    print(f"   Listo en {time.perf_counter() - inicio:.1f} s")
+    for anterior in os.listdir(CARPETA_CACHE):
+        if anterior.startswith("profesor_") and anterior.endswith(".npy"):
+            os.remove(os.path.join(CARPETA_CACHE, anterior))
+    np.save(ruta, probabilidades)
+    return probabilidades
+
+
+def crear_dataset(imagenes, etiquetas, probabilidades, indices, num_clases, resolucion, tamaño_lote, mezclar=False):
+    """
+    Lotes de (imagen float32 en [0, 1] a la resolución del estudiante,
+    [etiqueta one-hot | log-probabilidades del profesor]). Se redimensiona
+    eligiendo los mismos píxeles que cargador_modelo.envolver_uint8 al predecir
+    """
+    import tensorflow as tf
+
+    alto, ancho = imagenes.shape[1:3]
+    log_probabilidades = np.log(np.clip(probabilidades, 1e-7, 1.0)).astype(np.float32)
+
+    def leer_lote(idx):
+        idx = np.sort(idx)  # Acceso en orden creciente dentro del archivo
+        return imagenes[idx], etiquetas[idx], log_probabilidades[idx]
+
+    def leer(idx):
+        x, y, profesor = tf.numpy_function(leer_lote, [idx], (tf.uint8, tf.int32, tf.float32))
+        x.set_shape((None, alto, ancho, 3))
+        profesor.set_shape((None, num_clases))
+        x = cargador_modelo.redimensionar_como_pil(x, resolucion, resolucion)
+        objetivo = tf.concat([tf.one_hot(y, num_clases), profesor], axis=1)
+        return tf.cast(x, tf.float32) / 255.0, objetivo
+
+    dataset = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if mezclar:
+        dataset = dataset.shuffle(len(indices), reshuffle_each_iteration=True)
+    dataset = dataset.batch(tamaño_lote).map(leer, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def crear_perdida(num_clases, temperatura=TEMPERATURA, alfa=ALFA):
+    """
+    alfa * T² * KL(profesor_T || estudiante_T) + (1 - alfa) * entropía cruzada
+    con las etiquetas reales. El T² mantiene la escala de los gradientes
+    """
+    import tensorflow as tf
+
+    def perdida(objetivo, logits):
+        etiquetas, log_profesor = objetivo[:, :num_clases], objetivo[:, num_clases:]
+        suave_profesor = tf.nn.softmax(log_profesor / temperatura)
+        log_suave_estudiante = tf.nn.log_softmax(logits / temperatura)
+        destilacion = tf.reduce_sum(
+            suave_profesor * (tf.math.log(suave_profesor + 1e-7) - log_suave_estudiante), axis=1)
+        real = tf.nn.softmax_cross_entropy_with_logits(etiquetas, logits)
+        return alfa * temperatura ** 2 * destilacion + (1 - alfa) * real
+
+    def accuracy(objetivo, logits):
+        return tf.cast(tf.equal(tf.argmax(objetivo[:, :num_clases], axis=1), tf.argmax(logits, axis=1)),
+                       tf.float32)
+
+    return perdida, accuracy
+
+
+def guardar_estudiante(estudiante, clases, carpeta=CARPETA_ESTUDIANTE):
+    """Mismo formato que train_model.py y exportar_modelo.py, con su propio etiquetas.txt"""
+    import exportar_modelo
+    os.makedirs(carpeta, exist_ok=True)
+    ruta_modelo = os.path.join(carpeta, os.path.basename(RUTA_PROFESOR))
+    estudiante.save(ruta_modelo)
+    estudiante.save(f"{ruta_modelo}.h5")
+    ruta_etiquetas = os.path.join(carpeta, "etiquetas.txt")
+    with open(ruta_etiquetas, "w", encoding="utf-8") as f:
+        f.write("\n".join(clases) + "\n")
+    # En el .tflite van las clases del estudiante, no las de models/etiquetas.txt
+    exportar_modelo.exportar_tflite(ruta_modelo, cargador_modelo.ruta_tflite(ruta_modelo),
+                                    ruta_etiquetas=ruta_etiquetas)
+    return ruta_modelo
+
+
+def evaluar(ruta_modelo, imagenes, etiquetas, indices):
+    """Predicciones del modelo tal como lo cargan predecir.py y la app (uint8 de 224x224)"""
+    modelo = cargador_modelo.cargar_modelo(ruta_modelo)
+    clases_predichas = np.concatenate([
+        np.argmax(modelo.predict_on_batch(np.asarray(imagenes[np.sort(indices[i:i + LOTE_PROFESOR])])), axis=1)
+        for i in range(0, len(indices), LOTE_PROFESOR)
+    ])
+    return clases_predichas, float(np.mean(clases_predichas == etiquetas[np.sort(indices)]))
+
+
+def medir(ruta_modelo):
+    """Carga el modelo en este proceso y mide latencia de una imagen y memoria"""
+    memoria_inicial = cargador_modelo.memoria_proceso_mb()
+    modelo = cargador_modelo.cargar_modelo(ruta_modelo)
+    imagen = np.random.default_rng(0).integers(0, 256, (1,) + TAMAÑO_IMAGEN + (3,), dtype=np.uint8)
+    modelo.predict_on_batch(imagen)  # Calentamiento
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        modelo.predict_on_batch(imagen)
+        tiempos.append(time.perf_counter() - inicio)
+    memoria_final = cargador_modelo.memoria_proceso_mb()
+    artefacto = cargador_modelo.ruta_artefacto(ruta_modelo)
+    return {
+        "artefacto": artefacto,
+        "tamaño_mb": sum(os.path.getsize(archivo) for archivo in _archivos(artefacto)) / 1e6,
+        "latencia_ms": float(np.median(tiempos) * 1000),
+        "memoria_mb": memoria_final,
+        "memoria_modelo_mb": (memoria_final - memoria_inicial) if memoria_final else None,
+    }
+
+
+def medir_en_subproceso(ruta_modelo):
+    """Cada medición en un proceso nuevo para que la memoria de uno no cuente en el otro"""
+    salida = subprocess.run([sys.executable, os.path.abspath(__file__), "--medir", ruta_modelo],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def mostrar_comparacion(profesor, estudiante):
+    def formato(valor, patron):
+        return patron.format(valor) if valor is not None else "n/d"
+
+    filas = [
+        ("Parámetros", "parametros", "{:,}"),
+        ("Resolución de entrada", "resolucion", "{}"),
+        ("Archivo cargado (MB)", "tamaño_mb", "{:.2f}"),
+        ("Latencia (1 imagen, ms)", "latencia_ms", "{:.2f}"),
+        ("Memoria del proceso (MB)", "memoria_mb", "{:.0f}"),
+        ("Memoria al cargar (MB)", "memoria_modelo_mb", "{:.0f}"),
+        ("Precisión en validación", "precision", "{:.4f}"),
+    ]
+    print("\n" + "=" * 80)
+    print(f"{'':30}{'Profesor':>16}{'Estudiante':>16}{'Cambio':>18}")
+    print("=" * 80)
+    for nombre, clave, patron in filas:
+        a, b = profesor.get(clave), estudiante.get(clave)
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)) and clave != "precision" and b:
+            cambio = f"{a / b:.1f}x menos"
+        elif clave == "precision" and a is not None and b is not None:
+            cambio = f"{(b - a) * 100:+.2f} puntos"
+        else:
+            cambio = ""
+        print(f"{nombre:30}{formato(a, patron):>16}{formato(b, patron):>16}{cambio:>18}")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Destila el modelo de frutas en una CNN pequeña")
+    parser.add_argument("--resolucion", type=int, default=RESOLUCION, help="Lado de la imagen del estudiante")
+    parser.add_argument("--ancho", type=float, default=ANCHO, help="Multiplicador de filtros del estudiante")
+    parser.add_argument("--temperatura", type=float, default=TEMPERATURA)
+    parser.add_argument("--alfa", type=float, default=ALFA, help="Peso de la destilación (0 = solo etiquetas reales)")
+    parser.add_argument("--epocas", type=int, default=EPOCAS)
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir)))
+        sys.exit(0)
+
+    if not os.path.exists(RUTA_PROFESOR):
+        print(f"ERROR: No existe {RUTA_PROFESOR}. Ejecuta primero scripts/train_model.py")
+        sys.exit(1)
+
+    import tensorflow as tf
+
+    carpeta_cache = datos.construir_cache(CARPETA_DATOS, TAMAÑO_IMAGEN, CARPETA_CACHE)
+    imagenes, etiquetas, clases = datos.cargar_cache(CARPETA_DATOS, TAMAÑO_IMAGEN, CARPETA_CACHE)
+    if clases != leer_etiquetas():
+        print(f"ERROR: las clases de {CARPETA_DATOS}/ no coinciden con {RUTA_ETIQUETAS} "
+              f"(¿se añadieron clases después de entrenar?)")
+        sys.exit(1)
+    probabilidades = predicciones_profesor(imagenes, carpeta_cache)
+
+    # La misma división que train_model.py: el estudiante no ve las imágenes de validación
+    indices_entrenamiento = datos.indices_subset(etiquetas, 0.20, "training")
+    indices_validacion = datos.indices_subset(etiquetas, 0.20, "validation")
+    num_clases = len(clases)
+    datos_entrenamiento = crear_dataset(imagenes, etiquetas, probabilidades, indices_entrenamiento, num_clases,
+                                        args.resolucion, TAMAÑO_LOTE, mezclar=True)
+    datos_validacion = crear_dataset(imagenes, etiquetas, probabilidades, indices_validacion, num_clases,
+                                     args.resolucion, TAMAÑO_LOTE)
+
+    estudiante, estudiante_logits = crear_estudiante(num_clases, args.resolucion, args.ancho)
+    perdida, accuracy = crear_perdida(num_clases, args.temperatura, args.alfa)
+    estudiante_logits.compile(optimizer="adam", loss=perdida, metrics=[accuracy])
+    print(f"\nEstudiante: {estudiante.count_params():,} parámetros, {args.resolucion}x{args.resolucion} "
+          f"(T={args.temperatura}, alfa={args.alfa})")
+    inicio = time.perf_counter()
+    estudiante_logits.fit(
+        datos_entrenamiento,
+        epochs=args.epocas,
+        validation_data=datos_validacion,
+        callbacks=[tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=PACIENCIA,
+                                                    restore_best_weights=True)],
+        verbose=1
+    )
+    print(f"Entrenamiento: {time.perf_counter() - inicio:.1f} s")
+
+    ruta_estudiante = guardar_estudiante(estudiante, clases)
+
+    print("\nEvaluando ambos modelos en validación...")
+    predicho_profesor, precision_profesor = evaluar(RUTA_PROFESOR, imagenes, etiquetas, indices_validacion)
+    predicho_estudiante, precision_estudiante = evaluar(ruta_estudiante, imagenes, etiquetas, indices_validacion)
+    coincidencia = float(np.mean(predicho_profesor == predicho_estudiante))
+
+    profesor = dict(medir_en_subproceso(RUTA_PROFESOR), precision=precision_profesor,
+                    parametros=tf.keras.models.load_model(RUTA_PROFESOR).count_params(),
+                    resolucion=f"{TAMAÑO_IMAGEN[0]}x{TAMAÑO_IMAGEN[1]}")
+    alumno = dict(medir_en_subproceso(ruta_estudiante), precision=precision_estudiante,
+                  parametros=estudiante.count_params(), resolucion=f"{args.resolucion}x{args.resolucion}")
+    mostrar_comparacion(profesor, alumno)
+    print(f"   Misma clase que el profesor: {coincidencia * 100:.1f}% de {len(indices_validacion)} imágenes")
+    print(f"   Latencia y memoria con {os.path.basename(profesor['artefacto'])} y "
+          f"{os.path.basename(alumno['artefacto'])}, en procesos separados")
+    if "tflite_runtime" not in sys.modules and alumno["artefacto"].endswith(".tflite"):
+        print("   Sin tflite-runtime el intérprete viene de TensorFlow, que ocupa casi toda la memoria del proceso")
+
+    with open(os.path.join(CARPETA_ESTUDIANTE, "destilacion.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "resolucion": args.resolucion, "ancho": args.ancho, "temperatura": args.temperatura,
+            "alfa": args.alfa, "coincidencia": coincidencia, "profesor": profesor, "estudiante": alumno,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\nEstudiante guardado en: {CARPETA_ESTUDIANTE}/ (copia su contenido a models/ para usarlo)")
@@ -0,0 +1,309 @@
+"""
+Exporta el modelo de frutas (MobileNetV2) a TensorFlow Lite.
+
+Genera models/modelo_frutas.tflite, comprueba que predice lo mismo que el
+modelo Keras sobre imágenes de data/ y compara tiempo de carga, latencia y
+memoria de cada formato (.h5, SavedModel y .tflite).
+Las clases se toman de models/etiquetas.txt (en el orden de salida del modelo)
+y se incrustan en el .tflite: es el artefacto para servir, un solo archivo con
+las clases y los pesos alineados a 16 bytes para cargarlo con mmap (ver
+empaquetar).
+El .tflite recibe imágenes uint8 de cualquier tamaño: el redimensionado y la
+normalización del entrenamiento van dentro del modelo (ver
+cargador_modelo.envolver_uint8).
+Una vez exportado, scripts/predecir.py y app.py usan el .tflite automáticamente.
+
+Uso:
+    python scripts/exportar_modelo.py
+    python scripts/exportar_modelo.py --cuantizar   # pesos en 8 bits (~4 veces más pequeño)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from PIL import Image
+import cargador_modelo
+import datos
+
+# CONFIGURACIÓN
+RUTA_MODELO = os.path.join("models", "modelo_frutas")
+RUTA_ETIQUETAS = os.path.join("models", "etiquetas.txt")
+CARPETA_DATOS = "data"
+TAMAÑO_IMAGEN = (224, 224)
+MUESTRAS = 30          # Imágenes usadas para comparar Keras y TFLite
+MUESTRAS_ORIGINALES = 4  # De ellas, cuántas se prueban además con su tamaño original
+TOLERANCIA = 1e-3      # Diferencia máxima permitida en cada probabilidad
+TOLERANCIA_CUANTIZADO = 5e-2
+REPETICIONES = 30      # Predicciones de una imagen para medir la latencia
+ALINEACION = 16        # Bytes a los que se alinean los pesos dentro del .tflite
+FORMATOS = {           # Formatos que se comparan (los que no existan se omiten)
+    "h5": ("Keras .h5", RUTA_MODELO + ".h5"),
+    "savedmodel": ("SavedModel", RUTA_MODELO),
+    "tflite": ("TFLite", cargador_modelo.ruta_tflite(RUTA_MODELO)),
+}
+
+
+def leer_etiquetas(ruta_etiquetas=RUTA_ETIQUETAS):
+    with open(ruta_etiquetas, "r", encoding="utf-8") as f:
+        return [linea.strip() for linea in f if linea.strip()]
+
+
+def exportar_tflite(ruta_modelo, ruta_salida, cuantizar=False, ruta_etiquetas=RUTA_ETIQUETAS):
+    """
+    Convierte el modelo Keras a TFLite (entrada uint8 de cualquier tamaño y lote variable)
+    e incrusta las clases de `ruta_etiquetas`, que deben ser las de ese modelo
+
+    Returns:
+        El modelo Keras cargado (para la comparación)
+    """
+    import tensorflow as tf
+
+    print(f"Convirtiendo {ruta_modelo} a TFLite...")
+    modelo = tf.keras.models.load_model(ruta_modelo)
+    clases = leer_etiquetas(ruta_etiquetas)
+    if modelo.output_shape[-1] != len(clases):
+        raise ValueError(f"El modelo tiene {modelo.output_shape[-1]} salidas y "
+                         f"{ruta_etiquetas} {len(clases)} clases")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(cargador_modelo.envolver_uint8(modelo))
+    if cuantizar:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    contenido = empaquetar(converter.convert(), clases)
+
+    with open(ruta_salida, "wb") as f:
+        f.write(contenido)
+
+    print(f"Guardado: {ruta_salida} ({len(contenido) / 1e6:.1f} MB)")
+    print(f"Clases: {ruta_etiquetas} ({len(clases)}, incrustadas en el .tflite)")
+    return modelo
+
+
+class _BufferAlineado:
+    """Buffer de TFLite que se escribe con sus datos alineados a ALINEACION bytes"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def Pack(self, builder):
+        from tensorflow.lite.python import schema_py_generated as esquema
+
+        datos = None
+        if self.buffer.data is not None:
+            contenido = np.ascontiguousarray(self.buffer.data, dtype=np.uint8).ravel()
+            # Relleno para que el primer byte quede alineado una vez escritos los
+            # datos; CreateNumpyVector solo alinea al tamaño del elemento (1 byte)
+            builder.Prep(ALINEACION, contenido.size)
+            datos = builder.CreateNumpyVector(contenido)
+        esquema.BufferStart(builder)
+        if datos is not None:
+            esquema.BufferAddData(builder, datos)
+        esquema.BufferAddOffset(builder, self.buffer.offset)
+        esquema.BufferAddSize(builder, self.buffer.size)
+        return esquema.BufferEnd(builder)
+
+
+def empaquetar(contenido, clases):
+    """
+    Reescribe el .tflite del conversor como artefacto único: añade las clases
+    como metadato (cargador_modelo.METADATO_ETIQUETAS) y alinea los datos de
+    cada tensor a ALINEACION bytes (el conversor no lo garantiza), para que el
+    intérprete los use tal cual desde el archivo mapeado en memoria
+    """
+    from tensorflow.lite.python import schema_py_generated as esquema
+    from tensorflow.lite.tools import flatbuffer_utils
+
+    modelo = flatbuffer_utils.convert_bytearray_to_object(contenido)
+    nombre = cargador_modelo.METADATO_ETIQUETAS.encode("utf-8")
+    modelo.metadata = [m for m in modelo.metadata or [] if m.name != nombre]
+
+    etiquetas = esquema.BufferT()
+    etiquetas.data = np.frombuffer("\n".join(clases).encode("utf-8"), dtype=np.uint8)
+    modelo.buffers.append(etiquetas)
+    metadato = esquema.MetadataT()
+    metadato.name = nombre
+    metadato.buffer = len(modelo.buffers) - 1
+    modelo.metadata.append(metadato)
+
+    modelo.buffers = [_BufferAlineado(b) for b in modelo.buffers]
+    return flatbuffer_utils.convert_object_to_bytearray(modelo)
+
+
+def imagenes_muestra(cantidad):
+    """
+    Imágenes de data/ repartidas entre las clases (aleatorias si no hay datos)
+
+    Returns:
+        tuple: (lote uint8 redimensionado, las primeras imágenes con su tamaño original)
+    """
+    imagenes, originales = [], []
+    if os.path.isdir(CARPETA_DATOS):
+        rutas, etiquetas, clases = datos.listar_imagenes(CARPETA_DATOS)
+        por_clase = max(1, cantidad // max(1, len(clases)))
+        vistas = {}
+        for ruta, etiqueta in zip(rutas, etiquetas):
+            if vistas.get(etiqueta, 0) >= por_clase:
+                continue
+            try:
+                with Image.open(ruta) as img:
+                    img = img.convert("RGB")
+                    if len(originales) < MUESTRAS_ORIGINALES:
+                        originales.append(np.asarray(img))
+                    imagenes.append(np.asarray(img.resize(TAMAÑO_IMAGEN[::-1], Image.NEAREST)))
+                vistas[etiqueta] = vistas.get(etiqueta, 0) + 1
+            except OSError:
+                continue
+
+    if not imagenes:
+        print("Aviso: no se encontró data/, se comparan imágenes aleatorias")
+        rng = np.random.default_rng(0)
+        originales = [rng.integers(0, 256, (480 + i, 640 - i, 3), dtype=np.uint8) for i in range(MUESTRAS_ORIGINALES)]
+        imagenes = [np.asarray(Image.fromarray(o).resize(TAMAÑO_IMAGEN[::-1], Image.NEAREST)) for o in originales]
+        imagenes += [rng.integers(0, 256, TAMAÑO_IMAGEN + (3,), dtype=np.uint8) for _ in range(cantidad - len(originales))]
+    return np.stack(imagenes), originales
+
+
+def comparar_predicciones(modelo, ruta_tflite, imagenes, originales, tolerancia):
+    """
+    Compara el .tflite (uint8) con el modelo Keras normalizando fuera como en el
+    entrenamiento: diferencia máxima de probabilidades y clase ganadora. Las
+    imágenes de `originales` se pasan además sin redimensionar
+    """
+    esperado = modelo.predict(imagenes.astype(np.float32) / 255.0, verbose=0)
+    tflite = cargador_modelo.ModeloTFLite(ruta_tflite)
+    obtenido = tflite.predict(imagenes)
+    # Con su tamaño original (de a una, cada una tiene otro tamaño)
+    sin_redimensionar = np.concatenate([tflite.predict(o[np.newaxis]) for o in originales])
+
+    diferencia = float(np.max(np.abs(esperado - obtenido)))
+    diferencia_original = float(np.max(np.abs(esperado[:len(originales)] - sin_redimensionar)))
+    coinciden = float(np.mean(np.argmax(esperado, axis=1) == np.argmax(obtenido, axis=1)))
+    print(f"\nComparación sobre {len(imagenes)} imágenes:")
+    print(f"   Diferencia máxima de probabilidad: {diferencia:.2e} (tolerancia {tolerancia:.0e})")
+    print(f"   Con el tamaño original ({len(originales)} imágenes): {diferencia_original:.2e}")
+    print(f"   Misma clase ganadora: {coinciden * 100:.1f}%")
+    return max(diferencia, diferencia_original) <= tolerancia
+
+
+def medir(formato):
+    """
+    Carga el modelo en uno de los FORMATOS en este proceso y mide tiempo de
+    carga, primera predicción, latencia y memoria
+    """
+    ruta = FORMATOS[formato][1]
+    memoria_inicial = cargador_modelo.memoria_proceso_mb()
+    inicio = time.perf_counter()
+    # La librería se importa aparte: importar TensorFlow suele costar más que el modelo
+    if formato == "tflite":
+        cargador_modelo.clase_interprete()
+    else:
+        import tensorflow
+    importacion = time.perf_counter() - inicio
+    memoria_libreria = cargador_modelo.memoria_proceso_mb()
+    if formato == "tflite":
+        modelo = cargador_modelo.ModeloTFLite(ruta)
+    else:
+        modelo = cargador_modelo.cargar_modelo(ruta, usar_tflite=False)
+    carga = time.perf_counter() - inicio - importacion
+    clases = getattr(modelo, "clases", None)
+
+    forma = (1, TAMAÑO_IMAGEN[0], TAMAÑO_IMAGEN[1], 3)
+    imagen = np.random.default_rng(0).integers(0, 256, forma, dtype=np.uint8)
+    modelo.predict_on_batch(imagen)  # Calentamiento
+    primera = time.perf_counter() - inicio
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        modelo.predict_on_batch(imagen)
+        tiempos.append(time.perf_counter() - inicio)
+
+    memoria_final = cargador_modelo.memoria_proceso_mb()
+    return {
+        "tamaño_mb": tamaño_mb(ruta),
+        "importacion_s": importacion,
+        "carga_s": carga,
+        "primera_s": primera,
+        "clases": "incrustadas" if clases else "aparte",
+        "latencia_ms": float(np.median(tiempos) * 1000),
+        "memoria_mb": memoria_final,
+        "memoria_libreria_mb": (memoria_libreria - memoria_inicial) if memoria_final else None,
+        "memoria_modelo_mb": (memoria_final - memoria_libreria) if memoria_final else None,
+    }
+
+
+def tamaño_mb(ruta):
+    """Tamaño en disco de un archivo o de una carpeta (SavedModel)"""
+    if os.path.isdir(ruta):
+        return sum(os.path.getsize(os.path.join(raiz, n))
+                   for raiz, _, nombres in os.walk(ruta) for n in nombres) / 1e6
+    return os.path.getsize(ruta) / 1e6
+
+
+def medir_en_subproceso(formato):
+    """Cada medición en un proceso nuevo para que la memoria de uno no cuente en el otro"""
+    salida = subprocess.run([sys.executable, os.path.abspath(__file__), "--medir", formato],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def medir_formatos():
+    """Mediciones de los FORMATOS que existen en disco, cada uno en su proceso"""
+    return {formato: medir_en_subproceso(formato)
+            for formato, (_, ruta) in FORMATOS.items() if os.path.exists(ruta)}
+
+
+def mostrar_comparacion(resultados):
+    def formato(valor, patron):
+        return patron.format(valor) if valor is not None else "n/d"
+
+    filas = [
+        ("Tamaño en disco", "tamaño_mb", "{:.1f} MB"),
+        ("Importar la librería", "importacion_s", "{:.2f} s"),
+        ("Carga del modelo", "carga_s", "{:.2f} s"),
+        ("Hasta 1ª predicción", "primera_s", "{:.2f} s"),
+        ("Clases", "clases", "{}"),
+        ("Latencia (1 imagen)", "latencia_ms", "{:.2f} ms"),
+        ("Memoria del proceso", "memoria_mb", "{:.0f} MB"),
+        ("Memoria de la librería", "memoria_libreria_mb", "{:.0f} MB"),
+        ("Memoria del modelo", "memoria_modelo_mb", "{:.0f} MB"),
+    ]
+    ancho = 30 + 20 * len(resultados)
+    print("\n" + "=" * ancho)
+    print(f"{'':30}" + "".join(f"{FORMATOS[f][0]:>20}" for f in resultados))
+    print("=" * ancho)
+    for nombre, clave, patron in filas:
+        print(f"{nombre:30}" + "".join(f"{formato(r[clave], patron):>20}" for r in resultados.values()))
+    print("=" * ancho)
+    print("Cada formato se mide en un proceso nuevo. 'Memoria del modelo' es lo que crece la "
+          "memoria residente (RSS) al cargar el modelo y predecir, ya importada la librería.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta el modelo de frutas a TensorFlow Lite")
+    parser.add_argument("--cuantizar", action="store_true", help="Cuantizar los pesos a 8 bits")
+    parser.add_argument("--tolerancia", type=float, help="Diferencia máxima de probabilidad aceptada")
+    parser.add_argument("--muestras", type=int, default=MUESTRAS, help="Imágenes para comparar Keras y TFLite")
+    parser.add_argument("--medir", choices=list(FORMATOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir)))
+        sys.exit(0)
+
+    if not os.path.exists(RUTA_MODELO):
+        print(f"ERROR: No existe {RUTA_MODELO}. Ejecuta primero scripts/train_model.py")
+        sys.exit(1)
+
+    ruta_salida = cargador_modelo.ruta_tflite(RUTA_MODELO)
+    modelo = exportar_tflite(RUTA_MODELO, ruta_salida, args.cuantizar)
+
+    tolerancia = args.tolerancia or (TOLERANCIA_CUANTIZADO if args.cuantizar else TOLERANCIA)
+    if not comparar_predicciones(modelo, ruta_salida, *imagenes_muestra(args.muestras), tolerancia):
+        os.remove(ruta_salida)
+        print("ERROR: el modelo TFLite no coincide con el modelo Keras; se eliminó el .tflite")
+        sys.exit(1)
+
+    mostrar_comparacion(medir_formatos())
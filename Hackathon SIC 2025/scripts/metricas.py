@@ -0,0 +1,201 @@
+"""
+Tiempos por etapa de la inferencia (abrir la imagen, procesarla, cargar el
+modelo, predict, gráficas...) con percentiles p50/p95/p99 sobre las últimas
+mediciones, más contadores.
+
+Se activa con la variable de entorno METRICAS_LATENCIA=1 (o con configurar()).
+Desactivado, medir() devuelve siempre el mismo objeto vacío y contar() no hace
+nada, así que el costo es una comprobación de un booleano.
+
+Los resultados se escriben en metricas/<nombre>.json y metricas/<nombre>.prom
+(formato de texto de Prometheus, sirve para el textfile collector de
+node_exporter) y, opcionalmente, se sirven por HTTP en /metrics y /metricas.json.
+
+Uso:
+    from metricas import registro
+    with registro.medir('predict'):
+        modelo.predict(...)
+    registro.contar('aciertos_cache')
+    registro.guardar()
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+import numpy as np
+
+ACTIVAS = os.environ.get('METRICAS_LATENCIA', '0') == '1'
+PUERTO_HTTP = int(os.environ.get('METRICAS_PUERTO', '0'))  # 0 = sin endpoint HTTP
+CARPETA_METRICAS = "metricas"
+VENTANA = 2048  # Últimas mediciones por etapa usadas para los percentiles
+PERCENTILES = (50, 95, 99)
+
+
+class _SinMedicion:
+    """Contexto vacío que se devuelve cuando las métricas están desactivadas"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+_SIN_MEDICION = _SinMedicion()
+
+
+class _Medicion:
+    def __init__(self, registro, etapa):
+        self.registro = registro
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, *excepcion):
+        self.registro.registrar(self.etapa, time.perf_counter() - self.inicio, error=tipo is not None)
+        return False
+
+
+class Metricas:
+    """Histogramas móviles por etapa y contadores (se puede usar desde varios hilos)"""
+
+    def __init__(self, nombre, activas=ACTIVAS, ventana=VENTANA):
+        self.nombre = nombre
+        self.activas = activas
+        self.ventana = ventana
+        self.bloqueo = threading.Lock()
+        self.etapas = {}      # etapa -> {'recientes': deque, 'cantidad', 'total', 'errores'}
+        self.contadores = {}
+
+    def medir(self, etapa):
+        """Context manager que suma la duración del bloque a `etapa`"""
+        if not self.activas:
+            return _SIN_MEDICION
+        return _Medicion(self, etapa)
+
+    def registrar(self, etapa, segundos, error=False):
+        if not self.activas:
+            return
+        with self.bloqueo:
+            datos = self.etapas.get(etapa)
+            if datos is None:
+                datos = self.etapas[etapa] = {'recientes': deque(maxlen=self.ventana),
+                                              'cantidad': 0, 'total': 0.0, 'errores': 0}
+            datos['recientes'].append(segundos)
+            datos['cantidad'] += 1
+            datos['total'] += segundos
+            datos['errores'] += error
+
+    def contar(self, contador, cantidad=1):
+        if not self.activas:
+            return
+        with self.bloqueo:
+            self.contadores[contador] = self.contadores.get(contador, 0) + cantidad
+
+    def resumen(self):
+        """Diccionario con cantidad, total y percentiles (ms) por etapa, más los contadores"""
+        with self.bloqueo:
+            copia = {etapa: (list(d['recientes']), d['cantidad'], d['total'], d['errores'])
+                     for etapa, d in self.etapas.items()}
+            contadores = dict(self.contadores)
+
+        etapas = {}
+        for etapa, (recientes, cantidad, total, errores) in copia.items():
+            etapas[etapa] = {
+                'cantidad': cantidad,
+                'errores': errores,
+                'total_s': total,
+                'media_ms': total / cantidad * 1000,
+                **{f'p{p}_ms': float(np.percentile(recientes, p)) * 1000 for p in PERCENTILES},
+            }
+        return {'nombre': self.nombre, 'ventana': self.ventana, 'etapas': etapas, 'contadores': contadores}
+
+    def texto_prometheus(self):
+        """Formato de texto de Prometheus (summary por etapa y un counter por contador)"""
+        resumen = self.resumen()
+        lineas = [
+            '# HELP inferencia_etapa_segundos Duración de cada etapa de la inferencia',
+            '# TYPE inferencia_etapa_segundos summary',
+        ]
+        for etapa, datos in resumen['etapas'].items():
+            etiquetas = f'origen="{self.nombre}",etapa="{etapa}"'
+            for p in PERCENTILES:
+                lineas.append(f'inferencia_etapa_segundos{{{etiquetas},quantile="{p / 100}"}} {datos[f"p{p}_ms"] / 1000:.6f}')
+            lineas.append(f'inferencia_etapa_segundos_sum{{{etiquetas}}} {datos["total_s"]:.6f}')
+            lineas.append(f'inferencia_etapa_segundos_count{{{etiquetas}}} {datos["cantidad"]}')
+        for contador, valor in resumen['contadores'].items():
+            lineas.append(f'# TYPE inferencia_{contador}_total counter')
+            lineas.append(f'inferencia_{contador}_total{{origen="{self.nombre}"}} {valor}')
+        return '\n'.join(lineas) + '\n'
+
+    def guardar(self, carpeta=CARPETA_METRICAS):
+        """Escribe <nombre>.json y <nombre>.prom (de forma atómica, para que no se lean a medias)"""
+        if not self.activas:
+            return
+        os.makedirs(carpeta, exist_ok=True)
+        contenidos = {
+            f'{self.nombre}.json': json.dumps(self.resumen(), ensure_ascii=False, indent=2),
+            f'{self.nombre}.prom': self.texto_prometheus(),
+        }
+        for archivo, contenido in contenidos.items():
+            ruta = os.path.join(carpeta, archivo)
+            ruta_tmp = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(ruta_tmp, 'w', encoding='utf-8') as f:
+                f.write(contenido)
+            os.replace(ruta_tmp, ruta)
+
+    def mostrar(self):
+        """Tabla de percentiles por etapa en la consola"""
+        resumen = self.resumen()
+        print("\n" + "=" * 72)
+        print(f"{'Etapa':22}{'Cantidad':>10}{'p50':>12}{'p95':>12}{'p99':>12}")
+        print("=" * 72)
+        for etapa, d in resumen['etapas'].items():
+            print(f"{etapa:22}{d['cantidad']:>10}{d['p50_ms']:>10.2f}ms{d['p95_ms']:>10.2f}ms{d['p99_ms']:>10.2f}ms")
+        for contador, valor in resumen['contadores'].items():
+            print(f"{contador:22}{valor:>10}")
+        print("=" * 72)
+
+    def servir_http(self, puerto, host='127.0.0.1'):
+        """Sirve /metrics (Prometheus) y /metricas.json en un hilo en segundo plano"""
+        # Se importa aquí para no alargar el arranque de predecir.py
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registro = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    cuerpo, tipo = registro.texto_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metricas.json':
+                    cuerpo, tipo = json.dumps(registro.resumen(), ensure_ascii=False), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                datos = cuerpo.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', f'{tipo}; charset=utf-8')
+                self.send_header('Content-Length', str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def log_message(self, *args):
+                pass
+
+        servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        return servidor
+
+
+def configurar(nombre, activas=None):
+    """Nombre del registro global (archivos y etiqueta origen) y, si se indica, activarlo o no"""
+    registro.nombre = nombre
+    if activas is not None:
+        registro.activas = activas
+    return registro
+
+
+# Registro del proceso: lo comparten los módulos y, en Streamlit, todas las sesiones
+registro = Metricas('inferencia')
@@ -0,0 +1,216 @@
+"""
+Inferencia compartida por todas las sesiones de la aplicación web.
+
+Streamlit ejecuta el script de cada sesión en su propio hilo. Si cada sesión
+llama a model.predict, veinte usuarios a la vez son veinte lotes de una imagen
+que compiten por los mismos núcleos (y por el bloqueo del intérprete TFLite).
+MicroLotes tiene un único hilo de inferencia con una cola: cada sesión deja sus
+imágenes y espera su Future; el hilo junta todo lo que se acumuló en la cola
+mientras predecía el lote anterior (hasta LOTE_MAXIMO imágenes) y hace un solo
+predict_on_batch. Con VENTANA_MS > 0 espera además unos milisegundos a que
+lleguen más; por defecto no espera, así que con un solo usuario la latencia es
+la de predict.
+
+El hilo carga el modelo la primera vez que hace falta. Tras INACTIVIDAD_S sin
+peticiones termina y suelta el modelo; la siguiente petición lo vuelve a
+arrancar. Así, un MicroLotes que deja de usarse (por ejemplo, porque la app creó
+otro al reexportar el modelo) no se queda con el modelo en memoria.
+
+herramientas/servidor_inferencia.py usa esta misma clase para el modelo de
+frutas, con inactividad_s=None (el hilo no termina nunca: el modelo ya está
+cargado) y sin `registro`, que es opcional (la app le pasa el de metricas.py
+para medir los lotes y la espera en la cola).
+
+Prueba de carga (N sesiones simuladas con hilos, cada una pide de a una imagen,
+con predict directo como antes y con MicroLotes):
+    python scripts/micro_lotes.py --usuarios 1,5,10,20,40
+"""
+
+import os
+import argparse
+import contextlib
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+
+# CONFIGURACIÓN
+LOTE_MAXIMO = 32     # Máximo de imágenes por llamada a predict
+VENTANA_MS = 0       # Milisegundos que se esperan para juntar peticiones (0: solo las que ya esperan)
+INACTIVIDAD_S = 600  # Segundos sin peticiones tras los que se suelta el modelo (None: nunca)
+RUTA_MODELO = os.path.join("models", "modelo_frutas")  # Solo para la prueba de carga
+IMAGEN_ANCHO = 224
+IMAGEN_ALTO = 224
+PETICIONES_POR_USUARIO = 20
+
+
+class MicroLotes:
+    """
+    Hilo que agrupa las imágenes de varias sesiones en un solo predict.
+    Cada petición recibe un Future con sus filas de probabilidades.
+    """
+
+    def __init__(self, cargar, lote_maximo=LOTE_MAXIMO, ventana_ms=VENTANA_MS,
+                 inactividad_s=INACTIVIDAD_S, registro=None):
+        self.cargar = cargar  # Devuelve el modelo; se llama desde el hilo de inferencia
+        self.lote_maximo = lote_maximo
+        self.ventana = ventana_ms / 1000
+        self.inactividad = inactividad_s
+        self.registro = registro  # metricas.Metricas del proyecto, o None para no medir
+        self.cola = queue.Queue()
+        self.bloqueo = threading.Lock()
+        self.hilo = None
+        self.lotes = 0
+        self.imagenes = 0
+        self.segundos_predict = 0.0
+        self.tamaños_lote = Counter()
+
+    def enviar(self, imagenes):
+        """Encola un arreglo uint8 (n, alto, ancho, 3) y devuelve un Future"""
+        futuro = Future()
+        with self.bloqueo:
+            self.cola.put((np.asarray(imagenes), futuro, time.perf_counter()))
+            if self.hilo is None:
+                self.hilo = threading.Thread(target=self._bucle, name="micro_lotes", daemon=True)
+                self.hilo.start()
+        return futuro
+
+    def predecir(self, imagenes, timeout=None):
+        """Como model.predict_on_batch, pero compartiendo el lote con las demás sesiones"""
+        return self.enviar(imagenes).result(timeout)
+
+    def _bucle(self):
+        modelo = None
+        while True:
+            try:
+                pendientes = [self.cola.get(timeout=self.inactividad)]
+            except queue.Empty:
+                with self.bloqueo:
+                    # enviar() encola con el bloqueo tomado: si sigue vacía, nadie espera
+                    if self.cola.empty():
+                        self.hilo = None
+                        return
+                continue
+            num_imagenes = len(pendientes[0][0])
+            limite = time.monotonic() + self.ventana
+            while num_imagenes < self.lote_maximo:
+                restante = limite - time.monotonic()
+                try:
+                    # Pasada la ventana se siguen tomando las que ya esperan en la cola
+                    pendientes.append(self.cola.get(timeout=restante) if restante > 0 else self.cola.get_nowait())
+                except queue.Empty:
+                    break
+                num_imagenes += len(pendientes[-1][0])
+
+            try:
+                if modelo is None:
+                    modelo = self.cargar()
+            except Exception as e:
+                for _, futuro, _ in pendientes:
+                    futuro.set_exception(e)
+                continue
+            self._predecir(modelo, pendientes, num_imagenes)
+
+    def _medir(self, etapa):
+        """registro.medir(etapa), o un contexto vacío si no hay registro"""
+        return self.registro.medir(etapa) if self.registro is not None else contextlib.nullcontext()
+
+    def _predecir(self, modelo, pendientes, num_imagenes):
+        inicio = time.perf_counter()
+        try:
+            lote = np.concatenate([imgs for imgs, _, _ in pendientes])
+            inicio_predict = time.perf_counter()
+            with self._medir("predict_lote"):
+                probabilidades = np.asarray(modelo.predict_on_batch(lote))
+            duracion = time.perf_counter() - inicio_predict
+        except Exception as e:
+            for _, futuro, _ in pendientes:
+                futuro.set_exception(e)
+            return
+
+        with self.bloqueo:
+            self.lotes += 1
+            self.imagenes += num_imagenes
+            self.segundos_predict += duracion
+            self.tamaños_lote[num_imagenes] += 1
+        if self.registro is not None:
+            self.registro.contar("predicciones", num_imagenes)
+
+        desde = 0
+        for imgs, futuro, llegada in pendientes:
+            if self.registro is not None:
+                self.registro.registrar("espera_micro_lotes", inicio - llegada)
+            futuro.set_result(probabilidades[desde:desde + len(imgs)])
+            desde += len(imgs)
+
+    def estadisticas(self):
+        with self.bloqueo:
+            return {
+                "cola": self.cola.qsize(),
+                "lotes": self.lotes,
+                "imagenes": self.imagenes,
+                "tamaño_medio_lote": round(self.imagenes / self.lotes, 2) if self.lotes else 0,
+                "ms_predict_medio": round(1000 * self.segundos_predict / self.lotes, 2) if self.lotes else 0,
+                "histograma_lotes": {str(k): v for k, v in sorted(self.tamaños_lote.items())},
+            }
+
+
+def simular_usuarios(predecir, usuarios, peticiones=PETICIONES_POR_USUARIO):
+    """
+    `usuarios` hilos a la vez, cada uno con `peticiones` predicciones de una
+    imagen seguidas (como alguien que pulsa Predecir una y otra vez)
+
+    Returns:
+        dict: latencias p50/p95 en ms e imágenes/s
+    """
+    imagen = np.random.default_rng(0).integers(0, 256, (1, IMAGEN_ALTO, IMAGEN_ANCHO, 3), dtype=np.uint8)
+
+    def usuario(_):
+        tiempos = []
+        for _ in range(peticiones):
+            inicio = time.perf_counter()
+            predecir(imagen)
+            tiempos.append(time.perf_counter() - inicio)
+        return tiempos
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=usuarios) as pool:
+        latencias = np.concatenate(list(pool.map(usuario, range(usuarios))))
+    total = time.perf_counter() - inicio
+    return {
+        "p50_ms": float(np.percentile(latencias, 50) * 1000),
+        "p95_ms": float(np.percentile(latencias, 95) * 1000),
+        "imagenes_por_s": len(latencias) / total,
+    }
+
+
+if __name__ == "__main__":
+    import cargador_modelo
+
+    parser = argparse.ArgumentParser(description="Prueba de carga: predict directo por sesión frente a MicroLotes")
+    parser.add_argument("--usuarios", default="1,5,10,20,40", help="Sesiones simultáneas (separadas por comas)")
+    parser.add_argument("--peticiones", type=int, default=PETICIONES_POR_USUARIO, help="Predicciones por sesión")
+    parser.add_argument("--ventana-ms", type=float, default=VENTANA_MS)
+    parser.add_argument("--sin-tflite", action="store_true", help="Usar el modelo Keras aunque exista el .tflite")
+    args = parser.parse_args()
+
+    modelo = cargador_modelo.cargar_modelo(RUTA_MODELO, usar_tflite=not args.sin_tflite)
+    lotes = MicroLotes(lambda: modelo, ventana_ms=args.ventana_ms)
+    imagen = np.zeros((1, IMAGEN_ALTO, IMAGEN_ANCHO, 3), dtype=np.uint8)
+    modelo.predict_on_batch(imagen)  # Calentamiento
+    lotes.predecir(imagen)
+
+    print("\n" + "="*78)
+    print(f"{'Usuarios':>9}{'Directo p50':>14}{'p95':>10}{'img/s':>9}{'MicroLotes p50':>17}{'p95':>10}{'img/s':>9}")
+    print("="*78)
+    for usuarios in [int(u) for u in args.usuarios.split(",")]:
+        directo = simular_usuarios(modelo.predict_on_batch, usuarios, args.peticiones)
+        agrupado = simular_usuarios(lotes.predecir, usuarios, args.peticiones)
+        print(f"{usuarios:>9}{directo['p50_ms']:>11.1f} ms{directo['p95_ms']:>7.1f} ms{directo['imagenes_por_s']:>9.1f}"
+              f"{agrupado['p50_ms']:>14.1f} ms{agrupado['p95_ms']:>7.1f} ms{agrupado['imagenes_por_s']:>9.1f}")
+    print("="*78)
+    estadisticas = lotes.estadisticas()
+    print(f"Tamaño medio de lote con MicroLotes: {estadisticas['tamaño_medio_lote']} "
+          f"({estadisticas['lotes']} llamadas a predict)")
@@ -0,0 +1,29 @@
+"""
+Arquitectura del clasificador de frutas: MobileNetV2 + cabeza de 15 clases.
+
+Está aparte de train_model.py (un script que entrena al importarse) para que
+las herramientas que entrenan o miden el modelo usen exactamente la misma red.
+"""
+
+from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2
+from tensorflow.keras.models import Model
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
+
+# CONFIGURACIÓN
+TAMAÑO_IMAGEN = (224, 224)
+NUM_CLASES = 15
+
+
+def crear_modelo(pesos='imagenet'):
+    """MobileNetV2 + cabeza de 15 clases (usa la política de precisión activa); devuelve (base, modelo)"""
+    modelo_base = MobileNetV2(weights=pesos, include_top=False, input_shape=TAMAÑO_IMAGEN + (3,))
+
+    # Añadir capas personalizadas
+    x = modelo_base.output
+    x = GlobalAveragePooling2D()(x)
+    x = Dense(1024, activation='relu')(x)
+    # Softmax siempre en float32 para que las probabilidades no pierdan precisión
+    predicciones = Dense(NUM_CLASES, activation='softmax', dtype='float32')(x)
+
+    # Crear modelo completo
+    return modelo_base, Model(inputs=modelo_base.input, outputs=predicciones)
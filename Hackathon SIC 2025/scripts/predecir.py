@@ -1,13 +1,33 @@
-import tensorflow as tf
+# TensorFlow no se importa aquí: solo hace falta para cargar el modelo Keras
+# (cargador_modelo lo importa entonces), no para validar argumentos, leer la
+# caché de predicciones ni usar el modelo TFLite con tflite-runtime.
+#
+# También se puede importar como librería: importarlo no carga nada, el modelo
+# se carga en la primera predicción que lo necesite.
+#     import predecir
+#     for r in predecir.predecir_lote(["a.jpg", open("b.png", "rb").read(), arreglo_rgb]):
+#         print(r.get("nombre"), r.get("confianza"), r.get("error"))
 import numpy as np
-from tensorflow.keras.preprocessing import image
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import argparse
+import time
 import sys
+import io
 import os
+from cache_predicciones import CachePredicciones, huella_modelo, CARPETA_CACHE_PREDICCIONES
+import cargador_modelo
+import datos
+import metricas
 
 # CONFIGURACIÓN
-RUTA_MODELO = "models\modelo_frutas"
+RUTA_MODELO = os.path.join("models", "modelo_frutas")
 TAMAÑO_IMAGEN = (224, 224)
+USAR_TFLITE = True  # Usa models/modelo_frutas.tflite si existe (ver scripts/exportar_modelo.py)
+TAMAÑO_LOTE = 32    # Imágenes por llamada al modelo en predecir_lote
+TOP_K = 5           # Clases más probables que se devuelven por imagen
 
 # Lista de clases (15 clases en orden alfabético en español)
 CLASES = [
@@ -18,55 +38,251 @@ CLASES = [
     'papaya_madura', 'papaya_podrida', 'papaya_verde'
 ]
 
+def pausar(mensaje):
+    """Espera ENTER solo si hay alguien en la terminal (no en bucles de shell ni con la entrada redirigida)"""
+    if sys.stdin.isatty():
+        input(mensaje)
+
 # CARGAR MODELO
-print("=" * 70)
-print("CARGANDO MODELO")
-print("=" * 70)
-print(f"Ruta del modelo: {RUTA_MODELO}")
-
-try:
-    modelo = tf.keras.models.load_model(RUTA_MODELO)
-    print("Modelo cargado exitosamente")
-    print(f"   Entrada: {modelo.input_shape}")
-    print(f"   Salida: {modelo.output_shape}")
-except Exception as e:
-    print(f"\nERROR al cargar modelo: {e}")
-    print("\nVerifica que:")
-    print("  1. Ejecutaste train_model_es.py primero")
-    print("  2. El modelo se guardó correctamente")
-    print(f"  3. La ruta {RUTA_MODELO} existe")
-    input("\nPresiona ENTER para salir...")
-    sys.exit(1)
-
-# FUNCIÓN DE PREDICCIÓN
-def predecir_fruta(ruta_imagen):
+# Se carga solo cuando hace falta: si la imagen ya está en la caché de
+# predicciones, el modelo no se llega a cargar
+modelo = None
+clases = None
+cache = None
+_bloqueo = threading.Lock()
+
+def cargar_modelo():
+    """
+    Carga el modelo (una sola vez por proceso, aunque lo pidan varios hilos a la vez)
+
+    Returns:
+        El modelo, o None si no se pudo cargar
+    """
+    global modelo
+    if modelo is not None:
+        return modelo
+
+    with _bloqueo:
+        if modelo is not None:
+            return modelo
+        print("=" * 70)
+        print("CARGANDO MODELO")
+        print("=" * 70)
+        print(f"Ruta del modelo: {RUTA_MODELO}")
+
+        try:
+            with metricas.registro.medir("cargar_modelo"):
+                cargado = cargador_modelo.cargar_modelo(RUTA_MODELO, USAR_TFLITE)
+            print(f"Modelo cargado exitosamente ({'TFLite' if isinstance(cargado, cargador_modelo.ModeloTFLite) else 'Keras'})")
+            print(f"   Entrada: {cargado.input_shape}")
+            print(f"   Salida: {cargado.output_shape}")
+            modelo = cargado
+        except Exception as e:
+            print(f"\nERROR al cargar modelo: {e}")
+            print("\nVerifica que:")
+            print("  1. Ejecutaste train_model_es.py primero")
+            print("  2. El modelo se guardó correctamente")
+            print(f"  3. La ruta {RUTA_MODELO} existe")
+    return modelo
+
+def obtener_clases():
+    """Clases en el orden de salida del modelo: las incrustadas en el .tflite o, con Keras, CLASES"""
+    global clases
+    if clases is None:
+        clases = cargador_modelo.leer_clases(RUTA_MODELO, CLASES, USAR_TFLITE)
+    return clases
+
+def obtener_cache():
+    """Caché de predicciones (memoria + disco, compartida entre ejecuciones), creada al primer uso"""
+    global cache
+    if cache is None:
+        with _bloqueo:
+            if cache is None:
+                cache = CachePredicciones(carpeta_disco=CARPETA_CACHE_PREDICCIONES)
+    return cache
+
+def calentar():
+    """
+    Carga el modelo y hace una predicción de prueba. Deja las librerías y el
+    modelo en la caché del sistema operativo, así las siguientes ejecuciones
+    arrancan antes.
+    """
+    inicio = time.perf_counter()
+    if cargar_modelo() is None:
+        return False
+    modelo.predict_on_batch(np.zeros((1, TAMAÑO_IMAGEN[0], TAMAÑO_IMAGEN[1], 3), dtype=np.uint8))
+    print(f"Modelo listo en {time.perf_counter() - inicio:.2f} s")
+    return True
+
+# PREDICCIÓN POR LOTES
+def _leer_entrada(entrada, cache_activa, huella):
+    """
+    Decodifica una entrada dentro del pool de hilos (ruta, bytes de un archivo
+    de imagen o arreglo RGB uint8 de cualquier tamaño).
+
+    Returns:
+        tuple: (imagen uint8 del TAMAÑO_IMAGEN, clave de caché, probabilidades en caché, error)
+    """
+    try:
+        if isinstance(entrada, np.ndarray):
+            if entrada.dtype != np.uint8:
+                raise ValueError(f"se esperaba un arreglo uint8 y llegó {entrada.dtype}")
+            if entrada.shape != TAMAÑO_IMAGEN + (3,):
+                # Se reduce aquí para apilarla con el resto del lote; da los mismos
+                # píxeles que datos.leer_imagen_uint8 y que el propio modelo
+                with metricas.registro.medir("procesar_imagen"):
+                    imagen = Image.fromarray(entrada).convert("RGB").resize(TAMAÑO_IMAGEN[::-1], Image.NEAREST)
+                    entrada = np.asarray(imagen, dtype=np.uint8)
+            return entrada, None, None, None
+
+        if isinstance(entrada, (bytes, bytearray, memoryview)):
+            contenido = bytes(entrada)
+        else:
+            with open(entrada, "rb") as f:
+                contenido = f.read()
+        clave = None
+        if cache_activa is not None and huella is not None:
+            # Mismos bytes + mismo modelo = mismo resultado
+            with metricas.registro.medir("cache"):
+                clave = cache_activa.clave(contenido, huella)
+                probabilidades = cache_activa.obtener(clave)
+            if probabilidades is not None:
+                return None, clave, probabilidades, None
+        with metricas.registro.medir("procesar_imagen"):
+            imagen = datos.leer_imagen_uint8(io.BytesIO(contenido), TAMAÑO_IMAGEN)
+        return imagen, clave, None, None
+    except Exception as e:
+        return None, None, None, str(e)
+
+def top_k(probabilidades, k=TOP_K):
+    """
+    Las k clases más probables de cada fila de un lote de probabilidades, de
+    mayor a menor, calculadas para todo el lote a la vez
+
+    Returns:
+        tuple: (índices (lote, k), probabilidades (lote, k))
+    """
+    k = min(k, probabilidades.shape[1])
+    indices = np.argpartition(-probabilidades, k - 1, axis=1)[:, :k]
+    elegidas = np.take_along_axis(probabilidades, indices, axis=1)
+    orden = np.argsort(-elegidas, axis=1, kind="stable")
+    return np.take_along_axis(indices, orden, axis=1), np.take_along_axis(elegidas, orden, axis=1)
+
+def _en_bloques(entradas, tamaño):
+    bloque = []
+    for entrada in entradas:
+        bloque.append(entrada)
+        if len(bloque) == tamaño:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+def _resolver_bloque(leidas, cache_activa):
+    """Probabilidades de un bloque ya decodificado: las de la caché y una llamada a predict para el resto"""
+    probabilidades = [probs for _, _, probs, _ in leidas]
+    errores = [error for _, _, _, error in leidas]
+    por_predecir = [i for i, (imagen, _, _, _) in enumerate(leidas) if imagen is not None]
+    aciertos = sum(p is not None for p in probabilidades)
+    if aciertos:
+        metricas.registro.contar("aciertos_cache", aciertos)
+    if por_predecir:
+        if cargar_modelo() is None:
+            for i in por_predecir:
+                errores[i] = f"no se pudo cargar el modelo {RUTA_MODELO}"
+        else:
+            lote = np.stack([leidas[i][0] for i in por_predecir])
+            with metricas.registro.medir("predict_lote" if len(por_predecir) > 1 else "predict"):
+                salida = modelo.predict_on_batch(lote)
+            metricas.registro.contar("predicciones", len(por_predecir))
+            for i, probs in zip(por_predecir, np.asarray(salida)):
+                probabilidades[i] = probs
+                clave = leidas[i][1]
+                if clave:
+                    cache_activa.guardar(clave, probs)
+    fallidas = sum(e is not None for e in errores)
+    if fallidas:
+        metricas.registro.contar("errores", fallidas)
+    return probabilidades, errores
+
+def predecir_lote(entradas, usar_cache=True, tamaño_lote=TAMAÑO_LOTE, k=TOP_K, trabajadores=None):
+    """
+    Predice muchas imágenes con una llamada al modelo por lote. Se puede llamar
+    desde varios hilos: el modelo y la caché se crean una sola vez.
+
+    Las entradas pueden ser rutas, bytes de un archivo de imagen o arreglos
+    RGB uint8 (alto, ancho, 3) de cualquier tamaño, mezclados. Se decodifican
+    en un pool de hilos mientras el modelo predice el lote anterior, y el top-k
+    se calcula para todo el lote a la vez. Las rutas y los bytes ya analizados
+    con este mismo modelo salen de la caché.
+
+    Returns:
+        list: un dict por entrada y en el mismo orden, con 'clase', 'nombre'
+        (formateado), 'confianza', 'top' [(clase, probabilidad), ...],
+        'probabilidades' y 'desde_cache'; o con 'error' si no se pudo analizar
+    """
+    nombres = obtener_clases()
+    cache_activa = obtener_cache() if usar_cache else None
+    huella = None
+    if cache_activa is not None:
+        artefacto = cargador_modelo.ruta_artefacto(RUTA_MODELO, USAR_TFLITE)
+        if os.path.exists(artefacto):
+            huella = huella_modelo(artefacto, f"{TAMAÑO_IMAGEN[0]}x{TAMAÑO_IMAGEN[1]}")
+
+    resultados = []
+    with ThreadPoolExecutor(max_workers=trabajadores or os.cpu_count()) as pool:
+        pendientes = deque()
+        bloques = _en_bloques(entradas, tamaño_lote)
+
+        def encolar_siguiente():
+            bloque = next(bloques, None)
+            if bloque is not None:
+                pendientes.append([pool.submit(_leer_entrada, e, cache_activa, huella) for e in bloque])
+
+        # Dos bloques en vuelo: se decodifica el siguiente mientras se predice el actual
+        encolar_siguiente()
+        encolar_siguiente()
+        while pendientes:
+            leidas = [futuro.result() for futuro in pendientes.popleft()]
+            encolar_siguiente()
+            probabilidades, errores = _resolver_bloque(leidas, cache_activa)
+
+            validas = [i for i, probs in enumerate(probabilidades) if probs is not None]
+            por_entrada = [{"error": error} for error in errores]
+            if validas:
+                matriz = np.stack([probabilidades[i] for i in validas])
+                indices, valores = top_k(matriz, k)
+                for fila, i in enumerate(validas):
+                    clase = nombres[indices[fila, 0]]
+                    por_entrada[i] = {
+                        "clase": clase,
+                        "nombre": formatear_nombre_clase(clase),
+                        "confianza": float(valores[fila, 0]),
+                        "top": [(nombres[j], float(v)) for j, v in zip(indices[fila], valores[fila])],
+                        "probabilidades": matriz[fila],
+                        "desde_cache": leidas[i][2] is not None,
+                    }
+            resultados.extend(por_entrada)
+    return resultados
+
+def predecir_fruta(ruta_imagen, usar_cache=True):
     """
     Predice el estado de madurez de una fruta
     
     Args:
         ruta_imagen: Ruta a la imagen
+        usar_cache: Buscar/guardar el resultado en la caché de predicciones
         
     Returns:
         tuple: (clase_predicha, confianza, todas_las_probabilidades)
     """
-    try:
-        # Cargar y preprocesar imagen
-        img = image.load_img(ruta_imagen, target_size=TAMAÑO_IMAGEN)
-        img_array = image.img_to_array(img)
-        img_array = img_array / 255.0  # Normalizar
-        img_array = np.expand_dims(img_array, axis=0)  # Añadir dimensión de lote
-        
-        # Realizar predicción
-        predicciones = modelo.predict(img_array, verbose=0)
-        indice_predicho = np.argmax(predicciones[0])
-        confianza = predicciones[0][indice_predicho]
-        clase_predicha = CLASES[indice_predicho]
-        
-        return clase_predicha, confianza, predicciones[0]
-    
-    except Exception as e:
-        print(f"\nERROR al procesar imagen: {e}")
+    resultado = predecir_lote([ruta_imagen], usar_cache)[0]
+    if "error" in resultado:
+        print(f"\nERROR al procesar imagen: {resultado['error']}")
         return None, None, None
+    if resultado["desde_cache"]:
+        print("Resultado obtenido de la caché de predicciones")
+    return resultado["clase"], resultado["confianza"], resultado["probabilidades"]
 
 def formatear_nombre_clase(nombre_clase):
     """
@@ -78,19 +294,35 @@ def formatear_nombre_clase(nombre_clase):
 
 # MAIN
 if __name__ == "__main__":
+    # Los argumentos se validan antes de cargar nada pesado
+    parser = argparse.ArgumentParser(description="Predice el estado de madurez de una fruta")
+    parser.add_argument("imagen", nargs="?", help="Ruta a la imagen")
+    parser.add_argument("--sin-cache", action="store_true", help="No usar la caché de predicciones")
+    parser.add_argument("--sin-tflite", action="store_true", help="Usar el modelo Keras aunque exista el .tflite")
+    parser.add_argument("--calentar", action="store_true",
+                        help="Solo cargar el modelo y hacer una predicción de prueba (p. ej. al encender el equipo)")
+    parser.add_argument("--metricas", action="store_true", default=metricas.ACTIVAS,
+                        help="Medir el tiempo de cada etapa y guardarlo en metricas/predecir.json y .prom")
+    args = parser.parse_args()
+    USAR_TFLITE = not args.sin_tflite
+    metricas.configurar("predecir", activas=args.metricas)
+
     print("\n" + "=" * 70)
-    
-    if len(sys.argv) < 2:
+
+    if args.calentar:
+        sys.exit(0 if calentar() else 1)
+
+    if args.imagen is None:
         print("USO DEL SCRIPT")
         print("=" * 70)
         print("python scripts/predecir.py <ruta_a_imagen>")
         print("\nEjemplo:")
         print("  python scripts/predecir.py imagenes_prueba/banana.jpg")
         print("=" * 70)
-        input("\nPresiona ENTER para salir...")
+        pausar("\nPresiona ENTER para salir...")
         sys.exit(1)
     
-    ruta_imagen = sys.argv[1]
+    ruta_imagen = args.imagen
     
     # Verificar que existe la imagen
     if not os.path.exists(ruta_imagen):
@@ -99,7 +331,7 @@ if __name__ == "__main__":
         print("  1. La ruta es correcta")
         print("  2. El archivo existe")
         print("  3. La extensión es .jpg, .jpeg o .png")
-        input("\nPresiona ENTER para salir...")
+        pausar("\nPresiona ENTER para salir...")
         sys.exit(1)
     
     print(f"ANALIZANDO IMAGEN")
@@ -109,27 +341,30 @@ if __name__ == "__main__":
     
     # Realizar predicción
     print("\n🔄 Procesando...")
-    clase_predicha, confianza, todas_probs = predecir_fruta(ruta_imagen)
+    resultado = predecir_lote([ruta_imagen], not args.sin_cache)[0]
     
-    if clase_predicha is None:
+    if "error" in resultado:
+        print(f"\nERROR al procesar imagen: {resultado['error']}")
         print("\nNo se pudo realizar la predicción")
-        input("\nPresiona ENTER para salir...")
+        pausar("\nPresiona ENTER para salir...")
         sys.exit(1)
+    if resultado["desde_cache"]:
+        print("Resultado obtenido de la caché de predicciones")
+    clase_predicha, confianza = resultado["clase"], resultado["confianza"]
     
     # Mostrar resultado
     print("\n" + "=" * 70)
     print("RESULTADO DE LA PREDICCIÓN")
     print("=" * 70)
-    print(f"\n🎯 Predicción: {formatear_nombre_clase(clase_predicha)}")
+    print(f"\n🎯 Predicción: {resultado['nombre']}")
     print(f"📊 Confianza: {confianza*100:.2f}%")
     
     # Mostrar top 5 predicciones
-    print(f"\n🏆 Top 5 predicciones:")
+    print(f"\n🏆 Top {TOP_K} predicciones:")
     print("-" * 70)
-    top_5_indices = np.argsort(todas_probs)[-5:][::-1]
-    for i, indice in enumerate(top_5_indices, 1):
-        nombre_clase = formatear_nombre_clase(CLASES[indice])
-        probabilidad = todas_probs[indice] * 100
+    for i, (clase, probabilidad) in enumerate(resultado["top"], 1):
+        nombre_clase = formatear_nombre_clase(clase)
+        probabilidad = probabilidad * 100
         barra = "█" * int(probabilidad / 2)  # Barra visual
         print(f"{i}. {nombre_clase:25} {probabilidad:6.2f}% {barra}")
     
@@ -162,4 +397,9 @@ if __name__ == "__main__":
         print("  La fruta está en mal estado. No se recomienda consumir.")
     
     print("\n" + "=" * 70)
-    input("\nPresiona ENTER para cerrar...")
\ No newline at end of file
+
+    if metricas.registro.activas:
+        metricas.registro.mostrar()
+        metricas.registro.guardar()
+        print(f"Métricas en: {os.path.join(metricas.CARPETA_METRICAS, 'predecir.json')} y .prom")
+    pausar("\nPresiona ENTER para cerrar...")
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Puntos de control del entrenamiento: copia de seguridad en cada época para
+poder reanudar una corrida interrumpida, mejor modelo según val_loss y parada
+temprana cuando la validación deja de mejorar.
+
+Todo lo de una corrida (en train_model.py, de cada etapa) vive en una carpeta:
+
+    respaldo/          BackupAndRestore de Keras (pesos, optimizador y época);
+                       se borra solo cuando el entrenamiento termina bien
+    historial.csv      métricas y segundos de cada época, también los de
+                       antes de reanudar
+    mejor.ckpt.*       pesos con la menor val_loss hasta ahora (formato de
+                       checkpoint de TF: los .h5 no se pueden cargar dentro
+                       de MultiWorkerMirroredStrategy)
+
+La parada temprana y el mejor modelo se calculan sobre historial.csv, así que
+una corrida reanudada sigue contando la paciencia donde se quedó.
+"""
+
+import os
+import csv
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+import distribuido
+
+MONITOR = "val_loss"  # Menor es mejor
+ARCHIVO_HISTORIAL = "historial.csv"
+ARCHIVO_MEJOR = "mejor.ckpt"
+CARPETA_RESPALDO = "respaldo"
+
+
+def preparar(carpeta, reanudar):
+    """
+    Deja la carpeta lista para entrenar: si se pide reanudar y hay un respaldo
+    se conserva todo; si no, se vacía. Solo lo llama un proceso (el normal o el
+    lanzador de distribuido.py), nunca los trabajadores.
+
+    Returns:
+        bool: True si el entrenamiento va a continuar desde el respaldo
+    """
+    respaldo = os.path.join(carpeta, CARPETA_RESPALDO)
+    # Con varios trabajadores la carpeta queda vacía (no borrada) al terminar bien
+    if reanudar and os.path.isdir(respaldo) and os.listdir(respaldo):
+        epocas = len(leer_historial(carpeta).get("epoch", []))
+        print(f"Reanudando desde {carpeta} ({epocas} épocas ya hechas)")
+        return True
+    if reanudar:
+        print(f"No hay nada que reanudar en {carpeta} (no existe o ya terminó); se empieza de cero")
+    shutil.rmtree(carpeta, ignore_errors=True)
+    os.makedirs(carpeta, exist_ok=True)
+    return False
+
+
+def leer_historial(carpeta):
+    """
+    Métricas de todas las épocas registradas, como el history de Keras
+    ({"loss": [...], "val_loss": [...], "segundos": [...], ...}).
+    Si una época aparece dos veces (se repitió al reanudar) vale la última.
+    """
+    ruta = os.path.join(carpeta, ARCHIVO_HISTORIAL)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8", newline="") as f:
+        filas = {int(fila["epoch"]): fila for fila in csv.DictReader(f)}
+    historial = {}
+    for epoca in sorted(filas):
+        for clave, valor in filas[epoca].items():
+            historial.setdefault(clave, []).append(int(valor) if clave == "epoch" else float(valor))
+    return historial
+
+
+class ParadaTemprana(tf.keras.callbacks.Callback):
+    """
+    Como EarlyStopping, pero también cuenta las épocas de antes de reanudar:
+    se detiene tras `paciencia` épocas seguidas sin mejorar la mejor val_loss.
+    """
+    def __init__(self, paciencia, valores_previos=()):
+        super().__init__()
+        self.paciencia = paciencia
+        self.valores = list(valores_previos)
+        self.epoca_parada = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.valores.append(logs[MONITOR])
+        sin_mejora = len(self.valores) - 1 - int(np.argmin(self.valores))
+        if sin_mejora >= self.paciencia:
+            print(f"\nParada temprana: {sin_mejora} épocas sin mejorar {MONITOR} "
+                  f"(mejor {min(self.valores):.4f})")
+            self.epoca_parada = epoch
+            self.model.stop_training = True
+
+
+def crear_callbacks(carpeta, paciencia):
+    """
+    Respaldo por época, historial, mejor modelo y (con paciencia > 0) parada
+    temprana. Van después del callback que mide el tiempo de la época, que es
+    el que añade "segundos" a los logs.
+    """
+    previos = leer_historial(carpeta).get(MONITOR, [])
+    callbacks = [
+        # Primero el respaldo: si el proceso muere justo después, la época no se repite
+        tf.keras.callbacks.BackupAndRestore(os.path.join(carpeta, CARPETA_RESPALDO)),
+        tf.keras.callbacks.ModelCheckpoint(
+            os.path.join(carpeta, ARCHIVO_MEJOR), monitor=MONITOR, save_best_only=True,
+            save_weights_only=True, initial_value_threshold=min(previos) if previos else None),
+    ]
+    if distribuido.es_principal():
+        # Con varios trabajadores solo el principal escribe el historial
+        callbacks.append(tf.keras.callbacks.CSVLogger(os.path.join(carpeta, ARCHIVO_HISTORIAL), append=True))
+    if paciencia:
+        callbacks.append(ParadaTemprana(paciencia, previos))
+    return callbacks
+
+
+def cargar_mejor(modelo, carpeta):
+    """Carga en `modelo` los pesos con la menor val_loss (si se guardó alguno)"""
+    # Con varios trabajadores, el principal termina de escribir el archivo antes de leerlo
+    distribuido.barrera()
+    ruta = os.path.join(carpeta, ARCHIVO_MEJOR)
+    if not os.path.exists(ruta + ".index"):
+        return False
+    modelo.load_weights(ruta)
+    historial = leer_historial(carpeta)
+    if historial.get(MONITOR):
+        mejor = int(np.argmin(historial[MONITOR]))
+        print(f"Pesos de la mejor época ({mejor + 1}, {MONITOR} {historial[MONITOR][mejor]:.4f})")
+    return True
+
+
+def guardar_pesos(modelo, ruta):
+    """
+    save_weights que con varios trabajadores escribe solo el principal. Los demás
+    también tienen que llamarlo (leer los pesos es colectivo) y borran su copia.
+    """
+    if distribuido.es_principal():
+        modelo.save_weights(ruta)
+        return
+    temporal = tempfile.mkdtemp()
+    try:
+        modelo.save_weights(os.path.join(temporal, os.path.basename(ruta)))
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+def resumen(carpeta, epocas_planeadas, epocas_esta_corrida):
+    """
+    Épocas hechas, recuperadas del respaldo y ahorradas por la parada temprana,
+    con sus segundos (los ahorrados se estiman con la media de las épocas hechas
+    sin contar la primera, que incluye la compilación)
+    """
+    historial = leer_historial(carpeta)
+    segundos = historial.get("segundos", [])
+    hechas = len(segundos)
+    recuperadas = max(0, hechas - epocas_esta_corrida)
+    resto = segundos[1:] or segundos
+    media = sum(resto) / len(resto) if resto else 0.0
+    ahorradas = max(0, epocas_planeadas - hechas)
+    return {
+        "epocas_planeadas": epocas_planeadas,
+        "epocas_hechas": hechas,
+        "epocas_recuperadas": recuperadas,
+        "s_recuperados": sum(segundos[:recuperadas]),
+        "epocas_ahorradas": ahorradas,
+        "s_ahorrados_estimados": ahorradas * media,
+        "s_total": sum(segundos),
+    }
+
+
+def mostrar_resumen(resultado, titulo="Entrenamiento"):
+    print(f"{titulo}: {resultado['epocas_hechas']} de {resultado['epocas_planeadas']} épocas "
+          f"({resultado['s_total']:.1f} s de entrenamiento)")
+    if resultado['epocas_recuperadas']:
+        print(f"   Recuperadas del respaldo: {resultado['epocas_recuperadas']} épocas "
+              f"({resultado['s_recuperados']:.1f} s que no hubo que repetir)")
+    if resultado['epocas_ahorradas']:
+        print(f"   Ahorradas por la parada temprana: {resultado['epocas_ahorradas']} épocas "
+              f"(~{resultado['s_ahorrados_estimados']:.1f} s)")
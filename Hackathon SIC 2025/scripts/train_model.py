@@ -7,13 +7,19 @@ Usa Transfer Learning con MobileNetV2
 import tensorflow as tf
 import numpy as np
 import matplotlib.pyplot as plt
-from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2
 from tensorflow.keras.preprocessing import image
 from tensorflow.keras.models import Model
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
 from tensorflow.keras.optimizers import SGD
+import argparse
+import json
 import os
+import sys
+import time
 from datetime import datetime
+import datos
+import distribuido
+import modelo_frutas
+import puntos_control
 
 # CONFIGURACIÓN
 CARPETA_DATOS = "data"
@@ -21,7 +27,166 @@ TAMAÑO_IMAGEN = (224, 224)
 TAMAÑO_LOTE = 16
 EPOCAS_ETAPA1 = 10  # Primera etapa
 EPOCAS_ETAPA2 = 10  # Segunda etapa (ajuste fino)
-RUTA_MODELO = "models\modelo_frutas"
+RUTA_MODELO = os.path.join("models", "modelo_frutas")
+CARPETA_CACHE = "cache"
+CAPA_DESCONGELAR = 125  # En la etapa 2 se entrenan modelo.layers[125:]
+PRECISION_MIXTA = False  # Cálculos en 16 bits (pesos y softmax en float32)
+COMPILAR_XLA = False     # Compilar el paso de entrenamiento con XLA
+RUTA_RESUMEN = os.path.join("models", "resumen_entrenamiento.json")  # Tiempos y precisión por modo
+TRABAJADORES = 0  # Procesos de entrenamiento en esta máquina (0 = un solo proceso, sin estrategia)
+CARPETA_PUNTOS = os.path.join("models", "puntos_control")  # Respaldo por época y mejor modelo de cada etapa
+PACIENCIA = 0  # Épocas sin mejorar val_loss antes de parar cada etapa (0 = sin parada temprana)
+
+# OPCIONES DE LÍNEA DE COMANDOS
+parser = argparse.ArgumentParser(description="Entrena el clasificador de madurez de frutas")
+parser.add_argument('--cache', action='store_true',
+                    help="Leer las imágenes de la caché uint8 (decodificadas una sola vez) con memory mapping")
+parser.add_argument('--cache-activaciones', action='store_true',
+                    help="Calcular una sola vez las activaciones de las capas congeladas "
+                         f"(modelo.layers[:{CAPA_DESCONGELAR}]) y entrenar solo el resto sobre ellas")
+parser.add_argument('--precision-mixta', action='store_true', default=PRECISION_MIXTA,
+                    help="Precisión mixta (float16 en GPU, bfloat16 en CPU; softmax en float32)")
+parser.add_argument('--xla', action='store_true', default=COMPILAR_XLA,
+                    help="Compilar el paso de entrenamiento con XLA")
+parser.add_argument('--rapido', action='store_true', help="Equivale a --precision-mixta --xla")
+parser.add_argument('--espejo', action='store_true',
+                    help=f"Leer de una copia de {CARPETA_DATOS}/ ya redimensionada a {TAMAÑO_IMAGEN[0]}x{TAMAÑO_IMAGEN[1]} "
+                         "(se crea o actualiza al empezar, ver datos.construir_espejo)")
+parser.add_argument('--trabajadores', type=int, default=TRABAJADORES,
+                    help="Entrenar con N procesos en esta máquina que se reparten el dataset y "
+                         "sincronizan los gradientes (necesita --cache)")
+parser.add_argument('--reanudar', action='store_true',
+                    help=f"Continuar la corrida interrumpida desde el último respaldo de {CARPETA_PUNTOS}/")
+parser.add_argument('--paciencia', type=int, default=PACIENCIA,
+                    help="Épocas sin mejorar val_loss antes de terminar cada etapa (0 = todas las épocas)")
+args = parser.parse_args()
+usar_cache = args.cache or args.cache_activaciones
+precision_mixta = args.precision_mixta or args.rapido
+usar_xla = args.xla or args.rapido
+modo = ' + '.join((['mixta'] if precision_mixta else []) + (['XLA'] if usar_xla else [])) or 'float32'
+
+# Con --trabajadores este proceso solo lanza los trabajadores (copias de este
+# script con TF_CONFIG, ver distribuido.py); cada trabajador entrena su fragmento
+en_trabajador = distribuido.es_trabajador()
+indice_trabajador, num_trabajadores = distribuido.info_trabajador()
+if en_trabajador:
+    distribuido.estrategia()  # Antes de crear cualquier tensor
+    modo += f' x{num_trabajadores} procesos'
+elif args.trabajadores and (not args.cache or args.cache_activaciones):
+    print("ERROR: --trabajadores necesita --cache (ImageDataGenerator no se puede fragmentar entre "
+          "procesos y --cache-activaciones entrena solo la cabeza)")
+    exit(1)
+origen = 'activaciones' if args.cache_activaciones else ('caché uint8' if usar_cache else 'ImageDataGenerator')
+if args.espejo:
+    origen += ' (espejo)'  # Sus tiempos no se comparan con los de data/
+
+
+class TiempoPorEpoca(tf.keras.callbacks.Callback):
+    """Registra la duración de cada época"""
+    def __init__(self):
+        super().__init__()
+        self.tiempos = []  # Vacía también si la etapa no llega a entrenarse
+
+    def on_train_begin(self, logs=None):
+        self.tiempos = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.inicio = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.tiempos.append(time.perf_counter() - self.inicio)
+        if logs is not None:
+            logs['segundos'] = self.tiempos[-1]  # Para el historial de puntos_control
+
+
+def resumen_tiempos(tiempos):
+    """Primera época (incluye la compilación) y media del resto (con una sola época, esa)"""
+    resto = tiempos[1:] or tiempos
+    return tiempos[0], sum(resto) / len(resto)
+
+
+def guardar_y_comparar_resumen(resumen):
+    """
+    Guarda el resumen de este entrenamiento en RUTA_RESUMEN (uno por modo) y
+    lo muestra junto a los demás modos entrenados con el mismo origen y épocas.
+    """
+    resumenes = {}
+    if os.path.exists(RUTA_RESUMEN):
+        with open(RUTA_RESUMEN, 'r', encoding='utf-8') as f:
+            resumenes = json.load(f)
+    resumenes[resumen['modo']] = resumen
+    with open(RUTA_RESUMEN, 'w', encoding='utf-8') as f:
+        json.dump(resumenes, f, ensure_ascii=False, indent=2)
+
+    comparables = [r for r in resumenes.values()
+                   if r['origen'] == resumen['origen'] and r['epocas'] == resumen['epocas']]
+    base = resumenes.get('float32') if resumenes.get('float32') in comparables else resumen
+    print(f"\n{'Modo':24}{'Etapa 1 (s/ép)':>16}{'Etapa 2 (s/ép)':>16}{'Aceleración':>13}{'Eficiencia':>12}"
+          f"{'Val. accuracy':>15}{'Cambio':>9}")
+    print("-" * 105)
+    for r in comparables:
+        # Una época recorre el dataset completo con cualquier número de trabajadores
+        aceleracion = base['etapa2_s_epoca'] / r['etapa2_s_epoca']
+        eficiencia = aceleracion / (r.get('trabajadores', 1) / base.get('trabajadores', 1))
+        print(f"{r['modo']:24}{r['etapa1_s_epoca']:>16.2f}{r['etapa2_s_epoca']:>16.2f}"
+              f"{aceleracion:>12.2f}x{eficiencia * 100:>11.0f}%"
+              f"{r['precision_validacion']:>15.4f}{r['precision_validacion'] - base['precision_validacion']:>+9.4f}")
+    print(f"   Sin contar la primera época de cada etapa (compilación). Relativo a '{base['modo']}'.")
+    print("   Eficiencia = aceleración / número de trabajadores (relativo a los de la referencia).")
+    if 'float32' not in resumenes:
+        print("   Entrena sin --precision-mixta/--xla/--rapido para tener la referencia float32.")
+
+
+def validar_corte(modelo, indice_corte):
+    """
+    El corte tiene que estar entre dos bloques: lo único que las capas
+    modelo.layers[indice_corte:] pueden usar de antes del corte es la salida de
+    la capa anterior. Dentro de un bloque residual de MobileNetV2 la suma usa
+    también la entrada del bloque, que no está en las activaciones guardadas.
+    """
+    if not 0 < indice_corte < len(modelo.layers):
+        raise ValueError(f"El corte {indice_corte} está fuera del modelo (1 a {len(modelo.layers) - 1})")
+
+    def cruza(corte):
+        """Capas después de `corte` que usan tensores de antes, sin contar la salida de la anterior"""
+        anteriores = {id(capa.get_output_at(0)) for capa in modelo.layers[:corte - 1]}
+        cruces = []
+        for capa in modelo.layers[corte:]:
+            entradas = capa.get_input_at(0)
+            for tensor in entradas if isinstance(entradas, list) else [entradas]:
+                if id(tensor) in anteriores:
+                    cruces.append(capa.name)
+        return cruces
+
+    cruces = cruza(indice_corte)
+    if cruces:
+        validos = [i for i in range(1, len(modelo.layers)) if not cruza(i)]
+        cercanos = sorted(validos, key=lambda i: abs(i - indice_corte))[:4]
+        raise ValueError(
+            f"No se puede cortar el modelo en la capa {indice_corte} ({modelo.layers[indice_corte].name}): "
+            f"está dentro de un bloque (después del corte, {', '.join(cruces)} usa tensores de antes). "
+            f"Cortes válidos cercanos: {sorted(cercanos)}")
+
+
+def construir_cola(modelo, indice_corte):
+    """
+    Crea un modelo con las capas modelo.layers[indice_corte:] cuya entrada son
+    las activaciones de la capa anterior al corte. Reutiliza las mismas capas,
+    así que entrenar la cola actualiza los pesos de `modelo`.
+    """
+    validar_corte(modelo, indice_corte)
+    salida_corte = modelo.layers[indice_corte - 1].get_output_at(0)
+    entrada = tf.keras.Input(shape=salida_corte.shape[1:])
+    tensores = {id(salida_corte): entrada}
+    for capa in modelo.layers[indice_corte:]:
+        entradas = capa.get_input_at(0)
+        salida = capa.get_output_at(0)
+        if isinstance(entradas, list):
+            tensores[id(salida)] = capa([tensores[id(t)] for t in entradas])
+        else:
+            tensores[id(salida)] = capa(tensores[id(entradas)])
+    return Model(inputs=entrada, outputs=tensores[id(modelo.outputs[0])])
+
 
 # VERIFICAR CONFIGURACIÓN
 print("=" * 80)
@@ -33,6 +198,12 @@ print(f"Tamaño de imagen: {TAMAÑO_IMAGEN}")
 print(f"Tamaño de lote: {TAMAÑO_LOTE}")
 print(f"Épocas Etapa 1: {EPOCAS_ETAPA1}")
 print(f"Épocas Etapa 2: {EPOCAS_ETAPA2}")
+print(f"Origen de imágenes: {'caché uint8 (' + CARPETA_CACHE + ')' if usar_cache else 'ImageDataGenerator'}")
+print(f"Caché de activaciones: {'sí' if args.cache_activaciones else 'no'}")
+print(f"Espejo redimensionado: {'sí (' + datos.CARPETA_ESPEJO + ')' if args.espejo else 'no'}")
+print(f"Precisión / compilación: {modo}")
+print(f"Trabajadores: {args.trabajadores or 1}" if not en_trabajador else
+      f"Trabajador: {indice_trabajador + 1} de {num_trabajadores}")
 
 # Crear carpeta de modelos si no existe
 os.makedirs(os.path.dirname(RUTA_MODELO), exist_ok=True)
@@ -41,48 +212,100 @@ os.makedirs(os.path.dirname(RUTA_MODELO), exist_ok=True)
 if not os.path.exists(CARPETA_DATOS):
     print(f"\nERROR: No se encuentra la carpeta de datos: {CARPETA_DATOS}")
     print("Verifica la ruta y vuelve a intentar.")
-    input("Presiona ENTER para salir...")
+    if not en_trabajador:
+        input("Presiona ENTER para salir...")
     exit(1)
 
-print("\n¿Todo correcto? El entrenamiento puede tomar 30-60 minutos.")
-input("Presiona ENTER para comenzar el entrenamiento...")
+if not en_trabajador:
+    print("\n¿Todo correcto? El entrenamiento puede tomar 30-60 minutos.")
+    input("Presiona ENTER para comenzar el entrenamiento...")
 
 # PREPARAR DATOS
 print("\n" + "=" * 80)
 print("CARGANDO DATOS")
 print("=" * 80)
 
-# Configuración para aumento de datos y validación
-config_generador = dict(rescale=1./255, validation_split=0.20)
-
-# Generador de datos de validación
-generador_validacion = tf.keras.preprocessing.image.ImageDataGenerator(**config_generador)
-datos_validacion = generador_validacion.flow_from_directory(
-    CARPETA_DATOS, 
-    subset="validation", 
-    shuffle=True,
-    batch_size=TAMAÑO_LOTE,
-    target_size=TAMAÑO_IMAGEN
-)
-
-# Generador de datos de entrenamiento
-generador_entrenamiento = tf.keras.preprocessing.image.ImageDataGenerator(**config_generador)
-datos_entrenamiento = generador_entrenamiento.flow_from_directory(
-    CARPETA_DATOS, 
-    subset="training", 
-    shuffle=True,
-    batch_size=TAMAÑO_LOTE,
-    target_size=TAMAÑO_IMAGEN
-)
-
-print(f"\n Clases encontradas: {len(datos_entrenamiento.class_indices)}")
-print(f"   Imágenes de entrenamiento: {datos_entrenamiento.samples}")
-print(f"   Imágenes de validación: {datos_validacion.samples}")
-print(f"   Lotes por época: {datos_entrenamiento.samples // TAMAÑO_LOTE}")
+if args.espejo:
+    # Misma estructura que data/, pero cada imagen ya tiene el tamaño final
+    CARPETA_DATOS = datos.construir_espejo(CARPETA_DATOS, TAMAÑO_IMAGEN)
+
+# Cada etapa tiene su carpeta de puntos de control; la etapa 1 deja además sus
+# pesos finales para que al reanudar en la etapa 2 no haya que repetirla
+carpeta_etapa1 = os.path.join(CARPETA_PUNTOS, "etapa1")
+carpeta_etapa2 = os.path.join(CARPETA_PUNTOS, "etapa2")
+ruta_etapa1_completa = os.path.join(carpeta_etapa1, "completa.ckpt")
+if not en_trabajador:
+    # Solo este proceso borra puntos de control; los trabajadores los usan tal cual
+    etapa1_completa = args.reanudar and os.path.exists(ruta_etapa1_completa + '.index')
+    if etapa1_completa:
+        print(f"Etapa 1 ya terminada en {carpeta_etapa1}; se continúa con el ajuste fino")
+    else:
+        puntos_control.preparar(carpeta_etapa1, args.reanudar)
+    puntos_control.preparar(carpeta_etapa2, etapa1_completa)
+etapa1_completa = os.path.exists(ruta_etapa1_completa + '.index')
+
+if args.trabajadores and not en_trabajador:
+    # Lo que los trabajadores harían a la vez se prepara aquí una sola vez (la caché
+    # uint8 y la descarga de los pesos); después solo se espera a que terminen
+    datos.construir_cache(CARPETA_DATOS, TAMAÑO_IMAGEN, CARPETA_CACHE)
+    modelo_frutas.crear_modelo()
+    segundos = distribuido.lanzar(args.trabajadores, sys.argv[1:])
+    print(f"\nEntrenamiento con {args.trabajadores} trabajador(es) terminado en {segundos:.1f} s")
+    exit(0)
+
+if usar_cache:
+    # Imágenes decodificadas una sola vez a un archivo uint8 (se reconstruye si cambia data/)
+    imagenes_cache, etiquetas_cache, clases_cache = datos.cargar_cache(CARPETA_DATOS, TAMAÑO_IMAGEN, CARPETA_CACHE)
+    indices_entrenamiento = datos.indices_subset(etiquetas_cache, 0.20, 'training')
+    indices_validacion = datos.indices_subset(etiquetas_cache, 0.20, 'validation')
+    num_entrenamiento = len(indices_entrenamiento)
+    num_validacion = len(indices_validacion)
+    if en_trabajador:
+        # Cada trabajador lee solo una de cada num_trabajadores imágenes
+        indices_entrenamiento = indices_entrenamiento[indice_trabajador::num_trabajadores]
+        indices_validacion = indices_validacion[indice_trabajador::num_trabajadores]
+    datos_validacion = datos.crear_dataset_memmap(
+        imagenes_cache, etiquetas_cache, indices_validacion, len(clases_cache), TAMAÑO_LOTE
+    )
+    datos_entrenamiento = datos.crear_dataset_memmap(
+        imagenes_cache, etiquetas_cache, indices_entrenamiento, len(clases_cache), TAMAÑO_LOTE, mezclar=True
+    )
+    indices_clases = {clase: i for i, clase in enumerate(clases_cache)}
+else:
+    # Configuración para aumento de datos y validación
+    config_generador = dict(rescale=1./255, validation_split=0.20)
+
+    # Generador de datos de validación
+    generador_validacion = tf.keras.preprocessing.image.ImageDataGenerator(**config_generador)
+    datos_validacion = generador_validacion.flow_from_directory(
+        CARPETA_DATOS, 
+        subset="validation", 
+        shuffle=True,
+        batch_size=TAMAÑO_LOTE,
+        target_size=TAMAÑO_IMAGEN
+    )
+
+    # Generador de datos de entrenamiento
+    generador_entrenamiento = tf.keras.preprocessing.image.ImageDataGenerator(**config_generador)
+    datos_entrenamiento = generador_entrenamiento.flow_from_directory(
+        CARPETA_DATOS, 
+        subset="training", 
+        shuffle=True,
+        batch_size=TAMAÑO_LOTE,
+        target_size=TAMAÑO_IMAGEN
+    )
+    indices_clases = datos_entrenamiento.class_indices
+    num_entrenamiento = datos_entrenamiento.samples
+    num_validacion = datos_validacion.samples
+
+print(f"\n Clases encontradas: {len(indices_clases)}")
+print(f"   Imágenes de entrenamiento: {num_entrenamiento}")
+print(f"   Imágenes de validación: {num_validacion}")
+print(f"   Lotes por época: {num_entrenamiento // (TAMAÑO_LOTE * num_trabajadores)}")
 
 # Guardar las clases en un archivo
 print("\nGuardando etiquetas...")
-etiquetas = '\n'.join(sorted(datos_entrenamiento.class_indices.keys()))
+etiquetas = '\n'.join(sorted(indices_clases.keys()))
 ruta_etiquetas = os.path.join(os.path.dirname(RUTA_MODELO), 'etiquetas.txt')
 with open(ruta_etiquetas, 'w', encoding='utf-8') as f:
     f.write(etiquetas)
@@ -90,7 +313,7 @@ print(f"   Etiquetas guardadas en: {ruta_etiquetas}")
 
 # Mostrar las clases
 print("\n Clases (en orden):")
-for nombre_clase, id_clase in sorted(datos_entrenamiento.class_indices.items(), key=lambda x: x[1]):
+for nombre_clase, id_clase in sorted(indices_clases.items(), key=lambda x: x[1]):
     print(f"   {id_clase}: {nombre_clase}")
 
 # CONSTRUIR MODELO
@@ -98,18 +321,19 @@ print("\n" + "=" * 80)
 print("CONSTRUYENDO MODELO")
 print("=" * 80)
 
+if precision_mixta:
+    # En GPU float16; en CPU bfloat16 (float16 en CPU es más lento que float32)
+    politica = 'mixed_float16' if tf.config.list_physical_devices('GPU') else 'mixed_bfloat16'
+    tf.keras.mixed_precision.set_global_policy(politica)
+    print(f"Precisión mixta: {politica}")
+
 # Cargar modelo base pre-entrenado
 print("Cargando MobileNetV2 pre-entrenado...")
-modelo_base = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
-
-# Añadir capas personalizadas
-x = modelo_base.output
-x = GlobalAveragePooling2D()(x)
-x = Dense(1024, activation='relu')(x)
-predicciones = Dense(15, activation='softmax')(x)  # 15 clases
-
-# Crear modelo completo
-modelo = Model(inputs=modelo_base.input, outputs=predicciones)
+# Con varios trabajadores los pesos se crean dentro de la estrategia y los
+# gradientes se sincronizan; sin ellos, la estrategia por defecto no hace nada
+estrategia = distribuido.estrategia() if en_trabajador else tf.distribute.get_strategy()
+with estrategia.scope():
+    modelo_base, modelo = modelo_frutas.crear_modelo()
 
 # Congelar capas del modelo base
 for capa in modelo_base.layers:
@@ -118,6 +342,32 @@ for capa in modelo_base.layers:
 print(f"\n   Total de capas: {len(modelo.layers)}")
 print(f"   Parámetros entrenables: {sum([tf.keras.backend.count_params(w) for w in modelo.trainable_weights]):,}")
 
+# Modelo que se entrena: el completo o solo la cola sobre activaciones precalculadas
+modelo_entrenable = modelo
+
+if args.cache_activaciones:
+    print("\n" + "=" * 80)
+    print("CACHÉ DE ACTIVACIONES")
+    print("=" * 80)
+    # Antes de calcular nada: el corte tiene que estar entre dos bloques
+    modelo_entrenable = construir_cola(modelo, CAPA_DESCONGELAR)
+    # Las capas [:CAPA_DESCONGELAR] están congeladas en ambas etapas y no hay aumento
+    # de datos, así que su salida es la misma en todas las épocas: se calcula una vez.
+    extractor = Model(inputs=modelo.input, outputs=modelo.layers[CAPA_DESCONGELAR - 1].output)
+    activaciones, _, _ = datos.cargar_activaciones(
+        extractor, CARPETA_DATOS, TAMAÑO_IMAGEN, CARPETA_CACHE, tamaño_lote=TAMAÑO_LOTE
+    )
+    print(f"   Forma de las activaciones: {activaciones.shape[1:]}")
+
+    # Los lotes se leen del .npy mapeado en memoria, como las imágenes de la caché
+    datos_entrenamiento = datos.crear_dataset_activaciones(
+        activaciones, etiquetas_cache, indices_entrenamiento, len(clases_cache), TAMAÑO_LOTE, mezclar=True
+    )
+    datos_validacion = datos.crear_dataset_activaciones(
+        activaciones, etiquetas_cache, indices_validacion, len(clases_cache), TAMAÑO_LOTE
+    )
+    print(f"   Capas que se ejecutan en cada época: {len(modelo_entrenable.layers) - 1} de {len(modelo.layers)}")
+
 # ============== ETAPA 1: ENTRENAR CAPAS SUPERIORES ==============
 print("\n" + "=" * 80)
 print("ETAPA 1: ENTRENANDO CAPAS SUPERIORES")
@@ -126,30 +376,54 @@ print(f"Épocas: {EPOCAS_ETAPA1}")
 print("Esto puede tomar 15-20 minutos...")
 print("=" * 80)
 
-modelo.compile(
+modelo_entrenable.compile(
     optimizer='rmsprop', 
     loss='categorical_crossentropy',
-    metrics=['accuracy']
+    metrics=['accuracy'],
+    jit_compile=usar_xla
 )
 
-pasos_por_epoca = np.ceil(datos_entrenamiento.samples / datos_entrenamiento.batch_size)
-pasos_validacion = np.ceil(datos_validacion.samples / datos_validacion.batch_size)
+# Una época recorre el dataset completo una vez, entre todos los trabajadores
+pasos_por_epoca = int(np.ceil(num_entrenamiento / (TAMAÑO_LOTE * num_trabajadores)))
+pasos_validacion = int(np.ceil(num_validacion / (TAMAÑO_LOTE * num_trabajadores)))
 
-tiempo_inicio = datetime.now()
+if en_trabajador:
+    # Todos los trabajadores tienen que dar los mismos pasos, así que cada fragmento se
+    # repite sin fin. Hay una réplica por trabajador: el lote del dataset es el de la réplica
+    fragmento_entrenamiento, fragmento_validacion = datos_entrenamiento, datos_validacion
+    datos_entrenamiento = tf.keras.utils.experimental.DatasetCreator(
+        lambda contexto: fragmento_entrenamiento.repeat())
+    datos_validacion = tf.keras.utils.experimental.DatasetCreator(
+        lambda contexto: fragmento_validacion.repeat())
 
-historial1 = modelo.fit(
-    datos_entrenamiento, 
-    epochs=EPOCAS_ETAPA1, 
-    verbose=1,
-    steps_per_epoch=pasos_por_epoca,
-    validation_data=datos_validacion,
-    validation_steps=pasos_validacion
-)
+tiempo_inicio = datetime.now()
+tiempos_etapa1 = TiempoPorEpoca()
+
+if etapa1_completa:
+    modelo_entrenable.load_weights(ruta_etapa1_completa)
+else:
+    modelo_entrenable.fit(
+        datos_entrenamiento, 
+        epochs=EPOCAS_ETAPA1, 
+        verbose=1,
+        steps_per_epoch=pasos_por_epoca,
+        validation_data=datos_validacion,
+        validation_steps=pasos_validacion,
+        callbacks=[tiempos_etapa1] + puntos_control.crear_callbacks(carpeta_etapa1, args.paciencia)
+    )
+    # El ajuste fino parte de la mejor época, no de la última
+    puntos_control.cargar_mejor(modelo_entrenable, carpeta_etapa1)
+    puntos_control.guardar_pesos(modelo_entrenable, ruta_etapa1_completa)
+
+# Todas las épocas de la etapa, también las de antes de reanudar
+historial1 = puntos_control.leer_historial(carpeta_etapa1)
+resumen_etapa1 = puntos_control.resumen(carpeta_etapa1, EPOCAS_ETAPA1, len(tiempos_etapa1.tiempos))
 
 tiempo_transcurrido = datetime.now() - tiempo_inicio
 print(f"\n Etapa 1 completada en: {tiempo_transcurrido}")
-print(f"   Precisión final: {historial1.history['accuracy'][-1]:.4f}")
-print(f"   Precisión validación: {historial1.history['val_accuracy'][-1]:.4f}")
+print(f"   Primera época: {historial1['segundos'][0]:.1f} s, resto: {resumen_tiempos(historial1['segundos'])[1]:.1f} s/época")
+print(f"   Precisión final: {historial1['accuracy'][-1]:.4f}")
+print(f"   Precisión validación: {historial1['val_accuracy'][-1]:.4f}")
 
 # ============== ETAPA 2: AJUSTE FINO ==============
 print("\n" + "=" * 80)
@@ -158,18 +432,19 @@ print("=" * 80)
 print("Descongelando últimas capas del modelo base...")
 
 # Descongelar últimas capas del modelo base
-for capa in modelo.layers[:125]:
+for capa in modelo.layers[:CAPA_DESCONGELAR]:
     capa.trainable = False
-for capa in modelo.layers[125:]:
+for capa in modelo.layers[CAPA_DESCONGELAR:]:
     capa.trainable = True
 
 print(f"   Parámetros entrenables: {sum([tf.keras.backend.count_params(w) for w in modelo.trainable_weights]):,}")
 
 # Recompilar con tasa de aprendizaje más baja
-modelo.compile(
+modelo_entrenable.compile(
     optimizer=SGD(learning_rate=0.0001, momentum=0.9), 
     loss='categorical_crossentropy', 
-    metrics=['accuracy']
+    metrics=['accuracy'],
+    jit_compile=usar_xla
 )
 
 print(f"\nÉpocas: {EPOCAS_ETAPA2}")
@@ -177,20 +452,41 @@ print("Esto puede tomar 15-20 minutos...")
 print("=" * 80)
 
 tiempo_inicio = datetime.now()
+tiempos_etapa2 = TiempoPorEpoca()
 
-historial2 = modelo.fit(
+modelo_entrenable.fit(
     datos_entrenamiento, 
     epochs=EPOCAS_ETAPA2, 
     verbose=1,
     steps_per_epoch=pasos_por_epoca,
     validation_data=datos_validacion,
-    validation_steps=pasos_validacion
+    validation_steps=pasos_validacion,
+    callbacks=[tiempos_etapa2] + puntos_control.crear_callbacks(carpeta_etapa2, args.paciencia)
 )
+puntos_control.cargar_mejor(modelo_entrenable, carpeta_etapa2)
+
+historial2 = puntos_control.leer_historial(carpeta_etapa2)
+resumen_etapa2 = puntos_control.resumen(carpeta_etapa2, EPOCAS_ETAPA2, len(tiempos_etapa2.tiempos))
 
 tiempo_transcurrido = datetime.now() - tiempo_inicio
 print(f"\n Etapa 2 completada en: {tiempo_transcurrido}")
-print(f"   Precisión final: {historial2.history['accuracy'][-1]:.4f}")
-print(f"   Precisión validación: {historial2.history['val_accuracy'][-1]:.4f}")
+print(f"   Primera época: {historial2['segundos'][0]:.1f} s, resto: {resumen_tiempos(historial2['segundos'])[1]:.1f} s/época")
+print(f"   Precisión final: {historial2['accuracy'][-1]:.4f}")
+print(f"   Precisión validación: {historial2['val_accuracy'][-1]:.4f}")
+
+if precision_mixta or en_trabajador:
+    # Se guarda en float32 y sin estrategia como siempre (los pesos ya lo eran):
+    # predecir.py, la app y la exportación a TFLite no notan la diferencia.
+    # Con varios trabajadores leer los pesos es colectivo (las medias de
+    # BatchNormalization se agregan entre todos), así que lo hacen todos
+    tf.keras.mixed_precision.set_global_policy('float32')
+    _, modelo_float32 = modelo_frutas.crear_modelo(pesos=None)
+    modelo_float32.set_weights(modelo.get_weights())
+    modelo = modelo_float32
+
+if not distribuido.es_principal():
+    # El trabajador principal guarda el modelo, las gráficas y el resumen
+    exit(0)
 
 # ============== VISUALIZAR RESULTADOS ==============
 print("\n" + "=" * 80)
@@ -199,10 +495,10 @@ print("=" * 80)
 
 # Combinar historiales
 historial_combinado = {
-    'loss': historial1.history['loss'] + historial2.history['loss'],
-    'val_loss': historial1.history['val_loss'] + historial2.history['val_loss'],
-    'accuracy': historial1.history['accuracy'] + historial2.history['accuracy'],
-    'val_accuracy': historial1.history['val_accuracy'] + historial2.history['val_accuracy']
+    'loss': historial1['loss'] + historial2['loss'],
+    'val_loss': historial1['val_loss'] + historial2['val_loss'],
+    'accuracy': historial1['accuracy'] + historial2['accuracy'],
+    'val_accuracy': historial1['val_accuracy'] + historial2['val_accuracy']
 }
 
 # Configurar matplotlib para español
@@ -215,7 +511,7 @@ plt.figure(figsize=(14, 5))
 plt.subplot(1, 2, 1)
 plt.plot(historial_combinado['loss'], label='Pérdida Entrenamiento', linewidth=2)
 plt.plot(historial_combinado['val_loss'], label='Pérdida Validación', linewidth=2)
-plt.axvline(x=EPOCAS_ETAPA1-1, color='red', linestyle='--', label='Inicio ajuste fino')
+plt.axvline(x=len(historial1['loss'])-1, color='red', linestyle='--', label='Inicio ajuste fino')
 plt.title('Pérdida Durante el Entrenamiento', fontsize=14, fontweight='bold')
 plt.xlabel('Época', fontsize=12)
 plt.ylabel('Pérdida', fontsize=12)
@@ -226,7 +522,7 @@ plt.grid(True, alpha=0.3)
 plt.subplot(1, 2, 2)
 plt.plot(historial_combinado['accuracy'], label='Precisión Entrenamiento', linewidth=2)
 plt.plot(historial_combinado['val_accuracy'], label='Precisión Validación', linewidth=2)
-plt.axvline(x=EPOCAS_ETAPA1-1, color='red', linestyle='--', label='Inicio ajuste fino')
+plt.axvline(x=len(historial1['loss'])-1, color='red', linestyle='--', label='Inicio ajuste fino')
 plt.title('Precisión Durante el Entrenamiento', fontsize=14, fontweight='bold')
 plt.xlabel('Época', fontsize=12)
 plt.ylabel('Precisión', fontsize=12)
@@ -258,10 +554,34 @@ print("\n" + "=" * 80)
 print("EVALUANDO MODELO EN CONJUNTO DE VALIDACIÓN")
 print("=" * 80)
 
-perdida_val, precision_val = modelo.evaluate(datos_validacion)
+if en_trabajador:
+    # Evaluar de nuevo necesitaría a todos los trabajadores; con los mismos pesos
+    # es la validación de la mejor época
+    mejor = int(np.argmin(historial2['val_loss']))
+    perdida_val, precision_val = historial2['val_loss'][mejor], historial2['val_accuracy'][mejor]
+else:
+    perdida_val, precision_val = modelo_entrenable.evaluate(datos_validacion)
 print(f"\n   Pérdida en validación: {perdida_val:.4f}")
 print(f"   Precisión en validación: {precision_val:.4f}")
 
+# Tiempo por época y precisión de este modo junto a los demás ya entrenados
+guardar_y_comparar_resumen({
+    'modo': modo,
+    'trabajadores': num_trabajadores,
+    'origen': origen,
+    'epocas': [EPOCAS_ETAPA1, EPOCAS_ETAPA2],
+    'etapa1_primera_s': historial1['segundos'][0],
+    'etapa1_s_epoca': resumen_tiempos(historial1['segundos'])[1],
+    'etapa2_primera_s': historial2['segundos'][0],
+    'etapa2_s_epoca': resumen_tiempos(historial2['segundos'])[1],
+    'paciencia': args.paciencia,
+    'puntos_control': {'etapa1': resumen_etapa1, 'etapa2': resumen_etapa2},
+    'precision_validacion': float(precision_val),
+    'fecha': datetime.now().isoformat(timespec='seconds'),
+})
+puntos_control.mostrar_resumen(resumen_etapa1, "Etapa 1")
+puntos_control.mostrar_resumen(resumen_etapa2, "Etapa 2")
+
 # RESUMEN FINAL
 print("\n" + "=" * 80)
 print("🎉 ENTRENAMIENTO COMPLETADO EXITOSAMENTE")
@@ -271,7 +591,9 @@ print(f"   1. Modelo: {RUTA_MODELO}")
 print(f"   2. Modelo H5: {ruta_h5}")
 print(f"   3. Etiquetas: {ruta_etiquetas}")
 print(f"   4. Gráficas: {ruta_grafica}")
+print(f"   5. Tiempos por modo: {RUTA_RESUMEN}")
 
 print(f"\n📊 Precisión final en validación: {precision_val*100:.2f}%")
 
-input("\nPresiona ENTER para cerrar...")
+if not en_trabajador:
+    input("\nPresiona ENTER para cerrar...")
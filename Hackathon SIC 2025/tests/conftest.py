@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los scripts del proyecto se importan como módulos sueltos, igual que desde app.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
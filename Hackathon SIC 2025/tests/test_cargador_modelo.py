@@ -0,0 +1,70 @@
+"""
+Pruebas del redimensionado dentro del modelo (cargador_modelo.envolver_uint8):
+para cualquier tamaño de origen debe elegir los mismos píxeles que
+datos.leer_imagen_uint8 en el entrenamiento, en Keras y en el .tflite
+"""
+import numpy as np
+import pytest
+import tensorflow as tf
+from PIL import Image
+
+import cargador_modelo
+import datos
+
+TAMAÑO = (224, 224)
+# Incluye lados múltiplos de 64 (640, 1024, 4032), donde PIL puede elegir el píxel anterior
+TAMAÑOS_ORIGEN = [(480, 640), (3000, 4000), (200, 180), (100, 90), (768, 1024), (3024, 4032), (224, 224), (1, 1)]
+
+
+@pytest.fixture(scope="module")
+def modelo_identidad():
+    """Envuelve un "modelo" que devuelve su entrada: la salida es la imagen redimensionada / 255"""
+    entrada = tf.keras.Input(shape=TAMAÑO + (3,))
+    return cargador_modelo.envolver_uint8(tf.keras.Model(entrada, tf.keras.layers.Identity()(entrada)))
+
+
+@pytest.fixture(scope="module")
+def interprete(modelo_identidad):
+    contenido = tf.lite.TFLiteConverter.from_keras_model(modelo_identidad).convert()
+    return tf.lite.Interpreter(model_content=contenido)
+
+
+def imagen_y_esperada(tmp_path, tamaño):
+    """Imagen aleatoria de `tamaño` y lo que lee de ella datos.leer_imagen_uint8"""
+    imagen = np.random.default_rng(sum(tamaño)).integers(0, 256, tamaño + (3,), dtype=np.uint8)
+    ruta = str(tmp_path / "imagen.png")
+    Image.fromarray(imagen).save(ruta)
+    return imagen, datos.leer_imagen_uint8(ruta, TAMAÑO)
+
+
+def a_uint8(salida):
+    return np.rint(np.asarray(salida)[0] * 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("tamaño", TAMAÑOS_ORIGEN)
+def test_keras_redimensiona_como_el_entrenamiento(tmp_path, modelo_identidad, tamaño):
+    imagen, esperada = imagen_y_esperada(tmp_path, tamaño)
+    assert np.array_equal(a_uint8(modelo_identidad(imagen[np.newaxis])), esperada)
+
+
+@pytest.mark.parametrize("tamaño", TAMAÑOS_ORIGEN)
+def test_tflite_redimensiona_como_el_entrenamiento(tmp_path, interprete, tamaño):
+    imagen, esperada = imagen_y_esperada(tmp_path, tamaño)
+    entrada = interprete.get_input_details()[0]["index"]
+    interprete.resize_tensor_input(entrada, (1,) + tamaño + (3,))
+    interprete.allocate_tensors()
+    interprete.set_tensor(entrada, imagen[np.newaxis])
+    interprete.invoke()
+    salida = interprete.get_tensor(interprete.get_output_details()[0]["index"])
+    assert np.array_equal(a_uint8(salida), esperada)
+
+
+@pytest.mark.parametrize("salida", [224, 150, 96])
+def test_indices_iguales_a_pil_para_todos_los_lados(salida):
+    # Todos los lados hasta 1200 en una sola fila: compara solo los índices elegidos
+    empates = cargador_modelo._empates_pil(salida)
+    for lado in range(1, 1201):
+        fila = np.arange(lado, dtype=np.float32)[np.newaxis]
+        pil = np.asarray(Image.fromarray(fila, mode="F").resize((salida, 1), Image.NEAREST))[0]
+        indices = cargador_modelo._indices_pil(lado, salida, *empates)
+        assert np.array_equal(indices.numpy(), pil.astype(np.int64)), lado
@@ -0,0 +1,154 @@
+"""
+Pruebas de clasificar_video.py sin modelo: la ranura entre los hilos, el
+suavizado por tiempo y los cuadros que salta el decodificador sobre un video
+sintético
+"""
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import clasificar_video
+import datos
+import predecir
+
+FPS_VIDEO = 30.0
+CUADROS_VIDEO = 30
+
+
+@pytest.fixture
+def video(tmp_path):
+    """Un segundo de video a 30 FPS, todo azul (BGR)"""
+    ruta = str(tmp_path / "cinta.avi")
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*"MJPG"), FPS_VIDEO, (160, 120))
+    assert escritor.isOpened()
+    for _ in range(CUADROS_VIDEO):
+        escritor.write(np.full((120, 160, 3), (255, 0, 0), dtype=np.uint8))
+    escritor.release()
+    return ruta
+
+
+def decodificar_todo(ruta, fps_objetivo):
+    """Ejecuta decodificar en su hilo, como clasificar_video, y devuelve (cuadros, contadores)"""
+    captura = cv2.VideoCapture(ruta)
+    ranura = clasificar_video.Ranura(bloqueante=True)  # No se pierde ninguno: solo cuentan los saltados
+    contadores = {"leidos": 0, "saltados": 0}
+    hilo = threading.Thread(target=clasificar_video.decodificar,
+                            args=(captura, ranura, fps_objetivo, FPS_VIDEO, False, False, contadores))
+    hilo.start()
+    cuadros = []
+    while (cuadro := ranura.tomar()) is not None:
+        cuadros.append(cuadro)
+    hilo.join(timeout=10)
+    captura.release()
+    assert ranura.descartados == 0
+    return cuadros, contadores
+
+
+def test_ranura_no_bloqueante_reemplaza_el_cuadro_pendiente():
+    ranura = clasificar_video.Ranura()
+    for cuadro in (1, 2, 3):
+        ranura.poner(cuadro)
+    assert ranura.tomar() == 3
+    assert ranura.descartados == 2
+    ranura.cerrar()
+    assert ranura.tomar() is None
+
+
+def test_ranura_bloqueante_espera_a_que_se_tome():
+    ranura = clasificar_video.Ranura(bloqueante=True)
+    ranura.poner(1)
+    hilo = threading.Thread(target=ranura.poner, args=(2,))
+    hilo.start()
+    time.sleep(0.1)
+    assert hilo.is_alive()  # El 1 sigue pendiente: el 2 espera
+    assert ranura.tomar() == 1
+    hilo.join(timeout=1)
+    assert not hilo.is_alive()
+    assert ranura.tomar() == 2
+    assert ranura.descartados == 0
+
+
+def test_cerrar_libera_al_que_espera():
+    ranura = clasificar_video.Ranura(bloqueante=True)
+    ranura.poner(1)
+    hilo = threading.Thread(target=ranura.poner, args=(2,))
+    hilo.start()
+    ranura.cerrar()
+    hilo.join(timeout=1)
+    assert not hilo.is_alive()
+    # Lo que quedaba se entrega y después la ranura avisa que no llegan más
+    assert ranura.tomar() == 2
+    assert ranura.tomar() is None
+
+
+def test_suavizador_decae_con_la_constante_de_tiempo():
+    suavizador = clasificar_video.Suavizador(0.5)
+    suavizador.actualizar(np.array([1.0, 0.0]), 0.0)
+    media = suavizador.actualizar(np.array([0.0, 1.0]), 0.5)
+    # Pasada una constante de tiempo queda e^-1 de la historia
+    assert media[0] == pytest.approx(math.exp(-1), rel=1e-5)
+    assert media.sum() == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("fps", [5, 15, 30])
+def test_suavizador_no_depende_de_los_cuadros_clasificados(fps):
+    suavizador = clasificar_video.Suavizador(0.5)
+    suavizador.actualizar(np.array([1.0, 0.0]), 0.0)
+    for i in range(1, fps + 1):
+        media = suavizador.actualizar(np.array([0.0, 1.0]), i / fps)
+    # Tras 1 s (dos constantes) vale lo mismo salte o no cuadros
+    assert media[0] == pytest.approx(math.exp(-2), rel=1e-5)
+
+
+def test_suavizador_sin_constante_no_suaviza():
+    suavizador = clasificar_video.Suavizador(0)
+    suavizador.actualizar(np.array([1.0, 0.0]), 0.0)
+    assert list(suavizador.actualizar(np.array([0.0, 1.0]), 0.1)) == [0.0, 1.0]
+
+
+def test_decodificar_salta_cuadros_para_el_fps_objetivo(video):
+    cuadros, contadores = decodificar_todo(video, 15)
+    assert contadores["leidos"] == CUADROS_VIDEO
+    assert len(cuadros) + contadores["saltados"] == CUADROS_VIDEO
+    # 30 FPS a 15: pasa uno de cada dos
+    assert len(cuadros) == CUADROS_VIDEO // 2
+    indices = [indice for indice, *_ in cuadros]
+    assert indices == sorted(indices)
+    tiempos = [tiempo for _, _, tiempo, _, _ in cuadros]
+    assert all(b - a >= 1 / 15 - 0.5 / FPS_VIDEO for a, b in zip(tiempos, tiempos[1:]))
+
+
+def test_decodificar_sin_fps_objetivo_pasa_todos(video):
+    cuadros, contadores = decodificar_todo(video, 0)
+    assert contadores == {"leidos": CUADROS_VIDEO, "saltados": 0}
+    assert len(cuadros) == CUADROS_VIDEO
+
+
+def test_decodificar_entrega_rgb_del_tamaño_del_modelo(video):
+    cuadros, _ = decodificar_todo(video, 0)
+    _, _, _, rgb, bgr = cuadros[0]
+    assert rgb.shape == predecir.TAMAÑO_IMAGEN + (3,)
+    assert bgr.shape == (120, 160, 3)
+    # Azul en BGR: el último canal del RGB
+    assert rgb[..., 2].mean() > 200 and rgb[..., 0].mean() < 50
+
+
+@pytest.mark.parametrize("tamaño", [(120, 160), (480, 640), (181, 200)])
+def test_decodificar_redimensiona_como_el_entrenamiento(tmp_path, tamaño):
+    alto, ancho = tamaño
+    ruta = str(tmp_path / "ruido.avi")
+    rng = np.random.default_rng(0)
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*"MJPG"), FPS_VIDEO, (ancho, alto))
+    for _ in range(3):
+        escritor.write(rng.integers(0, 256, (alto, ancho, 3), dtype=np.uint8))
+    escritor.release()
+    cuadros, _ = decodificar_todo(ruta, 0)
+    for _, _, _, rgb, bgr in cuadros:
+        # El mismo cuadro leído como en el entrenamiento da exactamente los mismos píxeles
+        ruta_png = str(tmp_path / "cuadro.png")
+        cv2.imwrite(ruta_png, bgr)
+        assert np.array_equal(rgb, datos.leer_imagen_uint8(ruta_png, predecir.TAMAÑO_IMAGEN))
@@ -0,0 +1,187 @@
+"""
+Pruebas del modo paralelo de descargar_imagenes_bing.py contra un servidor
+HTTP local (sin acceso a Internet)
+"""
+import io
+import os
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from PIL import Image
+
+import descargar_imagenes_bing as descarga
+
+
+def imagen_png(lado=96):
+    """PNG de ruido: no comprime, así que supera TAMAÑO_MINIMO"""
+    imagen = Image.frombytes("RGB", (lado, lado), os.urandom(lado * lado * 3))
+    buffer = io.BytesIO()
+    imagen.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+PNG_VALIDO = imagen_png()
+ARCHIVOS = {
+    "/img/ok1.png": PNG_VALIDO,
+    "/img/ok2.png": imagen_png(),
+    "/img/ok3.png": imagen_png(),
+    "/img/pequena.png": imagen_png(8),
+    "/img/cortada.png": PNG_VALIDO[:len(PNG_VALIDO) // 2],  # Content-Length correcto, PNG incompleto
+}
+ENLACES = ["/img/ok1.png", "/img/pequena.png", "/img/cortada.png", "/img/truncada.png",
+           "/img/ok2.png", "/img/ok3.png"]
+
+
+class Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        ruta = self.path.split("?")[0]
+        self.server.pedidas.append(ruta)
+        if ruta == "/buscar":
+            base = f"http://127.0.0.1:{self.server.server_port}"
+            cuerpo = "".join(f'<a m="{{&quot;murl&quot;:&quot;{base}{e}&quot;}}">' for e in ENLACES).encode()
+        elif ruta == "/img/truncada.png":
+            # Anuncia el archivo completo pero corta la conexión a la mitad
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(PNG_VALIDO)))
+            self.end_headers()
+            self.wfile.write(PNG_VALIDO[:1000])
+            return
+        elif ruta in ARCHIVOS:
+            cuerpo = ARCHIVOS[ruta]
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    servidor.pedidas = []
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def una_clase(monkeypatch):
+    monkeypatch.setattr(descarga, "CONSULTAS_BUSQUEDA", ["fruta de prueba"])
+    monkeypatch.setattr(descarga, "NOMBRES_CARPETAS", ["fruta"])
+
+
+def imagenes_pedidas(servidor):
+    return [r for r in servidor.pedidas if r.startswith("/img/")]
+
+
+def archivos_part(carpeta):
+    return [f for _, _, archivos in os.walk(carpeta) for f in archivos if f.endswith(".part")]
+
+
+def test_reanuda_con_el_diario(servidor, una_clase, tmp_path):
+    url_busqueda = f"http://127.0.0.1:{servidor.server_port}/buscar"
+    salida = str(tmp_path)
+
+    # Primera ejecución "interrumpida": solo hace falta una imagen
+    totales = descarga.descargar_todas_paralelo(1, 4, salida, url_busqueda, 0)
+    assert totales == {"fruta": 1}
+    assert imagenes_pedidas(servidor) == ["/img/ok1.png"]
+
+    # Línea a medias al final del diario, como si se hubiera matado el proceso
+    with open(os.path.join(salida, descarga.ARCHIVO_DIARIO), "a", encoding="utf-8") as f:
+        f.write('{"url": "http://127.0.0.1/img/ok')
+
+    servidor.pedidas.clear()
+    totales = descarga.descargar_todas_paralelo(3, 4, salida, url_busqueda, 0)
+    assert totales == {"fruta": 3}
+    assert "/img/ok1.png" not in imagenes_pedidas(servidor)
+
+    diario = descarga.Diario(os.path.join(salida, descarga.ARCHIVO_DIARIO))
+    estados = {url.rsplit("/", 1)[1]: r["estado"] for url, r in diario.resueltas.items()}
+    assert estados == {"ok1.png": "guardada", "ok2.png": "guardada", "ok3.png": "guardada",
+                       "pequena.png": "rechazada", "cortada.png": "rechazada"}
+    # Los errores de red no se anotan: se reintentan al reanudar
+    assert "truncada.png" not in estados
+
+    # Con todo resuelto solo se vuelve a pedir la imagen que falló por la red
+    servidor.pedidas.clear()
+    totales = descarga.descargar_todas_paralelo(4, 4, salida, url_busqueda, 0)
+    assert totales == {"fruta": 3}
+    assert imagenes_pedidas(servidor) == ["/img/truncada.png"]
+    assert archivos_part(salida) == []
+
+
+def test_salta_clases_completas(servidor, una_clase, tmp_path):
+    url_busqueda = f"http://127.0.0.1:{servidor.server_port}/buscar"
+    descarga.descargar_todas_paralelo(2, 4, str(tmp_path), url_busqueda, 0)
+    servidor.pedidas.clear()
+    assert descarga.descargar_todas_paralelo(2, 4, str(tmp_path), url_busqueda, 0) == {"fruta": 2}
+    assert servidor.pedidas == []
+
+
+def test_limitador_espacia_peticiones_al_mismo_host():
+    limitador = descarga.LimitadorPorHost(0.2)
+    inicio = time.monotonic()
+    for _ in range(3):
+        limitador.esperar("http://a.example/imagen.jpg")
+    assert time.monotonic() - inicio >= 0.4
+
+    # Otro servidor no espera al primero
+    inicio = time.monotonic()
+    limitador.esperar("http://b.example/imagen.jpg")
+    assert time.monotonic() - inicio < 0.1
+
+
+def test_limitador_entre_hilos():
+    limitador = descarga.LimitadorPorHost(0.1)
+    instantes = []
+    bloqueo = threading.Lock()
+
+    def pedir():
+        limitador.esperar("http://a.example/x.jpg")
+        with bloqueo:
+            instantes.append(time.monotonic())
+
+    hilos = [threading.Thread(target=pedir) for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    instantes.sort()
+    assert all(b - a >= 0.09 for a, b in zip(instantes, instantes[1:]))
+
+
+@pytest.mark.parametrize("ruta", ["/img/pequena.png", "/img/cortada.png", "/img/truncada.png"])
+def test_no_guarda_imagenes_invalidas(servidor, tmp_path, ruta):
+    url = f"http://127.0.0.1:{servidor.server_port}{ruta}"
+    with pytest.raises(Exception):
+        descarga.descargar_imagen(url, str(tmp_path), descarga.LimitadorPorHost(0))
+    assert os.listdir(tmp_path) == []
+
+
+def test_borra_el_part_si_falla_la_escritura(servidor, tmp_path, monkeypatch):
+    def falla(origen, destino):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(descarga.os, "replace", falla)
+    url = f"http://127.0.0.1:{servidor.server_port}/img/ok1.png"
+    with pytest.raises(OSError):
+        descarga.descargar_imagen(url, str(tmp_path), descarga.LimitadorPorHost(0))
+    assert os.listdir(tmp_path) == []
+
+
+def test_guarda_imagen_valida(servidor, tmp_path):
+    url = f"http://127.0.0.1:{servidor.server_port}/img/ok1.png"
+    nombre = descarga.descargar_imagen(url, str(tmp_path), descarga.LimitadorPorHost(0))
+    assert os.listdir(tmp_path) == [nombre] and nombre.endswith(".png")
+    with open(tmp_path / nombre, "rb") as f:
+        assert f.read() == PNG_VALIDO
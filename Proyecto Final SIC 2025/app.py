@@ -1,17 +1,27 @@
 import streamlit as st
-import tensorflow as tf
 import numpy as np
 from PIL import Image
 import plotly.graph_objects as go
 import plotly.express as px
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import time
 import os
+from cache_predicciones import CachePredicciones, huella_modelo, CARPETA_CACHE_PREDICCIONES
+import cargador_modelo
+import metricas
+import micro_lotes
 
 # --- CONFIGURACIÓN ---
 RUTA_MODELO = 'modelo/modelo_banana.h5'
 IMAGEN_ANCHO = 150
 IMAGEN_ALTO = 150
 CLASES = ['inmaduro', 'maduro', 'podrido', 'sobremaduro']
+TAMAÑO_LOTE = 32          # Imágenes por llamada al modelo al analizar varias a la vez
+COLUMNAS_MINIATURAS = 6
+# El .tflite exportado trae sus clases; con el modelo Keras se usan las de arriba
+CLASES = cargador_modelo.leer_clases(RUTA_MODELO, CLASES)
 
 # Configuración de la página
 st.set_page_config(
@@ -61,45 +71,190 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def iniciar_metricas():
+    """
+    Tiempos por etapa (METRICAS_LATENCIA=1): se guardan en metricas/app.json y
+    metricas/app.prom, y con METRICAS_PUERTO también se sirven por HTTP
+    """
+    registro = metricas.configurar('app')
+    if registro.activas and metricas.PUERTO_HTTP:
+        registro.servir_http(metricas.PUERTO_HTTP)
+    return registro
+
+registro_metricas = iniciar_metricas()
+
 def cargar_modelo():
-    """Carga el modelo entrenado"""
-    try:
-        modelo = tf.keras.models.load_model(RUTA_MODELO)
-        return modelo
-    except Exception as e:
-        st.error(f"❌ Error al cargar el modelo: {e}")
+    """Carga el modelo entrenado (su versión TFLite si existe); lo llama el hilo de MicroLotes"""
+    with registro_metricas.medir('cargar_modelo'):
+        return cargador_modelo.cargar_modelo(RUTA_MODELO)
+
+@st.cache_resource(max_entries=1)
+def obtener_micro_lotes(version_modelo):
+    """
+    Hilo de inferencia compartido por todas las sesiones: junta en un solo
+    predict las imágenes que piden varios usuarios a la vez. Con otra versión
+    del modelo se crea uno nuevo; el anterior suelta su modelo al quedar inactivo
+    """
+    return micro_lotes.MicroLotes(cargar_modelo, lote_maximo=TAMAÑO_LOTE, registro=registro_metricas)
+
+def micro_lotes_actual():
+    ruta = cargador_modelo.ruta_artefacto(RUTA_MODELO)
+    return obtener_micro_lotes(huella_modelo(ruta) if os.path.exists(ruta) else '')
+
+def mostrar_error_modelo(error):
+    """Mensaje cuando falla la carga del modelo o la predicción"""
+    if not os.path.exists(cargador_modelo.ruta_artefacto(RUTA_MODELO)):
+        st.error(f"❌ Error al cargar el modelo: {error}")
         st.info("💡 Asegúrate de haber ejecutado 'entrenar.py' primero.")
+    else:
+        st.error(f"Error en la predicción: {error}")
+
+@st.cache_resource
+def obtener_cache_predicciones():
+    """Caché de predicciones compartida por todas las sesiones de la app"""
+    return CachePredicciones(carpeta_disco=CARPETA_CACHE_PREDICCIONES)
+
+def clave_prediccion(cache, contenido):
+    """Clave de caché: bytes de la imagen + versión del modelo (mismo preprocesamiento que predecir.py)"""
+    ruta = cargador_modelo.ruta_artefacto(RUTA_MODELO)
+    if not os.path.exists(ruta):
         return None
+    return cache.clave(contenido, huella_modelo(ruta, f"{IMAGEN_ANCHO}x{IMAGEN_ALTO}"))
+
+def preparar_imagen(imagen_cargada):
+    """RGB y redimensionada al tamaño del modelo, como arreglo uint8 (alto, ancho, 3)"""
+    # Convertir a RGB si es necesario (para PNGs con transparencia)
+    if imagen_cargada.mode != 'RGB':
+        imagen_cargada = imagen_cargada.convert('RGB')
+
+    # Redimensionar con 'nearest', igual que load_img de Keras en el entrenamiento
+    img_resized = imagen_cargada.resize((IMAGEN_ANCHO, IMAGEN_ALTO), Image.NEAREST)
+    return np.array(img_resized)
 
 def procesar_imagen(imagen_cargada):
     """Procesa la imagen para la predicción"""
     try:
-        # Convertir a RGB si es necesario (para PNGs con transparencia)
-        if imagen_cargada.mode != 'RGB':
-            imagen_cargada = imagen_cargada.convert('RGB')
-        
-        # Redimensionar
-        img_resized = imagen_cargada.resize((IMAGEN_ANCHO, IMAGEN_ALTO))
-        
-        # Convertir a array y normalizar
-        img_array = np.array(img_resized)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = img_array / 255.0
+        with registro_metricas.medir('procesar_imagen'):
+            # Lote de una imagen uint8: el modelo normaliza por dentro
+            img_array = preparar_imagen(imagen_cargada)
+            img_array = np.expand_dims(img_array, axis=0)
         
         return img_array
     except Exception as e:
         st.error(f"Error al procesar la imagen: {e}")
         return None
 
-def predecir(modelo, img_array):
-    """Realiza la predicción"""
+def predecir(img_array):
+    """Realiza la predicción (espera a que el hilo compartido la incluya en un lote)"""
     try:
-        predictions = modelo.predict(img_array, verbose=0)
+        with registro_metricas.medir('predict'):
+            predictions = micro_lotes_actual().predecir(img_array)
         return predictions[0]
     except Exception as e:
-        st.error(f"Error en la predicción: {e}")
+        mostrar_error_modelo(e)
         return None
 
+def leer_archivo_lote(archivo, cache):
+    """
+    Busca una imagen subida en la caché o la decodifica (se ejecuta en un pool de hilos).
+    Devuelve (clave, probabilidades_en_cache, imagen uint8, error).
+    """
+    try:
+        contenido = archivo.getvalue()
+        clave = clave_prediccion(cache, contenido)
+        probabilidades = cache.obtener(clave) if clave else None
+        if probabilidades is not None:
+            return clave, probabilidades, None, None
+        with registro_metricas.medir('procesar_imagen'), Image.open(BytesIO(contenido)) as imagen:
+            return clave, None, preparar_imagen(imagen), None
+    except Exception as e:
+        return None, None, None, str(e)
+
+def predecir_lote(archivos):
+    """
+    Analiza varias imágenes con pocas llamadas al modelo: se decodifican en
+    paralelo, se apilan y se predicen de TAMAÑO_LOTE en TAMAÑO_LOTE. Las que
+    ya están en la caché de predicciones no pasan por el modelo.
+    """
+    inicio = time.perf_counter()
+    cache = obtener_cache_predicciones()
+    with ThreadPoolExecutor() as pool:
+        leidas = list(pool.map(lambda a: leer_archivo_lote(a, cache), archivos))
+
+    probabilidades = [probs for _, probs, _, _ in leidas]
+    registro_metricas.contar('aciertos_cache', sum(probs is not None for probs in probabilidades))
+    pendientes = [i for i, (_, probs, img, _) in enumerate(leidas) if probs is None and img is not None]
+    if pendientes:
+        # Se encolan todos los bloques a la vez; el hilo compartido los predice
+        # junto con lo que pidan las demás sesiones
+        lotes = micro_lotes_actual()
+        futuros = []
+        for desde in range(0, len(pendientes), TAMAÑO_LOTE):
+            indices = pendientes[desde:desde + TAMAÑO_LOTE]
+            futuros.append((indices, lotes.enviar(np.stack([leidas[i][2] for i in indices]))))
+        try:
+            for indices, futuro in futuros:
+                for i, probs in zip(indices, futuro.result()):
+                    probabilidades[i] = probs
+                    if leidas[i][0]:
+                        cache.guardar(leidas[i][0], probs)
+        except Exception as e:
+            mostrar_error_modelo(e)
+            return None
+
+    filas = []
+    for archivo, probs, (_, _, _, error) in zip(archivos, probabilidades, leidas):
+        if probs is None:
+            filas.append({'Archivo': archivo.name, 'Estado': 'error', 'Confianza (%)': None, 'Error': error})
+            continue
+        indice = int(np.argmax(probs))
+        fila = {'Archivo': archivo.name, 'Estado': CLASES[indice], 'Confianza (%)': round(float(probs[indice]) * 100, 2)}
+        fila.update({f"{clase} (%)": round(float(p) * 100, 2) for clase, p in zip(CLASES, probs)})
+        filas.append(fila)
+
+    return {
+        'filas': filas,
+        'segundos': time.perf_counter() - inicio,
+        'predichas': len(pendientes),
+        'desde_cache': sum(probs is not None for _, probs, _, _ in leidas),
+    }
+
+def mostrar_resultados_lote(lote, archivos):
+    """Resumen, conteo por estado, tabla ordenable y miniaturas opcionales"""
+    st.markdown("---")
+    st.markdown("## 📊 Resultados del Análisis")
+
+    filas = lote['filas']
+    analizadas = sum(f['Estado'] != 'error' for f in filas)
+    velocidad = len(filas) / lote['segundos'] if lote['segundos'] > 0 else 0
+    st.success(f"✅ {analizadas} de {len(filas)} imágenes analizadas en {lote['segundos']:.2f} s "
+               f"({velocidad:.0f} imágenes/s, {lote['desde_cache']} desde la caché)")
+
+    # Cuántas imágenes hay de cada estado
+    columnas = st.columns(len(CLASES))
+    for columna, clase in zip(columnas, CLASES):
+        with columna:
+            st.metric(clase.capitalize(), sum(f['Estado'] == clase for f in filas))
+
+    # Tabla (se ordena haciendo clic en el encabezado de cada columna)
+    tabla = pd.DataFrame(filas)
+    st.dataframe(tabla, use_container_width=True, hide_index=True)
+    st.download_button("⬇️ Descargar resultados (CSV)", tabla.to_csv(index=False).encode('utf-8'),
+                       file_name='resultados.csv', mime='text/csv')
+
+    if st.checkbox("🖼️ Mostrar miniaturas"):
+        for desde in range(0, len(archivos), COLUMNAS_MINIATURAS):
+            columnas = st.columns(COLUMNAS_MINIATURAS)
+            for columna, archivo, fila in zip(columnas, archivos[desde:], filas[desde:]):
+                with columna:
+                    if fila['Estado'] == 'error':
+                        st.caption(f"❌ {archivo.name}")
+                        continue
+                    miniatura = Image.open(archivo)
+                    miniatura.thumbnail((200, 200))
+                    st.image(miniatura, caption=f"{fila['Estado']} ({fila['Confianza (%)']:.0f}%)")
+
 def crear_grafica_barras(confianza):
     """Crea gráfica de barras para Accuracy y Loss"""
     perdida = 100 - confianza
@@ -181,16 +336,23 @@ if 'nombre_archivo_actual' not in st.session_state:
     st.session_state.nombre_archivo_actual = None
 if 'uploader_key' not in st.session_state:
     st.session_state.uploader_key = 0
+if 'resultados_lote' not in st.session_state:
+    st.session_state.resultados_lote = None
+if 'firma_lote' not in st.session_state:
+    st.session_state.firma_lote = None
 
 # Sección de carga de imagen
 st.subheader("📤 Cargar Imagen de Plátano")
 
-uploaded_file = st.file_uploader(
-    "Arrastra o selecciona una imagen",
+archivos_subidos = st.file_uploader(
+    "Arrastra o selecciona una o varias imágenes",
     type=['jpg', 'jpeg', 'png'],
-    help="Formatos soportados: JPG, JPEG, PNG",
+    accept_multiple_files=True,
+    help="Formatos soportados: JPG, JPEG, PNG. Con varias imágenes se analizan todas juntas.",
     key=f"uploader_{st.session_state.uploader_key}"
 )
+# Una sola imagen: análisis detallado. Varias: análisis por lotes (más abajo)
+uploaded_file = archivos_subidos[0] if len(archivos_subidos) == 1 else None
 
 # Si se eliminó el archivo, limpiar todo
 if uploaded_file is None and st.session_state.imagen_cargada is not None:
@@ -209,7 +371,8 @@ if uploaded_file is not None:
         st.session_state.nombre_archivo_actual = uploaded_file.name
     
     # Cargar la imagen
-    imagen = Image.open(uploaded_file)
+    with registro_metricas.medir('abrir_imagen'):
+        imagen = Image.open(uploaded_file)
     st.session_state.imagen_cargada = imagen
     
     # Mostrar la imagen con tamaño estandarizado y centrada
@@ -227,32 +390,40 @@ if uploaded_file is not None:
     with col_btn1:
         if st.button("🔮 Predecir", use_container_width=True):
             with st.spinner('🤖 Analizando imagen...'):
-                # Cargar modelo
-                modelo = cargar_modelo()
-                
-                if modelo is not None:
+                # La misma imagen con el mismo modelo no se vuelve a predecir
+                with registro_metricas.medir('cache'):
+                    cache = obtener_cache_predicciones()
+                    clave = clave_prediccion(cache, uploaded_file.getvalue())
+                    predictions = cache.obtener(clave) if clave else None
+                if predictions is not None:
+                    registro_metricas.contar('aciertos_cache')
+
+                if predictions is None:
                     # Procesar imagen
                     img_array = procesar_imagen(imagen)
-                    
+
                     if img_array is not None:
                         # Realizar predicción
-                        predictions = predecir(modelo, img_array)
-                        
-                        if predictions is not None:
-                            # Obtener resultados
-                            indice_ganador = np.argmax(predictions)
-                            clase_ganadora = CLASES[indice_ganador]
-                            confianza = predictions[indice_ganador] * 100
-                            
-                            # Guardar resultados en session state
-                            st.session_state.resultados = {
-                                'clase': clase_ganadora,
-                                'confianza': confianza,
-                                'probabilidades': predictions * 100
-                            }
-                            st.session_state.prediccion_realizada = True
-                            st.success("✅ ¡Predicción completada!")
-                            st.rerun()
+                        predictions = predecir(img_array)
+
+                        if predictions is not None and clave:
+                            cache.guardar(clave, predictions)
+
+                if predictions is not None:
+                    # Obtener resultados
+                    indice_ganador = np.argmax(predictions)
+                    clase_ganadora = CLASES[indice_ganador]
+                    confianza = predictions[indice_ganador] * 100
+                    
+                    # Guardar resultados en session state
+                    st.session_state.resultados = {
+                        'clase': clase_ganadora,
+                        'confianza': confianza,
+                        'probabilidades': predictions * 100
+                    }
+                    st.session_state.prediccion_realizada = True
+                    st.success("✅ ¡Predicción completada!")
+                    st.rerun()
     
     with col_btn2:
         if st.button("🔄 Escoger Otra", use_container_width=True):
@@ -282,7 +453,8 @@ if st.session_state.prediccion_realizada and st.session_state.resultados is not
     
     # Gráfica de barras (Accuracy vs Loss)
     st.markdown("### 📈 Precisión del Modelo")
-    fig_barras = crear_grafica_barras(resultados['confianza'])
+    with registro_metricas.medir('grafica'):
+        fig_barras = crear_grafica_barras(resultados['confianza'])
     st.plotly_chart(fig_barras, use_container_width=True)
     
     st.markdown("<br>", unsafe_allow_html=True)
@@ -297,7 +469,8 @@ if st.session_state.prediccion_realizada and st.session_state.resultados is not
     
     for i, (clase, probabilidad) in enumerate(zip(CLASES, resultados['probabilidades'])):
         with columnas[i]:
-            fig_pastel = crear_grafica_pastel(clase, probabilidad)
+            with registro_metricas.medir('grafica'):
+                fig_pastel = crear_grafica_pastel(clase, probabilidad)
             st.plotly_chart(fig_pastel, use_container_width=True)
             # Mostrar con notación científica si es muy pequeño
             if probabilidad < 0.01:
@@ -305,6 +478,37 @@ if st.session_state.prediccion_realizada and st.session_state.resultados is not
             else:
                 st.markdown(f"<p style='text-align: center; font-weight: bold;'>{probabilidad:.2f}%</p>", unsafe_allow_html=True)
 
+# ===================== ANÁLISIS DE VARIAS IMÁGENES =====================
+
+if len(archivos_subidos) > 1:
+    # Limpiar resultados anteriores si cambió el conjunto de imágenes
+    firma = tuple((a.name, a.size) for a in archivos_subidos)
+    if st.session_state.firma_lote != firma:
+        st.session_state.resultados_lote = None
+        st.session_state.firma_lote = firma
+
+    st.markdown(f"### 🖼️ {len(archivos_subidos)} Imágenes Cargadas")
+    st.markdown("### 🎯 Acciones")
+    col_btn1, col_btn2 = st.columns(2)
+
+    with col_btn1:
+        if st.button("🔮 Predecir todas", use_container_width=True):
+            with st.spinner(f'🤖 Analizando {len(archivos_subidos)} imágenes...'):
+                st.session_state.resultados_lote = predecir_lote(archivos_subidos)
+
+    with col_btn2:
+        if st.button("🔄 Escoger Otras", use_container_width=True):
+            st.session_state.resultados_lote = None
+            st.session_state.firma_lote = None
+            st.session_state.uploader_key += 1
+            st.rerun()
+
+    if st.session_state.resultados_lote is not None:
+        mostrar_resultados_lote(st.session_state.resultados_lote, archivos_subidos)
+
 # Mensaje inicial solo si no hay imagen cargada
-if uploaded_file is None and st.session_state.imagen_cargada is None:
+if not archivos_subidos and st.session_state.imagen_cargada is None:
     st.info("👆 Por favor, carga una imagen de un plátano para comenzar el análisis.")
+
+# Tiempos por etapa hasta ahora (no hace nada si las métricas están desactivadas)
+registro_metricas.guardar()
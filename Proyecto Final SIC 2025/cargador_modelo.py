@@ -0,0 +1,289 @@
+"""
+Carga del modelo para inferencia.
+
+Si junto al modelo Keras existe su versión TensorFlow Lite (la genera
+exportar_modelo.py), se usa el intérprete de TFLite: ocupa mucha menos memoria
+y cada llamada tiene menos sobrecarga que model.predict. Si está instalado el
+paquete ligero tflite-runtime se usa ese intérprete y no hace falta importar
+TensorFlow.
+
+El .tflite que escribe exportar_modelo.py es un único archivo autosuficiente:
+lleva las clases incrustadas (ver leer_clases_incrustadas) y los pesos
+alineados para que el intérprete los use directamente desde el archivo mapeado
+en memoria, sin copiarlos ni reconstruir capas como hace Keras.
+
+El modelo que devuelve cargar_modelo recibe siempre imágenes uint8 (lote, alto,
+ancho, 3) de cualquier tamaño: redimensionar y normalizar son operaciones del
+propio modelo (ver envolver_uint8), así que quien predice no convierte a float.
+"""
+
+import os
+import mmap
+import struct
+import threading
+import numpy as np
+
+USAR_TFLITE = True
+METADATO_ETIQUETAS = 'etiquetas'  # Nombre del metadato del .tflite con las clases
+LADO_MAXIMO_EXACTO = 8192  # Hasta este lado el modelo redimensiona con los mismos píxeles que PIL
+
+
+def ruta_tflite(ruta_modelo):
+    """modelo/modelo_banana.h5 -> modelo/modelo_banana.tflite"""
+    return os.path.splitext(ruta_modelo.rstrip('/\\'))[0] + '.tflite'
+
+
+def _fecha_modificacion(ruta):
+    if os.path.isdir(ruta):
+        return max((os.path.getmtime(os.path.join(raiz, n))
+                    for raiz, _, nombres in os.walk(ruta) for n in nombres), default=0)
+    return os.path.getmtime(ruta)
+
+
+def ruta_artefacto(ruta_modelo, usar_tflite=USAR_TFLITE):
+    """Archivo que se va a cargar realmente (sirve para la huella de la caché)"""
+    ruta = ruta_tflite(ruta_modelo)
+    if not (usar_tflite and os.path.exists(ruta)):
+        return ruta_modelo
+    # Un .tflite exportado antes de reentrenar ya no corresponde al modelo
+    if os.path.exists(ruta_modelo) and _fecha_modificacion(ruta_modelo) > os.path.getmtime(ruta):
+        print(f"Aviso: {ruta} es anterior a {ruta_modelo}; se usa el modelo Keras "
+              f"(vuelve a ejecutar exportar_modelo.py)")
+        return ruta_modelo
+    return ruta
+
+
+def _empates_pil(salida, lado_maximo=LADO_MAXIMO_EXACTO):
+    """
+    Image.NEAREST de PIL toma la fila (o columna) floor((i + 0.5) * lado / salida),
+    pero acumula esa posición en double sumando lado / salida píxel a píxel.
+    Cuando el valor exacto es entero, el redondeo puede dejarla justo por debajo
+    y PIL elige el píxel anterior. Eso solo pasa si `lado` es múltiplo de `paso`
+    (el doble de la mayor potencia de 2 que divide a `salida`).
+
+    Returns:
+        tuple: (paso, patrones, patron_de_lado): cada patrón tiene un 1 donde PIL
+        elige el píxel anterior y patron_de_lado[lado // paso] dice cuál
+        corresponde a cada lado múltiplo de paso hasta lado_maximo (hay pocos
+        patrones distintos, así la tabla que va dentro del modelo es pequeña)
+    """
+    paso = 2 * (salida & -salida)
+    lados = np.arange(0, lado_maximo + 1, paso, dtype=np.int64)
+    i = np.arange(salida, dtype=np.int64)
+    exactos = (2 * i + 1) * lados[:, np.newaxis] // (2 * salida)
+    escala = lados / salida
+    # Mismas sumas, en el mismo orden, que Pillow (np.cumsum acumula de a uno)
+    sumandos = np.repeat(escala[:, np.newaxis], salida, axis=1)
+    sumandos[:, 0] = escala * 0.5
+    acumulado = np.floor(np.cumsum(sumandos, axis=1)).astype(np.int64)
+    patrones, patron_de_lado = np.unique((exactos - acumulado).astype(np.uint8), axis=0, return_inverse=True)
+    return paso, patrones, patron_de_lado.reshape(-1).astype(np.int32)
+
+
+def _indices_pil(lado, salida, paso, patrones, patron_de_lado):
+    """Filas (o columnas) de un lado de `lado` píxeles que elige Image.NEAREST de PIL"""
+    import tensorflow as tf
+    i = tf.range(salida)
+    indices = (2 * i + 1) * lado // (2 * salida)  # floor((i + 0.5) * lado / salida), con enteros
+    fila = lado // paso
+    en_tabla = tf.logical_and(tf.equal(lado % paso, 0), fila < len(patron_de_lado))
+    patron = tf.gather(tf.constant(patron_de_lado), tf.minimum(fila, len(patron_de_lado) - 1))
+    correccion = tf.gather(tf.constant(patrones), patron)
+    return indices - tf.cast(correccion, tf.int32) * tf.cast(en_tabla, tf.int32)
+
+
+def redimensionar_como_pil(imagenes, alto, ancho):
+    """
+    Lote uint8 (lote, alto', ancho', 3) de cualquier tamaño -> (lote, alto, ancho, 3)
+    con los mismos píxeles que Image.NEAREST de PIL, como operación de TensorFlow
+    (se convierte a TFLite sin operaciones extra)
+    """
+    import tensorflow as tf
+    forma = tf.shape(imagenes)
+    imagenes = tf.gather(imagenes, _indices_pil(forma[1], alto, *_empates_pil(alto)), axis=1)
+    return tf.gather(imagenes, _indices_pil(forma[2], ancho, *_empates_pil(ancho)), axis=2)
+
+
+def envolver_uint8(modelo):
+    """
+    Modelo Keras que recibe uint8 de cualquier tamaño y hace dentro del grafo el
+    mismo preprocesamiento que el entrenamiento: redimensionar con 'nearest'
+    eligiendo los mismos píxeles que PIL (load_img de Keras y los cargadores
+    de datos.py) para imágenes de hasta LADO_MAXIMO_EXACTO de lado, y
+    multiplicar por 1/255. Si el modelo ya recibe uint8 se devuelve tal cual.
+    """
+    import tensorflow as tf
+    if modelo.inputs[0].dtype == tf.uint8:
+        return modelo
+    alto, ancho = modelo.input_shape[1:3]
+    entrada = tf.keras.Input(shape=(None, None, 3), dtype=tf.uint8, name='imagen_uint8')
+    x = tf.keras.layers.Lambda(redimensionar_como_pil, arguments={'alto': alto, 'ancho': ancho},
+                               name='redimensionar_pil')(entrada)
+    x = tf.keras.layers.Rescaling(1. / 255)(x)
+    return tf.keras.Model(entrada, modelo(x), name=f"{modelo.name}_uint8")
+
+
+def _leer(formato, datos, posicion):
+    """struct.unpack_from que no se sale del archivo (ValueError si la posición no es válida)"""
+    if posicion < 0 or posicion + struct.calcsize(formato) > len(datos):
+        raise ValueError(f"desplazamiento fuera del archivo: {posicion}")
+    return struct.unpack_from(formato, datos, posicion)[0]
+
+
+def _tabla(datos, posicion):
+    """Sigue un desplazamiento de flatbuffers (uoffset) hasta lo que apunta"""
+    return posicion + _leer('<I', datos, posicion)
+
+
+def _campo(datos, tabla, numero):
+    """Posición del campo `numero` de una tabla de flatbuffers (None si no está)"""
+    vtabla = tabla - _leer('<i', datos, tabla)
+    if 4 + 2 * numero >= _leer('<H', datos, vtabla):
+        return None
+    desplazamiento = _leer('<H', datos, vtabla + 4 + 2 * numero)
+    return tabla + desplazamiento if desplazamiento else None
+
+
+def _vector(datos, posicion, tamaño=1):
+    """(inicio de los elementos, cantidad) del vector al que apunta `posicion`"""
+    inicio = _tabla(datos, posicion)
+    cantidad = _leer('<I', datos, inicio)
+    if inicio + 4 + cantidad * tamaño > len(datos):
+        raise ValueError(f"vector de {cantidad} elementos fuera del archivo")
+    return inicio + 4, cantidad
+
+
+def leer_clases_incrustadas(ruta):
+    """
+    Clases incrustadas en un .tflite por exportar_modelo.py, o None si no las
+    tiene. Se leen del archivo mapeado en memoria siguiendo el esquema de TFLite
+    (Model.metadata -> Model.buffers), así que no hace falta TensorFlow ni
+    leer los pesos. Un archivo truncado o que no es un .tflite también da None.
+    """
+    try:
+        with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+            modelo = _tabla(datos, 0)
+            campo_metadatos, campo_buffers = _campo(datos, modelo, 6), _campo(datos, modelo, 4)
+            if campo_metadatos is None or campo_buffers is None:
+                return None
+            inicio, cantidad = _vector(datos, campo_metadatos, 4)
+            for i in range(cantidad):
+                metadato = _tabla(datos, inicio + 4 * i)
+                nombre = _campo(datos, metadato, 0)
+                if nombre is None:
+                    continue
+                texto, largo = _vector(datos, nombre)
+                if datos[texto:texto + largo].decode('utf-8') != METADATO_ETIQUETAS:
+                    continue
+                indice = _campo(datos, metadato, 1)
+                indice = _leer('<I', datos, indice) if indice is not None else 0
+                buffers, num_buffers = _vector(datos, campo_buffers, 4)
+                if indice >= num_buffers:
+                    return None
+                contenido = _campo(datos, _tabla(datos, buffers + 4 * indice), 0)
+                if contenido is None:
+                    return None
+                inicio_datos, largo = _vector(datos, contenido)
+                return datos[inicio_datos:inicio_datos + largo].decode('utf-8').split('\n')
+    except (ValueError, struct.error, UnicodeDecodeError):
+        return None  # Vacío, truncado o con otro formato
+    return None
+
+
+def leer_clases(ruta_modelo, por_defecto, usar_tflite=USAR_TFLITE):
+    """
+    Clases del artefacto que usaría cargar_modelo, sin cargarlo: las incrustadas
+    en el .tflite o, con el modelo Keras (que no las guarda), `por_defecto`
+    """
+    ruta = ruta_artefacto(ruta_modelo, usar_tflite)
+    if ruta.endswith('.tflite'):
+        return leer_clases_incrustadas(ruta) or por_defecto
+    return por_defecto
+
+
+def clase_interprete():
+    """Interpreter de tflite-runtime si está instalado; si no, el de TensorFlow"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def _crear_interprete(ruta, hilos):
+    return clase_interprete()(model_path=ruta, num_threads=hilos)
+
+
+class ModeloTFLite:
+    """
+    Intérprete de TFLite con la interfaz de Keras que usan los scripts (predict).
+    Con model_path el intérprete mapea el archivo en memoria (mmap): cargarlo no
+    copia los pesos y varios procesos comparten las mismas páginas.
+    """
+
+    def __init__(self, ruta, hilos=None):
+        self.ruta = ruta
+        self.clases = leer_clases_incrustadas(ruta)  # None si se exportó sin incrustarlas
+        self.interprete = _crear_interprete(ruta, hilos or os.cpu_count())
+        self.entrada = self.interprete.get_input_details()[0]
+        self.salida = self.interprete.get_output_details()[0]
+        self.interprete.allocate_tensors()
+        self.forma = tuple(self.entrada['shape'])
+        # Los .tflite exportados con entrada float32 esperan la imagen ya normalizada
+        self.recibe_uint8 = self.entrada['dtype'] == np.uint8
+        # El intérprete no se puede usar desde dos hilos a la vez
+        self.bloqueo = threading.Lock()
+
+    @property
+    def input_shape(self):
+        forma = self.entrada.get('shape_signature', self.entrada['shape'])
+        return (None,) + tuple(int(d) if d > 0 else None for d in forma[1:])
+
+    @property
+    def output_shape(self):
+        return (None,) + tuple(int(d) for d in self.salida['shape'][1:])
+
+    def predict(self, x, verbose=0, **kwargs):
+        x = np.asarray(x)
+        if x.dtype == np.uint8 and not self.recibe_uint8:
+            x = x.astype(np.float32) * np.float32(1. / 255)
+        x = np.asarray(x, dtype=self.entrada['dtype'])
+        with self.bloqueo:
+            if x.shape != self.forma:
+                # Otro tamaño de lote o, con entrada uint8, otro tamaño de imagen
+                self.interprete.resize_tensor_input(self.entrada['index'], x.shape)
+                self.interprete.allocate_tensors()
+                self.forma = x.shape
+            self.interprete.set_tensor(self.entrada['index'], x)
+            self.interprete.invoke()
+            return self.interprete.get_tensor(self.salida['index']).copy()
+
+    predict_on_batch = predict
+
+
+def cargar_modelo(ruta_modelo, usar_tflite=USAR_TFLITE):
+    """
+    ModeloTFLite si existe el .tflite junto al modelo; si no, el modelo Keras
+    envuelto con envolver_uint8. En ambos casos recibe imágenes uint8
+    """
+    ruta = ruta_artefacto(ruta_modelo, usar_tflite)
+    if ruta.endswith('.tflite'):
+        return ModeloTFLite(ruta)
+
+    import tensorflow as tf
+    return envolver_uint8(tf.keras.models.load_model(ruta_modelo))
+
+
+def memoria_proceso_mb():
+    """Memoria residente actual del proceso en MB (None si no se puede medir)"""
+    try:
+        with open('/proc/self/statm') as f:  # Linux
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
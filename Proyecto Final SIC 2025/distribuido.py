@@ -0,0 +1,190 @@
+"""
+Entrenamiento con varios procesos en la misma máquina (data parallel en CPU).
+
+El proceso que se ejecuta desde la terminal (el lanzador) arranca N copias del
+mismo script, cada una con su TF_CONFIG apuntando a puertos de localhost, y
+espera a que terminen. Cada copia (trabajador) crea una
+MultiWorkerMirroredStrategy, lee solo su fragmento del dataset y sincroniza los
+gradientes con las demás en cada paso (all-reduce en anillo por gRPC local).
+No hace falta ningún servicio externo.
+
+El tamaño de lote es por trabajador: con N trabajadores cada paso procesa
+N veces más imágenes y la época tiene N veces menos pasos.
+
+Los núcleos se reparten entre los trabajadores (TF_NUM_INTRAOP_THREADS), para
+que N procesos no compitan por todos los núcleos a la vez. La salida de los
+trabajadores que no son el principal va a registros/trabajador_<i>.log.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+
+CARPETA_REGISTROS = './registros'
+VARIABLE_RESULTADO = 'ENTRENAMIENTO_RESULTADO'  # Archivo JSON donde el principal deja su resultado
+HILOS_INTEROP = 2
+
+_estrategia = None
+
+
+def info_trabajador():
+    """(índice, número de trabajadores) según TF_CONFIG; (0, 1) si no es un trabajador"""
+    config = json.loads(os.environ.get('TF_CONFIG', '{}'))
+    if 'cluster' not in config:
+        return 0, 1
+    return config['task']['index'], len(config['cluster']['worker'])
+
+
+def es_trabajador():
+    return 'cluster' in json.loads(os.environ.get('TF_CONFIG', '{}'))
+
+
+def es_principal():
+    """El trabajador 0 (o el proceso normal) es el que guarda el modelo y los resultados"""
+    return info_trabajador()[0] == 0
+
+
+def estrategia():
+    """
+    MultiWorkerMirroredStrategy del trabajador (se crea una sola vez). Hay que
+    llamarla al principio del programa, antes de crear cualquier tensor.
+    """
+    global _estrategia
+    if _estrategia is None:
+        import tensorflow as tf
+        opciones = tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING)
+        _estrategia = tf.distribute.MultiWorkerMirroredStrategy(communication_options=opciones)
+    return _estrategia
+
+
+def barrera():
+    """Espera a que todos los trabajadores lleguen a este punto (no hace nada fuera de ellos)"""
+    if es_trabajador():
+        import tensorflow as tf
+        uno = estrategia().run(lambda: tf.constant(1.0))
+        estrategia().reduce(tf.distribute.ReduceOp.SUM, uno, axis=None)
+
+
+def puertos_libres(cantidad):
+    """Puertos TCP libres de localhost (se reservan todos a la vez para que no se repitan)"""
+    sockets = []
+    try:
+        for _ in range(cantidad):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.bind(('localhost', 0))
+            sockets.append(s)
+        return [s.getsockname()[1] for s in sockets]
+    finally:
+        for s in sockets:
+            s.close()
+
+
+def lanzar(num_trabajadores, argumentos, carpeta_registros=CARPETA_REGISTROS):
+    """
+    Ejecuta `num_trabajadores` copias de este script con `argumentos` y espera.
+    Si un trabajador falla se detienen los demás (se quedarían esperando sus
+    gradientes).
+
+    Returns:
+        tuple: (segundos totales, resultado que dejó el principal o None)
+    """
+    os.makedirs(carpeta_registros, exist_ok=True)
+    puertos = puertos_libres(num_trabajadores)
+    cluster = {'worker': [f'localhost:{p}' for p in puertos]}
+    hilos = max(1, (os.cpu_count() or 1) // num_trabajadores)
+    ruta_resultado = os.path.join(carpeta_registros, f'resultado_{os.getpid()}.json')
+    if os.path.exists(ruta_resultado):
+        os.remove(ruta_resultado)
+
+    print(f"Lanzando {num_trabajadores} trabajadores en localhost ({hilos} hilos cada uno)...")
+    procesos, registros = [], []
+    inicio = time.perf_counter()
+    for indice in range(num_trabajadores):
+        entorno = dict(os.environ,
+                       TF_CONFIG=json.dumps({'cluster': cluster, 'task': {'type': 'worker', 'index': indice}}),
+                       TF_NUM_INTRAOP_THREADS=str(hilos),
+                       TF_NUM_INTEROP_THREADS=str(HILOS_INTEROP),
+                       OMP_NUM_THREADS=str(hilos))
+        entorno[VARIABLE_RESULTADO] = ruta_resultado
+        salida = None  # El principal escribe en la terminal
+        if indice > 0:
+            salida = open(os.path.join(carpeta_registros, f'trabajador_{indice}.log'), 'w', encoding='utf-8')
+            registros.append(salida)
+        procesos.append(subprocess.Popen([sys.executable, sys.argv[0]] + argumentos, env=entorno,
+                                         stdout=salida, stderr=subprocess.STDOUT if salida else None))
+
+    try:
+        while any(p.poll() is None for p in procesos):
+            if any(p.returncode for p in procesos if p.returncode is not None):
+                break
+            time.sleep(0.2)
+    finally:
+        for p in procesos:
+            if p.poll() is None:
+                p.terminate()
+        for p in procesos:
+            p.wait()
+        for salida in registros:
+            salida.close()
+
+    fallidos = [i for i, p in enumerate(procesos) if p.returncode]
+    if fallidos:
+        raise RuntimeError(f"Fallaron los trabajadores {fallidos} (ver {carpeta_registros}/trabajador_<i>.log)")
+
+    resultado = None
+    if os.path.exists(ruta_resultado):
+        with open(ruta_resultado, 'r', encoding='utf-8') as f:
+            resultado = json.load(f)
+        os.remove(ruta_resultado)
+    return time.perf_counter() - inicio, resultado
+
+
+def guardar_resultado(resultado):
+    """Lo llama el trabajador principal para pasarle datos al lanzador"""
+    ruta = os.environ.get(VARIABLE_RESULTADO)
+    if ruta and es_principal():
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False)
+
+
+def registrar_escalado(resultado, configuracion, ruta):
+    """
+    Guarda el resultado (por número de trabajadores) junto a los de otras
+    corridas con la misma configuración, y devuelve todos los de esa configuración
+    """
+    registro = {}
+    if os.path.exists(ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            registro = json.load(f)
+    corridas = registro.setdefault(configuracion, {})
+    corridas[str(resultado['trabajadores'])] = {k: v for k, v in resultado.items() if k != 'historial'}
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, ensure_ascii=False, indent=2)
+    return list(corridas.values())
+
+
+def mostrar_escalado(resultados):
+    """
+    Tabla de tiempo por época, imágenes/s, aceleración y eficiencia de escalado
+    (rendimiento con N trabajadores / (N x rendimiento con 1)). La referencia es
+    la corrida con menos trabajadores.
+    """
+    resultados = sorted(resultados, key=lambda r: r['trabajadores'])
+    base = resultados[0]
+    por_trabajador_base = base['imagenes_por_s'] / base['trabajadores']
+    print("\n" + "=" * 80)
+    print(f"{'Trabajadores':>12}{'s/época':>12}{'img/s':>12}{'Aceleración':>14}{'Eficiencia':>13}{'Val. accuracy':>16}")
+    print("=" * 80)
+    for r in resultados:
+        aceleracion = r['imagenes_por_s'] / base['imagenes_por_s']
+        eficiencia = r['imagenes_por_s'] / (r['trabajadores'] * por_trabajador_base)
+        print(f"{r['trabajadores']:>12}{r['s_epoca']:>12.2f}{r['imagenes_por_s']:>12.1f}"
+              f"{aceleracion:>13.2f}x{eficiencia * 100:>12.0f}%{r['val_accuracy']:>16.4f}")
+    print("=" * 80)
+    print("Sin contar la primera época (compilación y cachés). "
+          f"Relativo a {base['trabajadores']} trabajador(es).")
@@ -1,9 +1,21 @@
 import tensorflow as tf
 from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
+from tensorflow.keras.layers import (Conv2D, SeparableConv2D, MaxPooling2D, Flatten, GlobalAveragePooling2D,
+                                     Dense, Dropout)
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import matplotlib.pyplot as plt
+import numpy as np
+import argparse
+import json
+import math
 import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+import datos
+import distribuido
+import puntos_control
 
 # --- CONFIGURACIÓN ---
 RUTA_DATASET = './dataset'
@@ -12,9 +24,131 @@ IMAGEN_ALTO = 150
 BATCH_SIZE = 32
 EPOCHS = 15  # Vueltas de entrenamiento
 CLASES = ['inmaduro', 'maduro', 'podrido', 'sobremaduro']
+CARGADOR = 'generador'  # 'generador' (ImageDataGenerator), 'tfdata' (pipeline paralelo) o 'memmap' (caché uint8)
+PRECISION_MIXTA = False  # Cálculos en 16 bits (pesos y softmax en float32)
+COMPILAR_XLA = False     # Compilar el paso de entrenamiento con XLA
+SEMILLA = 42             # Misma inicialización en todas las corridas de --comparar-modo-rapido
+TRABAJADORES = 0         # Procesos de entrenamiento en esta máquina (0 = un solo proceso, sin estrategia)
+RUTA_ESCALADO = './modelo/escalado.json'  # Rendimiento por número de trabajadores
+CARPETA_PUNTOS = './modelo/puntos_control'  # Respaldo por época, historial y mejores pesos
+RUTA_RESUMEN = './modelo/resumen_entrenamiento.json'  # Épocas y tiempo de la última corrida
+PACIENCIA = 0            # Épocas sin mejorar val_loss antes de parar (0 = todas las épocas, sin parada temprana)
+# 'original' (Flatten + Dense(512), ~19M parámetros), 'ligera' (mismas convoluciones con
+# GlobalAveragePooling) o 'separable' (además convoluciones separables)
+ARQUITECTURA = 'original'
+ARQUITECTURAS = ['original', 'ligera', 'separable']
+RUTA_ARQUITECTURAS = './modelo/arquitecturas.json'  # Última comparación de --comparar-arquitecturas
+REPETICIONES_LATENCIA = 30  # Predicciones de una imagen para medir la latencia en CPU
 
-def entrenar():
-    # 1. PREPARACIÓN DE DATOS
+class TiempoPorEpoca(tf.keras.callbacks.Callback):
+    """Registra la duración de cada época (y la añade a los logs como 'segundos')"""
+    def on_train_begin(self, logs=None):
+        self.tiempos = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.inicio = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.tiempos.append(time.perf_counter() - self.inicio)
+        if logs is not None:
+            logs['segundos'] = self.tiempos[-1]
+
+def media_sin_primera(tiempos):
+    """Media de las épocas sin la primera (incluye la compilación); con una sola época, esa"""
+    resto = tiempos[1:] or tiempos
+    return sum(resto) / len(resto)
+
+def activar_precision_mixta():
+    """
+    Precisión mixta: los cálculos en 16 bits y los pesos en float32. En GPU se
+    usa float16 y en CPU bfloat16 (float16 en CPU es más lento que float32).
+    """
+    politica = 'mixed_float16' if tf.config.list_physical_devices('GPU') else 'mixed_bfloat16'
+    tf.keras.mixed_precision.set_global_policy(politica)
+    return politica
+
+def crear_modelo(arquitectura=None):
+    """
+    CNN de 3 bloques convolucionales (usa la política de precisión activa).
+    Todas las arquitecturas reciben lo mismo y dan las mismas 4 salidas, así que
+    predecir.py y la app cargan cualquiera sin cambios.
+    """
+    arquitectura = arquitectura or ARQUITECTURA
+    if arquitectura == 'original':
+        return Sequential([
+            # Capa 1
+            Conv2D(32, (3, 3), activation='relu', input_shape=(IMAGEN_ANCHO, IMAGEN_ALTO, 3)),
+            MaxPooling2D(2, 2),
+
+            # Capa 2
+            Conv2D(64, (3, 3), activation='relu'),
+            MaxPooling2D(2, 2),
+
+            # Capa 3
+            Conv2D(128, (3, 3), activation='relu'),
+            MaxPooling2D(2, 2),
+
+            # Aplanado y Capas Densas
+            Flatten(),
+            Dense(512, activation='relu'),
+            Dropout(0.5), # Apagar neuronas para evitar sobreajuste
+            # 4 Neuronas de salida (una por cada estado). El softmax siempre en float32
+            # para que las probabilidades no pierdan precisión con la precisión mixta
+            Dense(4, activation='softmax', dtype='float32')
+        ])
+
+    # Flatten de 17x17x128 a Dense(512) son ~19M de los pesos; el promedio global
+    # deja 128 valores por imagen. 'separable' cambia además las convoluciones 2 y 3
+    # por separables (un filtro 3x3 por canal y luego una mezcla 1x1)
+    Convolucion = SeparableConv2D if arquitectura == 'separable' else Conv2D
+    return Sequential([
+        Conv2D(32, (3, 3), activation='relu', input_shape=(IMAGEN_ANCHO, IMAGEN_ALTO, 3)),
+        MaxPooling2D(2, 2),
+        Convolucion(64, (3, 3), activation='relu'),
+        MaxPooling2D(2, 2),
+        Convolucion(128, (3, 3), activation='relu'),
+        MaxPooling2D(2, 2),
+        GlobalAveragePooling2D(),
+        Dense(128, activation='relu'),
+        Dropout(0.5),
+        Dense(4, activation='softmax', dtype='float32')
+    ], name=f'banana_{arquitectura}')
+
+def describir_modelo(model):
+    """
+    Parámetros, tamaño del .h5 y latencia en CPU de una imagen (entrada uint8,
+    como en predecir.py)
+
+    Returns:
+        dict
+    """
+    import cargador_modelo
+    ruta = os.path.join(tempfile.mkdtemp(), 'modelo.h5')
+    try:
+        model.save(ruta)
+        tamaño_mb = os.path.getsize(ruta) / 1e6
+        inicio = time.perf_counter()
+        cargado = cargador_modelo.envolver_uint8(tf.keras.models.load_model(ruta))
+        carga = time.perf_counter() - inicio
+    finally:
+        shutil.rmtree(os.path.dirname(ruta), ignore_errors=True)
+    imagen = np.random.default_rng(0).integers(0, 256, (1, IMAGEN_ANCHO, IMAGEN_ALTO, 3), dtype=np.uint8)
+    with tf.device('/CPU:0'):
+        cargado.predict_on_batch(imagen)  # Calentamiento
+        latencias = []
+        for _ in range(REPETICIONES_LATENCIA):
+            inicio = time.perf_counter()
+            cargado.predict_on_batch(imagen)
+            latencias.append(time.perf_counter() - inicio)
+    return {
+        'parametros': model.count_params(),
+        'tamaño_mb': tamaño_mb,
+        'carga_s': carga,
+        'latencia_ms': float(np.median(latencias) * 1000),
+    }
+
+def crear_generadores():
+    """Generadores de entrenamiento y validación con ImageDataGenerator"""
     # Usamos rescale=1./255 para normalizar colores.
     # Validation_split=0.2 separa el 20% de las imágenes para examen final.
     datagen = ImageDataGenerator(
@@ -45,54 +179,334 @@ def entrenar():
         class_mode='categorical',
         subset='validation'
     )
+    return train_generator, validation_generator
 
-    # 2. CREACIÓN DE LA RED NEURONAL (CNN)
-    model = Sequential([
-        # Capa 1
-        Conv2D(32, (3, 3), activation='relu', input_shape=(IMAGEN_ANCHO, IMAGEN_ALTO, 3)),
-        MaxPooling2D(2, 2),
-        
-        # Capa 2
-        Conv2D(64, (3, 3), activation='relu'),
-        MaxPooling2D(2, 2),
-        
-        # Capa 3
-        Conv2D(128, (3, 3), activation='relu'),
-        MaxPooling2D(2, 2),
-        
-        # Aplanado y Capas Densas
-        Flatten(),
-        Dense(512, activation='relu'),
-        Dropout(0.5), # Apagar neuronas para evitar sobreajuste
-        Dense(4, activation='softmax') # 4 Neuronas de salida (una por cada estado)
-    ])
-
-    # 3. COMPILAR EL MODELO
-    model.compile(loss='categorical_crossentropy',
-                  optimizer='adam',
-                  metrics=['accuracy'])
+def crear_datasets_tfdata(fragmento=None):
+    """Datasets tf.data de entrenamiento y validación (decodificación paralela + caché)"""
+    print("Cargando imágenes de entrenamiento (tf.data)...")
+    train_dataset = datos.crear_dataset_tfdata(
+        RUTA_DATASET, (IMAGEN_ANCHO, IMAGEN_ALTO), BATCH_SIZE,
+        subset='training', aumentar=True, fragmento=fragmento
+    )
+    print("Cargando imágenes de validación (tf.data)...")
+    validation_dataset = datos.crear_dataset_tfdata(
+        RUTA_DATASET, (IMAGEN_ANCHO, IMAGEN_ALTO), BATCH_SIZE,
+        subset='validation', fragmento=fragmento
+    )
+    return train_dataset, validation_dataset
+
+def crear_datasets_memmap(fragmento=None):
+    """Datasets que leen de la caché uint8 decodificada una sola vez (ver datos.py)"""
+    print("Abriendo caché uint8 del dataset...")
+    imagenes, etiquetas, clases = datos.cargar_cache(RUTA_DATASET, (IMAGEN_ANCHO, IMAGEN_ALTO))
+    indices_train = datos.indices_subset(etiquetas, 0.2, 'training')
+    indices_val = datos.indices_subset(etiquetas, 0.2, 'validation')
+    if fragmento is not None:
+        indice, total = fragmento
+        indices_train, indices_val = indices_train[indice::total], indices_val[indice::total]
+    print(f"Entrenamiento: {len(indices_train)} imágenes, validación: {len(indices_val)} imágenes")
+    train_dataset = datos.crear_dataset_memmap(
+        imagenes, etiquetas, indices_train, len(clases), BATCH_SIZE, mezclar=True, aumentar=True
+    )
+    validation_dataset = datos.crear_dataset_memmap(
+        imagenes, etiquetas, indices_val, len(clases), BATCH_SIZE
+    )
+    return train_dataset, validation_dataset
+
+def crear_datasets_fragmentados(cargador):
+    """
+    Datasets de un trabajador (ver distribuido.py): solo su fragmento, repetidos
+    sin fin y con un número fijo de pasos, porque todos los trabajadores tienen
+    que dar los mismos pasos por época para sincronizar los gradientes.
+
+    Returns:
+        tuple: (entrenamiento, validación, pasos por época, pasos de validación)
+    """
+    indice, num_trabajadores = distribuido.info_trabajador()
+    if cargador == 'tfdata':
+        train_dataset, validation_dataset = crear_datasets_tfdata((indice, num_trabajadores))
+    else:
+        train_dataset, validation_dataset = crear_datasets_memmap((indice, num_trabajadores))
+
+    # Pasos para recorrer el dataset completo una vez entre todos los trabajadores
+    num_train = len(datos.listar_imagenes(RUTA_DATASET, 0.2, 'training')[0])
+    num_val = len(datos.listar_imagenes(RUTA_DATASET, 0.2, 'validation')[0])
+    pasos = math.ceil(num_train / (BATCH_SIZE * num_trabajadores))
+    pasos_validacion = math.ceil(num_val / (BATCH_SIZE * num_trabajadores))
+
+    # Cada trabajador tiene una sola réplica, así que el lote de su dataset es el de la réplica
+    creador = tf.keras.utils.experimental.DatasetCreator
+    return (creador(lambda contexto: train_dataset.repeat()),
+            creador(lambda contexto: validation_dataset.repeat()),
+            pasos, pasos_validacion)
+
+def comparar_cargadores():
+    """Mide una época de entrada (sin modelo) con cada cargador e imprime la aceleración"""
+    train_generator, _ = crear_generadores()
+    num_lotes = len(train_generator)
+    train_dataset, _ = crear_datasets_tfdata()
+
+    print("\nMidiendo ImageDataGenerator...")
+    t_generador, imagenes = datos.medir_epoca(train_generator, num_lotes)
+    print("Midiendo tf.data (primera época: decodifica y llena la caché)...")
+    t_fria, _ = datos.medir_epoca(train_dataset, num_lotes)
+    print("Midiendo tf.data (épocas siguientes: desde la caché)...")
+    t_caliente, _ = datos.medir_epoca(train_dataset, num_lotes)
+
+    print("\n" + "="*50)
+    print(f"ImageDataGenerator: {t_generador:7.2f} s/época ({imagenes / t_generador:7.1f} img/s)")
+    print(f"tf.data (1ª época): {t_fria:7.2f} s/época ({imagenes / t_fria:7.1f} img/s)")
+    print(f"tf.data (caché):    {t_caliente:7.2f} s/época ({imagenes / t_caliente:7.1f} img/s)")
+    tiempo_generador = t_generador * EPOCHS
+    tiempo_tfdata = t_fria + t_caliente * (EPOCHS - 1)
+    print(f"Aceleración estimada en {EPOCHS} épocas: {tiempo_generador / tiempo_tfdata:.1f}x")
+    print("="*50)
+
+def nombre_modo(precision_mixta, xla):
+    partes = (['mixta'] if precision_mixta else []) + (['XLA'] if xla else [])
+    return ' + '.join(partes) or 'float32'
+
+def entrenar_modelo(cargador=CARGADOR, precision_mixta=PRECISION_MIXTA, xla=COMPILAR_XLA, epocas=EPOCHS,
+                    carpeta_puntos=None, paciencia=0):
+    """
+    Prepara los datos, crea y entrena la CNN. Con carpeta_puntos se respalda
+    cada época (y se continúa desde el respaldo si lo hay), se guardan los
+    mejores pesos, que son los que se devuelven, y con paciencia > 0 se para
+    cuando val_loss deja de mejorar (ver puntos_control.py).
+
+    Returns:
+        tuple: (modelo, history, segundos de cada época de esta ejecución)
+    """
+    tf.keras.backend.clear_session()
+    tf.keras.mixed_precision.set_global_policy('float32')
+    if precision_mixta:
+        print(f"Precisión mixta: {activar_precision_mixta()}")
+    if xla:
+        print("Paso de entrenamiento compilado con XLA")
+
+    # Con varios trabajadores, los pesos se crean dentro de la estrategia y
+    # los gradientes se sincronizan; sin ellos, la estrategia por defecto no hace nada
+    en_trabajador = distribuido.es_trabajador()
+    estrategia = distribuido.estrategia() if en_trabajador else tf.distribute.get_strategy()
+    pasos, pasos_validacion = None, None
+
+    # 1. PREPARACIÓN DE DATOS
+    if en_trabajador:
+        train_data, validation_data, pasos, pasos_validacion = crear_datasets_fragmentados(cargador)
+    elif cargador == 'tfdata':
+        train_data, validation_data = crear_datasets_tfdata()
+    elif cargador == 'memmap':
+        train_data, validation_data = crear_datasets_memmap()
+    else:
+        train_data, validation_data = crear_generadores()
+
+    with estrategia.scope():
+        # 2. CREACIÓN DE LA RED NEURONAL (CNN)
+        model = crear_modelo()
+
+        # 3. COMPILAR EL MODELO
+        # Con mixed_float16, compile() envuelve el optimizador para escalar la pérdida
+        model.compile(loss='categorical_crossentropy',
+                      optimizer='adam',
+                      metrics=['accuracy'],
+                      jit_compile=xla)
 
     # 4. ENTRENAR
     print("Iniciando entrenamiento... esto puede tardar unos minutos.")
+    tiempo_epoca = TiempoPorEpoca()
+    callbacks = [tiempo_epoca]
+    if carpeta_puntos:
+        callbacks += puntos_control.crear_callbacks(carpeta_puntos, paciencia)
     history = model.fit(
-        train_generator,
-        epochs=EPOCHS,
-        validation_data=validation_generator
+        train_data,
+        epochs=epocas,
+        steps_per_epoch=pasos,
+        validation_data=validation_data,
+        validation_steps=pasos_validacion,
+        callbacks=callbacks
     )
+    tiempos = tiempo_epoca.tiempos
+    if carpeta_puntos:
+        puntos_control.cargar_mejor(model, carpeta_puntos)
+    if not tiempos:
+        # El respaldo ya tenía todas las épocas: se usan los tiempos registrados
+        tiempos = puntos_control.leer_historial(carpeta_puntos).get('segundos', [0.0])
+    print(f"Tiempo total de entrenamiento ({cargador}, {nombre_modo(precision_mixta, xla)}): {sum(tiempos):.1f} s "
+          f"(primera época {tiempos[0]:.1f} s, media del resto "
+          f"{media_sin_primera(tiempos):.1f} s)")
+
+    if en_trabajador:
+        num_trabajadores = distribuido.info_trabajador()[1]
+        segundos = media_sin_primera(tiempos)
+        distribuido.guardar_resultado({
+            'trabajadores': num_trabajadores,
+            's_epoca': segundos,
+            'imagenes_por_s': pasos * BATCH_SIZE * num_trabajadores / segundos,
+            'val_accuracy': history.history['val_accuracy'][-1],
+            'historial': (puntos_control.leer_historial(carpeta_puntos) if carpeta_puntos
+                          else history.history),
+        })
+
+    if precision_mixta or en_trabajador:
+        # El modelo guardado es float32 y sin estrategia como siempre: predecir.py, la
+        # app y la exportación a TFLite no notan la diferencia (los pesos ya eran float32)
+        tf.keras.mixed_precision.set_global_policy('float32')
+        modelo_float32 = crear_modelo()
+        modelo_float32.set_weights(model.get_weights())
+        model = modelo_float32
+    return model, history, tiempos
+
+def comparar_modo_rapido(cargador=CARGADOR, epocas=EPOCHS):
+    """
+    Entrena (sin guardar) en float32, con precisión mixta, con XLA y con ambas,
+    y compara el tiempo por época y la precisión de validación final
+    """
+    resultados = []
+    for precision_mixta, xla in [(False, False), (True, False), (False, True), (True, True)]:
+        tf.keras.utils.set_random_seed(SEMILLA)
+        _, history, tiempos = entrenar_modelo(cargador, precision_mixta, xla, epocas)
+        resultados.append({
+            'modo': nombre_modo(precision_mixta, xla),
+            # La primera época incluye la compilación (XLA) y el llenado de cachés
+            'primera': tiempos[0],
+            'resto': media_sin_primera(tiempos),
+            'val_accuracy': history.history['val_accuracy'][-1],
+        })
+
+    base = resultados[0]
+    print("\n" + "="*78)
+    print(f"{'Modo':16}{'1ª época':>12}{'Resto':>14}{'Aceleración':>13}{'Val. accuracy':>15}{'Cambio':>8}")
+    print("="*78)
+    for r in resultados:
+        print(f"{r['modo']:16}{r['primera']:>10.2f} s{r['resto']:>8.2f} s/ép{base['resto'] / r['resto']:>12.2f}x"
+              f"{r['val_accuracy']:>15.4f}{r['val_accuracy'] - base['val_accuracy']:>+8.4f}")
+    print("="*78)
+    print(f"{epocas} épocas con el cargador '{cargador}'; aceleración y cambio relativos a float32.")
+
+def comparar_arquitecturas(cargador=CARGADOR, epocas=EPOCHS):
+    """
+    Entrena (sin guardar) cada arquitectura con la misma semilla y compara
+    parámetros, tamaño del archivo, latencia en CPU y precisión de validación
+    """
+    global ARQUITECTURA
+    resultados = []
+    for arquitectura in ARQUITECTURAS:
+        ARQUITECTURA = arquitectura
+        tf.keras.utils.set_random_seed(SEMILLA)
+        model, history, tiempos = entrenar_modelo(cargador, epocas=epocas)
+        resultados.append({
+            'arquitectura': arquitectura,
+            **describir_modelo(model),
+            's_epoca': media_sin_primera(tiempos),
+            'val_accuracy': max(history.history['val_accuracy']),
+        })
+
+    base = resultados[0]
+    print("\n" + "="*100)
+    print(f"{'Arquitectura':14}{'Parámetros':>13}{'Reducción':>11}{'Archivo':>11}{'Carga':>9}{'Latencia CPU':>14}"
+          f"{'s/época':>9}{'Val. accuracy':>15}{'Cambio':>9}")
+    print("="*100)
+    for r in resultados:
+        print(f"{r['arquitectura']:14}{r['parametros']:>13,}{base['parametros'] / r['parametros']:>10.0f}x"
+              f"{r['tamaño_mb']:>8.1f} MB{r['carga_s']:>7.2f} s{r['latencia_ms']:>11.2f} ms{r['s_epoca']:>9.2f}"
+              f"{r['val_accuracy']:>15.4f}{r['val_accuracy'] - base['val_accuracy']:>+9.4f}")
+    print("="*100)
+    print(f"{epocas} épocas con el cargador '{cargador}'. Latencia de una imagen uint8 (mediana de "
+          f"{REPETICIONES_LATENCIA}); mejor val_accuracy de cada una. Relativo a '{base['arquitectura']}'.")
+    os.makedirs(os.path.dirname(RUTA_ARQUITECTURAS), exist_ok=True)
+    with open(RUTA_ARQUITECTURAS, 'w', encoding='utf-8') as f:
+        json.dump({'cargador': cargador, 'epocas': epocas, 'resultados': resultados,
+                   'fecha': datetime.now().isoformat(timespec='seconds')}, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en: {RUTA_ARQUITECTURAS}")
+
+def argumentos_trabajador(cargador, precision_mixta, xla, epocas, guardar, paciencia=PACIENCIA):
+    """Argumentos con los que el lanzador ejecuta cada trabajador (este mismo script)"""
+    argumentos = ['--cargador', cargador, '--epocas', str(epocas), '--paciencia', str(paciencia)]
+    argumentos += ['--precision-mixta'] if precision_mixta else []
+    argumentos += ['--xla'] if xla else []
+    argumentos += ['--espejo'] if RUTA_DATASET.startswith(datos.CARPETA_ESPEJO) else []
+    argumentos += [] if guardar else ['--sin-guardar']
+    argumentos += ['--arquitectura', ARQUITECTURA]
+    return argumentos
+
+def entrenar_distribuido(num_trabajadores, cargador=CARGADOR, precision_mixta=PRECISION_MIXTA,
+                         xla=COMPILAR_XLA, epocas=EPOCHS, guardar=True, reanudar=False, paciencia=PACIENCIA):
+    """
+    Entrena con num_trabajadores procesos en esta máquina (ver distribuido.py) y
+    muestra la eficiencia de escalado frente a las corridas anteriores con la
+    misma configuración y otro número de trabajadores.
+
+    Returns:
+        dict: resultado del trabajador principal
+    """
+    if cargador == 'generador':
+        raise SystemExit("El entrenamiento con varios trabajadores necesita --cargador tfdata o memmap "
+                         "(ImageDataGenerator no se puede fragmentar entre procesos)")
+    if cargador == 'memmap':
+        # Se construye aquí para que los trabajadores no la construyan a la vez
+        datos.construir_cache(RUTA_DATASET, (IMAGEN_ANCHO, IMAGEN_ALTO))
+    if guardar:
+        # Los trabajadores nunca borran los puntos de control, solo los usan
+        puntos_control.preparar(CARPETA_PUNTOS, reanudar)
+
+    segundos, resultado = distribuido.lanzar(
+        num_trabajadores, argumentos_trabajador(cargador, precision_mixta, xla, epocas, guardar, paciencia))
+    print(f"\nEntrenamiento con {num_trabajadores} trabajador(es) terminado en {segundos:.1f} s")
+
+    configuracion = (f"{cargador}|{nombre_modo(precision_mixta, xla)}|{epocas} épocas|lote {BATCH_SIZE}"
+                     + ('' if ARQUITECTURA == 'original' else f"|{ARQUITECTURA}"))
+    distribuido.mostrar_escalado(distribuido.registrar_escalado(resultado, configuracion, RUTA_ESCALADO))
+    return resultado
+
+def comparar_trabajadores(lista_trabajadores, cargador=CARGADOR, precision_mixta=PRECISION_MIXTA,
+                          xla=COMPILAR_XLA, epocas=EPOCHS):
+    """Entrena (sin guardar el modelo) con cada número de trabajadores y compara el rendimiento"""
+    resultados = [entrenar_distribuido(n, cargador, precision_mixta, xla, epocas, guardar=False)
+                  for n in lista_trabajadores]
+    print("\nEsta comparación:")
+    distribuido.mostrar_escalado(resultados)
+
+def entrenar(cargador=CARGADOR, precision_mixta=PRECISION_MIXTA, xla=COMPILAR_XLA, epocas=EPOCHS,
+             guardar=True, reanudar=False, paciencia=PACIENCIA):
+    carpeta_puntos = CARPETA_PUNTOS if guardar else None
+    if guardar and not distribuido.es_trabajador():
+        puntos_control.preparar(CARPETA_PUNTOS, reanudar)
+    model, history, tiempos = entrenar_modelo(cargador, precision_mixta, xla, epocas,
+                                              carpeta_puntos, paciencia if guardar else 0)
+    if not guardar or not distribuido.es_principal():
+        return
+
+    # Épocas hechas, recuperadas del respaldo y ahorradas por la parada temprana
+    resumen = puntos_control.resumen(CARPETA_PUNTOS, epocas, len(history.history.get('loss', [])))
+    puntos_control.mostrar_resumen(resumen)
+    with open(RUTA_RESUMEN, 'w', encoding='utf-8') as f:
+        json.dump({'cargador': cargador, 'modo': nombre_modo(precision_mixta, xla), 'arquitectura': ARQUITECTURA,
+                   'paciencia': paciencia,
+                   'trabajadores': distribuido.info_trabajador()[1], **resumen,
+                   'fecha': datetime.now().isoformat(timespec='seconds')}, f, ensure_ascii=False, indent=2)
 
     # 5. GUARDAR EL MODELO
     if not os.path.exists('./modelo'):
         os.makedirs('./modelo')
     model.save('modelo/modelo_banana.h5')
     print("Modelo guardado exitosamente en 'modelo/modelo_banana.h5'")
+    descripcion = describir_modelo(model)
+    print(f"Arquitectura '{ARQUITECTURA}': {descripcion['parametros']:,} parámetros, "
+          f"{descripcion['tamaño_mb']:.1f} MB, {descripcion['latencia_ms']:.2f} ms por imagen en CPU")
+
+    if distribuido.es_trabajador():
+        # Las gráficas las muestra el lanzador, que es el proceso de la terminal
+        return
+    graficar(puntos_control.leer_historial(CARPETA_PUNTOS))
 
+def graficar(historial):
     # 6. GRAFICAR RESULTADOS (Para tu reporte)
-    acc = history.history['accuracy']
-    val_acc = history.history['val_accuracy']
-    loss = history.history['loss']
-    val_loss = history.history['val_loss']
+    acc = historial['accuracy']
+    val_acc = historial['val_accuracy']
+    loss = historial['loss']
+    val_loss = historial['val_loss']
 
-    epochs_range = range(EPOCHS)
+    epochs_range = range(len(acc))
 
     plt.figure(figsize=(8, 8))
     plt.subplot(1, 2, 1)
@@ -109,4 +523,67 @@ def entrenar():
     plt.show()
 
 if __name__ == "__main__":
-    entrenar()
+    parser = argparse.ArgumentParser(description="Entrena el clasificador de madurez del plátano")
+    parser.add_argument('--cargador', choices=['generador', 'tfdata', 'memmap'], default=CARGADOR,
+                        help="Cargador de imágenes: ImageDataGenerator, pipeline tf.data paralelo "
+                             "o caché uint8 con memory mapping")
+    parser.add_argument('--comparar-cargadores', action='store_true',
+                        help="Solo mide la velocidad de ambos cargadores y muestra la aceleración")
+    parser.add_argument('--precision-mixta', action='store_true', default=PRECISION_MIXTA,
+                        help="Precisión mixta (float16 en GPU, bfloat16 en CPU; softmax en float32)")
+    parser.add_argument('--xla', action='store_true', default=COMPILAR_XLA,
+                        help="Compilar el paso de entrenamiento con XLA")
+    parser.add_argument('--rapido', action='store_true', help="Equivale a --precision-mixta --xla")
+    parser.add_argument('--comparar-modo-rapido', action='store_true',
+                        help="Entrena en float32, con precisión mixta, con XLA y con ambas (sin guardar "
+                             "el modelo) y compara tiempo por época y precisión de validación")
+    parser.add_argument('--epocas', type=int, default=EPOCHS, help="Épocas de entrenamiento")
+    parser.add_argument('--arquitectura', choices=ARQUITECTURAS, default=ARQUITECTURA,
+                        help="original (Flatten + Dense(512)), ligera (GlobalAveragePooling) o separable "
+                             "(además convoluciones separables)")
+    parser.add_argument('--comparar-arquitecturas', action='store_true',
+                        help="Entrena cada arquitectura (sin guardar el modelo) y compara parámetros, "
+                             "tamaño, latencia en CPU y precisión de validación")
+    parser.add_argument('--espejo', action='store_true',
+                        help=f"Leer de una copia del dataset ya redimensionada a {IMAGEN_ALTO}x{IMAGEN_ANCHO} "
+                             "(se crea o actualiza al empezar, ver datos.construir_espejo)")
+    parser.add_argument('--trabajadores', type=int, default=TRABAJADORES,
+                        help="Entrenar con N procesos en esta máquina que se reparten el dataset y "
+                             "sincronizan los gradientes (necesita --cargador tfdata o memmap)")
+    parser.add_argument('--comparar-trabajadores', type=lambda s: [int(n) for n in s.split(',')],
+                        metavar='N,N,...',
+                        help="Entrena (sin guardar el modelo) con cada número de trabajadores, "
+                             "p. ej. 1,2,4,8, y muestra aceleración y eficiencia de escalado")
+    parser.add_argument('--sin-guardar', action='store_true', help="No guardar el modelo ni mostrar gráficas")
+    parser.add_argument('--reanudar', action='store_true',
+                        help=f"Continuar una corrida interrumpida desde su último respaldo ({CARPETA_PUNTOS})")
+    parser.add_argument('--paciencia', type=int, default=PACIENCIA,
+                        help="Épocas sin mejorar val_loss antes de parar (0 = hacer todas las épocas)")
+    args = parser.parse_args()
+    precision_mixta, xla = args.precision_mixta or args.rapido, args.xla or args.rapido
+    ARQUITECTURA = args.arquitectura
+
+    if distribuido.es_trabajador():
+        # Proceso lanzado por --trabajadores: la estrategia se crea antes que cualquier tensor
+        distribuido.estrategia()
+
+    if args.espejo:
+        # Misma estructura que el dataset, pero cada imagen ya tiene el tamaño final
+        RUTA_DATASET = datos.construir_espejo(RUTA_DATASET, (IMAGEN_ALTO, IMAGEN_ANCHO))
+
+    if args.comparar_cargadores:
+        comparar_cargadores()
+    elif args.comparar_arquitecturas:
+        comparar_arquitecturas(args.cargador, args.epocas)
+    elif args.comparar_modo_rapido:
+        comparar_modo_rapido(args.cargador, args.epocas)
+    elif args.comparar_trabajadores:
+        comparar_trabajadores(args.comparar_trabajadores, args.cargador, precision_mixta, xla, args.epocas)
+    elif args.trabajadores and not distribuido.es_trabajador():
+        resultado = entrenar_distribuido(args.trabajadores, args.cargador, precision_mixta, xla,
+                                         args.epocas, not args.sin_guardar, args.reanudar, args.paciencia)
+        if not args.sin_guardar:
+            graficar(resultado['historial'])
+    else:
+        entrenar(args.cargador, precision_mixta, xla, args.epocas, not args.sin_guardar,
+                 args.reanudar, args.paciencia)
@@ -0,0 +1,287 @@
+"""
+Exporta modelo_banana.h5 a TensorFlow Lite.
+
+Genera modelo/modelo_banana.tflite y modelo/etiquetas.txt (una clase por línea,
+en el orden de salida del modelo), comprueba que el .tflite predice lo mismo que
+el modelo Keras sobre imágenes del dataset y compara tiempo de carga, latencia y
+memoria de cada formato (.h5, SavedModel si existe, y .tflite).
+El .tflite es el artefacto para servir: un solo archivo con las clases
+incrustadas y los pesos alineados a 16 bytes para cargarlo con mmap (ver
+empaquetar).
+El .tflite recibe imágenes uint8 de cualquier tamaño: el redimensionado y la
+normalización del entrenamiento van dentro del modelo (ver
+cargador_modelo.envolver_uint8).
+Una vez exportado, predecir.py y app.py usan el .tflite automáticamente.
+
+Uso:
+    python exportar_modelo.py
+    python exportar_modelo.py --cuantizar   # pesos en 8 bits (~4 veces más pequeño)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from PIL import Image
+import cargador_modelo
+
+# --- CONFIGURACIÓN ---
+RUTA_MODELO = 'modelo/modelo_banana.h5'
+RUTA_ETIQUETAS = 'modelo/etiquetas.txt'
+RUTA_DATASET = './dataset'
+IMAGEN_ANCHO = 150
+IMAGEN_ALTO = 150
+CLASES = ['inmaduro', 'maduro', 'podrido', 'sobremaduro']
+MUESTRAS = 32          # Imágenes usadas para comparar Keras y TFLite
+MUESTRAS_ORIGINALES = 4  # De ellas, cuántas se prueban además con su tamaño original
+TOLERANCIA = 1e-3      # Diferencia máxima permitida en cada probabilidad
+TOLERANCIA_CUANTIZADO = 5e-2
+REPETICIONES = 50      # Predicciones de una imagen para medir la latencia
+ALINEACION = 16        # Bytes a los que se alinean los pesos dentro del .tflite
+FORMATOS = {           # Formatos que se comparan (los que no existan se omiten)
+    'h5': ('Keras .h5', RUTA_MODELO),
+    'savedmodel': ('SavedModel', 'modelo/modelo_banana'),
+    'tflite': ('TFLite', cargador_modelo.ruta_tflite(RUTA_MODELO)),
+}
+
+def exportar_tflite(ruta_modelo, ruta_salida, cuantizar=False):
+    """Convierte el modelo Keras a TFLite (entrada uint8 de cualquier tamaño y lote variable)"""
+    import tensorflow as tf
+
+    print(f"Convirtiendo {ruta_modelo} a TFLite...")
+    model = tf.keras.models.load_model(ruta_modelo)
+    if model.output_shape[-1] != len(CLASES):
+        raise ValueError(f"El modelo tiene {model.output_shape[-1]} salidas y CLASES {len(CLASES)} nombres")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(cargador_modelo.envolver_uint8(model))
+    if cuantizar:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    contenido = empaquetar(converter.convert(), CLASES)
+
+    with open(ruta_salida, 'wb') as f:
+        f.write(contenido)
+    with open(RUTA_ETIQUETAS, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(CLASES))
+
+    print(f"Guardado: {ruta_salida} ({len(contenido) / 1e6:.1f} MB, con {len(CLASES)} clases incrustadas)")
+    print(f"Guardado: {RUTA_ETIQUETAS}")
+    return model
+
+class _BufferAlineado:
+    """Buffer de TFLite que se escribe con sus datos alineados a ALINEACION bytes"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def Pack(self, builder):
+        from tensorflow.lite.python import schema_py_generated as esquema
+
+        datos = None
+        if self.buffer.data is not None:
+            contenido = np.ascontiguousarray(self.buffer.data, dtype=np.uint8).ravel()
+            # Relleno para que el primer byte quede alineado una vez escritos los
+            # datos; CreateNumpyVector solo alinea al tamaño del elemento (1 byte)
+            builder.Prep(ALINEACION, contenido.size)
+            datos = builder.CreateNumpyVector(contenido)
+        esquema.BufferStart(builder)
+        if datos is not None:
+            esquema.BufferAddData(builder, datos)
+        esquema.BufferAddOffset(builder, self.buffer.offset)
+        esquema.BufferAddSize(builder, self.buffer.size)
+        return esquema.BufferEnd(builder)
+
+def empaquetar(contenido, clases):
+    """
+    Reescribe el .tflite del conversor como artefacto único: añade las clases
+    como metadato (cargador_modelo.METADATO_ETIQUETAS) y alinea los datos de
+    cada tensor a ALINEACION bytes (el conversor no lo garantiza), para que el
+    intérprete los use tal cual desde el archivo mapeado en memoria
+    """
+    from tensorflow.lite.python import schema_py_generated as esquema
+    from tensorflow.lite.tools import flatbuffer_utils
+
+    modelo = flatbuffer_utils.convert_bytearray_to_object(contenido)
+    nombre = cargador_modelo.METADATO_ETIQUETAS.encode('utf-8')
+    modelo.metadata = [m for m in modelo.metadata or [] if m.name != nombre]
+
+    etiquetas = esquema.BufferT()
+    etiquetas.data = np.frombuffer('\n'.join(clases).encode('utf-8'), dtype=np.uint8)
+    modelo.buffers.append(etiquetas)
+    metadato = esquema.MetadataT()
+    metadato.name = nombre
+    metadato.buffer = len(modelo.buffers) - 1
+    modelo.metadata.append(metadato)
+
+    modelo.buffers = [_BufferAlineado(b) for b in modelo.buffers]
+    return flatbuffer_utils.convert_object_to_bytearray(modelo)
+
+def imagenes_muestra(cantidad):
+    """
+    Imágenes del dataset repartidas entre las clases (aleatorias si no hay dataset)
+
+    Returns:
+        tuple: (lote uint8 redimensionado, las primeras imágenes con su tamaño original)
+    """
+    rutas = []
+    for clase in CLASES:
+        carpeta = os.path.join(RUTA_DATASET, clase)
+        if os.path.isdir(carpeta):
+            nombres = sorted(os.listdir(carpeta))[:max(1, cantidad // len(CLASES))]
+            rutas.extend(os.path.join(carpeta, n) for n in nombres)
+
+    imagenes, originales = [], []
+    for ruta in rutas:
+        try:
+            with Image.open(ruta) as img:
+                img = img.convert('RGB')
+                if len(originales) < MUESTRAS_ORIGINALES:
+                    originales.append(np.asarray(img))
+                imagenes.append(np.asarray(img.resize((IMAGEN_ANCHO, IMAGEN_ALTO), Image.NEAREST)))
+        except OSError:
+            continue
+
+    if not imagenes:
+        print("Aviso: no se encontró el dataset, se comparan imágenes aleatorias")
+        rng = np.random.default_rng(0)
+        originales = [rng.integers(0, 256, (480 + i, 640 - i, 3), dtype=np.uint8) for i in range(MUESTRAS_ORIGINALES)]
+        imagenes = [np.asarray(Image.fromarray(o).resize((IMAGEN_ANCHO, IMAGEN_ALTO), Image.NEAREST)) for o in originales]
+        imagenes += [rng.integers(0, 256, (IMAGEN_ALTO, IMAGEN_ANCHO, 3), dtype=np.uint8)
+                     for _ in range(cantidad - len(originales))]
+    return np.stack(imagenes), originales
+
+def comparar_predicciones(model, ruta_tflite, imagenes, originales, tolerancia):
+    """
+    Compara el .tflite (uint8) con el modelo Keras normalizando fuera como en el
+    entrenamiento: diferencia máxima de probabilidades y clase ganadora. Las
+    imágenes de `originales` se pasan además sin redimensionar
+    """
+    esperado = model.predict(imagenes.astype(np.float32) / 255.0, verbose=0)
+    tflite = cargador_modelo.ModeloTFLite(ruta_tflite)
+    obtenido = tflite.predict(imagenes)
+    # Con su tamaño original (de a una, cada una tiene otro tamaño)
+    sin_redimensionar = np.concatenate([tflite.predict(o[np.newaxis]) for o in originales])
+
+    diferencia = float(np.max(np.abs(esperado - obtenido)))
+    diferencia_original = float(np.max(np.abs(esperado[:len(originales)] - sin_redimensionar)))
+    coinciden = float(np.mean(np.argmax(esperado, axis=1) == np.argmax(obtenido, axis=1)))
+    print(f"\nComparación sobre {len(imagenes)} imágenes:")
+    print(f"  Diferencia máxima de probabilidad: {diferencia:.2e} (tolerancia {tolerancia:.0e})")
+    print(f"  Con el tamaño original ({len(originales)} imágenes): {diferencia_original:.2e}")
+    print(f"  Misma clase ganadora: {coinciden * 100:.1f}%")
+    return max(diferencia, diferencia_original) <= tolerancia
+
+def medir(formato):
+    """
+    Carga el modelo en uno de los FORMATOS en este proceso y mide tiempo de
+    carga, primera predicción, latencia y memoria
+    """
+    ruta = FORMATOS[formato][1]
+    memoria_inicial = cargador_modelo.memoria_proceso_mb()
+    inicio = time.perf_counter()
+    # La librería se importa aparte: importar TensorFlow suele costar más que el modelo
+    if formato == 'tflite':
+        cargador_modelo.clase_interprete()
+    else:
+        import tensorflow
+    importacion = time.perf_counter() - inicio
+    memoria_libreria = cargador_modelo.memoria_proceso_mb()
+    if formato == 'tflite':
+        model = cargador_modelo.ModeloTFLite(ruta)
+    else:
+        model = cargador_modelo.cargar_modelo(ruta, usar_tflite=False)
+    carga = time.perf_counter() - inicio - importacion
+    clases = getattr(model, 'clases', None)
+
+    imagen = np.random.default_rng(0).integers(0, 256, (1, IMAGEN_ALTO, IMAGEN_ANCHO, 3), dtype=np.uint8)
+    model.predict_on_batch(imagen)  # Calentamiento
+    primera = time.perf_counter() - inicio
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        model.predict_on_batch(imagen)
+        tiempos.append(time.perf_counter() - inicio)
+
+    memoria_final = cargador_modelo.memoria_proceso_mb()
+    return {
+        'tamaño_mb': tamaño_mb(ruta),
+        'importacion_s': importacion,
+        'carga_s': carga,
+        'primera_s': primera,
+        'clases': 'incrustadas' if clases else 'aparte',
+        'latencia_ms': float(np.median(tiempos) * 1000),
+        'memoria_mb': memoria_final,
+        'memoria_libreria_mb': (memoria_libreria - memoria_inicial) if memoria_final else None,
+        'memoria_modelo_mb': (memoria_final - memoria_libreria) if memoria_final else None,
+    }
+
+def tamaño_mb(ruta):
+    """Tamaño en disco de un archivo o de una carpeta (SavedModel)"""
+    if os.path.isdir(ruta):
+        return sum(os.path.getsize(os.path.join(raiz, n)) for raiz, _, nombres in os.walk(ruta) for n in nombres) / 1e6
+    return os.path.getsize(ruta) / 1e6
+
+def medir_en_subproceso(formato):
+    """Cada medición en un proceso nuevo para que la memoria de uno no cuente en el otro"""
+    salida = subprocess.run([sys.executable, os.path.abspath(__file__), '--medir', formato],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+def medir_formatos():
+    """Mediciones de los FORMATOS que existen en disco, cada uno en su proceso"""
+    return {formato: medir_en_subproceso(formato)
+            for formato, (_, ruta) in FORMATOS.items() if os.path.exists(ruta)}
+
+def mostrar_comparacion(resultados):
+    def formato(valor, patron):
+        return patron.format(valor) if valor is not None else 'n/d'
+
+    filas = [
+        ('Tamaño en disco', 'tamaño_mb', '{:.1f} MB'),
+        ('Importar la librería', 'importacion_s', '{:.2f} s'),
+        ('Carga del modelo', 'carga_s', '{:.2f} s'),
+        ('Hasta 1ª predicción', 'primera_s', '{:.2f} s'),
+        ('Clases', 'clases', '{}'),
+        ('Latencia (1 imagen)', 'latencia_ms', '{:.2f} ms'),
+        ('Memoria del proceso', 'memoria_mb', '{:.0f} MB'),
+        ('Memoria de la librería', 'memoria_libreria_mb', '{:.0f} MB'),
+        ('Memoria del modelo', 'memoria_modelo_mb', '{:.0f} MB'),
+    ]
+    ancho = 24 + 16 * len(resultados)
+    print("\n" + "="*ancho)
+    print(f"{'':24}" + ''.join(f"{FORMATOS[f][0]:>16}" for f in resultados))
+    print("="*ancho)
+    for nombre, clave, patron in filas:
+        print(f"{nombre:24}" + ''.join(f"{formato(r[clave], patron):>16}" for r in resultados.values()))
+    print("="*ancho)
+    print("Cada formato se mide en un proceso nuevo. 'Memoria del modelo' es lo que crece la "
+          "memoria residente (RSS) al cargar el modelo y predecir, ya importada la librería.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta el modelo de plátanos a TensorFlow Lite")
+    parser.add_argument('--cuantizar', action='store_true', help="Cuantizar los pesos a 8 bits")
+    parser.add_argument('--tolerancia', type=float, help="Diferencia máxima de probabilidad aceptada")
+    parser.add_argument('--muestras', type=int, default=MUESTRAS, help="Imágenes para comparar Keras y TFLite")
+    parser.add_argument('--medir', choices=list(FORMATOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir)))
+        sys.exit(0)
+
+    if not os.path.exists(RUTA_MODELO):
+        print("Error: No se encuentra el archivo del modelo. ¿Ejecutaste entrenar.py primero?")
+        sys.exit(1)
+
+    ruta_salida = cargador_modelo.ruta_tflite(RUTA_MODELO)
+    model = exportar_tflite(RUTA_MODELO, ruta_salida, args.cuantizar)
+
+    tolerancia = args.tolerancia or (TOLERANCIA_CUANTIZADO if args.cuantizar else TOLERANCIA)
+    if not comparar_predicciones(model, ruta_salida, *imagenes_muestra(args.muestras), tolerancia):
+        os.remove(ruta_salida)
+        print("Error: el modelo TFLite no coincide con el modelo Keras; se eliminó el .tflite")
+        sys.exit(1)
+
+    mostrar_comparacion(medir_formatos())
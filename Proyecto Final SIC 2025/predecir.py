@@ -1,7 +1,20 @@
-import tensorflow as tf
+# TensorFlow no se importa aquí: solo hace falta para cargar el modelo Keras
+# (cargador_modelo lo importa entonces), no para validar argumentos, leer la
+# caché de predicciones ni usar el modelo TFLite con tflite-runtime.
 import numpy as np
-from tensorflow.keras.preprocessing import image
-import sys
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+import threading
+import argparse
+import json
+import csv
+import time
+import io
+import os
+from cache_predicciones import CachePredicciones, huella_modelo, CARPETA_CACHE_PREDICCIONES
+import cargador_modelo
+import metricas
 
 # --- CONFIGURACIÓN ---
 RUTA_MODELO = 'modelo/modelo_banana.h5'
@@ -9,34 +22,119 @@ IMAGEN_ANCHO = 150
 IMAGEN_ALTO = 150
 #   ORDEN ALFABÉTICO
 CLASES = ['inmaduro', 'maduro', 'podrido', 'sobremaduro']
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.bmp')
+TAMAÑO_LOTE = 64
+USAR_TFLITE = True  # Usa modelo/modelo_banana.tflite si existe (ver exportar_modelo.py)
 
-def predecir_imagen(ruta_imagen):
-    # 1. Cargar el modelo entrenado
+def cargar_modelo():
+    """Carga el modelo entrenado, o su versión TFLite si existe (None si no existe)"""
     print("Cargando modelo...")
+    return _abrir_modelo()
+
+def _abrir_modelo():
     try:
-        model = tf.keras.models.load_model(RUTA_MODELO)
+        with metricas.registro.medir('cargar_modelo'):
+            return cargador_modelo.cargar_modelo(RUTA_MODELO, USAR_TFLITE)
     except OSError:
         print("Error: No se encuentra el archivo del modelo. ¿Ejecutaste entrenar.py primero?")
+        return None
+
+def cargar_modelo_en_segundo_plano():
+    """
+    Empieza a cargar el modelo en otro hilo y devuelve un Future, para que la
+    carga se solape con esperar a que se escriba la ruta. Mientras tanto el hilo
+    principal no debe importar nada: dos imports a la vez pueden bloquearse.
+    """
+    print("Cargando modelo...")
+    futuro = Future()
+
+    def cargar():
+        try:
+            futuro.set_result(_abrir_modelo())
+        except Exception as e:
+            futuro.set_exception(e)
+
+    threading.Thread(target=cargar, daemon=True).start()
+    return futuro
+
+def calentar():
+    """
+    Carga el modelo y hace una predicción de prueba. Deja las librerías y el
+    modelo en la caché del sistema operativo, así las siguientes ejecuciones
+    (por ejemplo, dentro de un bucle de shell) arrancan antes.
+    """
+    inicio = time.perf_counter()
+    model = cargar_modelo()
+    if model is None:
         return
+    model.predict_on_batch(np.zeros((1, IMAGEN_ALTO, IMAGEN_ANCHO, 3), dtype=np.uint8))
+    print(f"Modelo listo en {time.perf_counter() - inicio:.2f} s")
 
-    # 2. Cargar y procesar la imagen
-    try:
-        img = image.load_img(ruta_imagen, target_size=(IMAGEN_ANCHO, IMAGEN_ALTO))
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0) # Crear un lote de una sola imagen
-        img_array /= 255.0 # Normalizar igual que en el entrenamiento
-    except Exception as e:
-        print(f"Error al cargar la imagen: {e}")
+def cargar_imagen(ruta_imagen):
+    """Lee una imagen (ruta o archivo abierto) como uint8 (alto, ancho, 3), igual que load_img de Keras"""
+    with Image.open(ruta_imagen) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img = img.resize((IMAGEN_ANCHO, IMAGEN_ALTO), Image.NEAREST)
+        return np.asarray(img, dtype=np.uint8)
+
+def crear_cache():
+    """Caché de predicciones en memoria y en disco, compartida entre ejecuciones"""
+    return CachePredicciones(carpeta_disco=CARPETA_CACHE_PREDICCIONES)
+
+def huella_actual():
+    """Huella del modelo y del preprocesamiento; cambia si se reentrena el modelo"""
+    return huella_modelo(cargador_modelo.ruta_artefacto(RUTA_MODELO, USAR_TFLITE), f"{IMAGEN_ANCHO}x{IMAGEN_ALTO}")
+
+def predecir_imagen(ruta_imagen, usar_cache=True, model=None):
+    if not os.path.isfile(ruta_imagen):
+        print(f"Error al cargar la imagen: no existe el archivo '{ruta_imagen}'")
         return
 
-    # 3. Realizar la predicción
-    predictions = model.predict(img_array)
-    score = tf.nn.softmax(predictions[0])
-    
+    # 1. Buscar la imagen en la caché (mismos bytes + mismo modelo = mismo resultado)
+    probabilidades = None
+    cache, clave = None, None
+    if usar_cache and os.path.exists(cargador_modelo.ruta_artefacto(RUTA_MODELO, USAR_TFLITE)):
+        with metricas.registro.medir('cache'):
+            cache = crear_cache()
+            with open(ruta_imagen, 'rb') as f:
+                clave = cache.clave(f.read(), huella_actual())
+            probabilidades = cache.obtener(clave)
+        if probabilidades is not None:
+            metricas.registro.contar('aciertos_cache')
+            print("Resultado obtenido de la caché de predicciones.")
+
+    if probabilidades is None:
+        # 2. Cargar el modelo entrenado
+        if model is None:
+            model = cargar_modelo()
+            if model is None:
+                return
+
+        # 3. Cargar y procesar la imagen
+        try:
+            with metricas.registro.medir('procesar_imagen'):
+                # Lote de una sola imagen uint8; el modelo normaliza igual que en el entrenamiento
+                img_array = np.expand_dims(cargar_imagen(ruta_imagen), axis=0)
+        except Exception as e:
+            metricas.registro.contar('errores')
+            print(f"Error al cargar la imagen: {e}")
+            return
+
+        # 4. Realizar la predicción
+        with metricas.registro.medir('predict'):
+            probabilidades = model.predict_on_batch(img_array)[0]
+        metricas.registro.contar('predicciones')
+        if cache is not None:
+            cache.guardar(clave, probabilidades)
+
+    mostrar_resultado(probabilidades)
+
+def mostrar_resultado(probabilidades):
     # Obtener el índice de la clase con mayor probabilidad
-    indice_ganador = np.argmax(predictions[0])
+    indice_ganador = np.argmax(probabilidades)
     clase_ganadora = CLASES[indice_ganador]
-    confianza = 100 * np.max(predictions[0])
+    confianza = 100 * np.max(probabilidades)
 
     print("\n" + "="*30)
     print(f"RESULTADO DEL ANÁLISIS")
@@ -45,17 +143,206 @@ def predecir_imagen(ruta_imagen):
     print(f"Confianza de la IA: {confianza:.2f}%")
     print("="*30)
 
-    # Mostrar probabilidades de todas las clases 
+    # Mostrar probabilidades de todas las clases
     print("\nDetalle de probabilidades:")
     for i, clase in enumerate(CLASES):
-        print(f"{clase}: {predictions[0][i]*100:.2f}%")
+        print(f"{clase}: {probabilidades[i]*100:.2f}%")
+
+# ===================== MODO POR LOTES =====================
+
+def iterar_rutas(directorio=None, lista=None):
+    """Genera las rutas a analizar sin cargarlas todas en memoria"""
+    if directorio:
+        for raiz, carpetas, archivos in os.walk(directorio):
+            carpetas.sort()
+            for nombre in sorted(archivos):
+                if nombre.lower().endswith(EXTENSIONES_IMAGEN):
+                    yield os.path.join(raiz, nombre)
+    if lista:
+        with open(lista, 'r', encoding='utf-8') as f:
+            for linea in f:
+                if linea.strip():
+                    yield linea.strip()
+
+def _leer_para_lote(ruta, cache, huella):
+    """
+    Lee una imagen dentro del pool de hilos.
+    Devuelve (ruta, imagen, clave, probabilidades_en_cache, error).
+    """
+    try:
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        clave = None
+        if cache is not None:
+            clave = cache.clave(contenido, huella)
+            probabilidades = cache.obtener(clave)
+            if probabilidades is not None:
+                return ruta, None, clave, probabilidades, None
+        with metricas.registro.medir('procesar_imagen'):
+            imagen = cargar_imagen(io.BytesIO(contenido))
+        return ruta, imagen, clave, None, None
+    except Exception as e:
+        return ruta, None, None, None, str(e)
+
+def _en_bloques(iterable, tamaño):
+    bloque = []
+    for elemento in iterable:
+        bloque.append(elemento)
+        if len(bloque) == tamaño:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+class EscritorResultados:
+    """Escribe una fila por imagen en CSV o JSONL a medida que llegan"""
+    def __init__(self, archivo, formato):
+        self.archivo = archivo
+        self.formato = formato
+        if formato == 'csv':
+            self.csv = csv.writer(archivo)
+            self.csv.writerow(['ruta', 'clase', 'confianza'] + CLASES + ['error'])
+
+    def escribir(self, ruta, probabilidades=None, error=None):
+        if probabilidades is None:
+            if self.formato == 'csv':
+                self.csv.writerow([ruta, '', ''] + [''] * len(CLASES) + [error])
+            else:
+                self.archivo.write(json.dumps({'ruta': ruta, 'error': error}, ensure_ascii=False) + '\n')
+            return
+
+        indice = int(np.argmax(probabilidades))
+        if self.formato == 'csv':
+            self.csv.writerow([ruta, CLASES[indice], f"{probabilidades[indice]:.6f}"]
+                              + [f"{p:.6f}" for p in probabilidades] + [''])
+        else:
+            self.archivo.write(json.dumps({
+                'ruta': ruta,
+                'clase': CLASES[indice],
+                'confianza': round(float(probabilidades[indice]), 6),
+                'probabilidades': {c: round(float(p), 6) for c, p in zip(CLASES, probabilidades)},
+            }, ensure_ascii=False) + '\n')
+
+def predecir_lote(rutas, ruta_salida, tamaño_lote=TAMAÑO_LOTE, trabajadores=None, formato=None, usar_cache=True):
+    """
+    Analiza muchas imágenes cargando el modelo una sola vez.
+    Las imágenes se decodifican en un pool de hilos mientras el modelo predice
+    el lote anterior; solo hay unos pocos lotes en memoria a la vez.
+    Las imágenes ya analizadas con este mismo modelo salen de la caché.
+    """
+    model = cargar_modelo()
+    if model is None:
+        return
+    cache = crear_cache() if usar_cache else None
+    huella = huella_actual()
+
+    formato = formato or ('jsonl' if ruta_salida.lower().endswith(('.jsonl', '.json')) else 'csv')
+    trabajadores = trabajadores or os.cpu_count()
+    total, errores = 0, 0
+    inicio = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=trabajadores) as pool, \
+            open(ruta_salida, 'w', encoding='utf-8', newline='') as archivo:
+        escritor = EscritorResultados(archivo, formato)
+        pendientes = deque()
+        bloques = _en_bloques(rutas, tamaño_lote)
+
+        def encolar_siguiente():
+            bloque = next(bloques, None)
+            if bloque is not None:
+                pendientes.append([pool.submit(_leer_para_lote, r, cache, huella) for r in bloque])
+
+        # Dos lotes en vuelo: se decodifica el siguiente mientras se predice el actual
+        encolar_siguiente()
+        encolar_siguiente()
+        while pendientes:
+            leidas = [futuro.result() for futuro in pendientes.popleft()]
+            encolar_siguiente()
+
+            por_predecir = [i for i, (_, img, _, _, _) in enumerate(leidas) if img is not None]
+            predichas = {}
+            if por_predecir:
+                lote = np.stack([leidas[i][1] for i in por_predecir])
+                with metricas.registro.medir('predict_lote'):
+                    probabilidades = model.predict_on_batch(lote)
+                metricas.registro.contar('predicciones', len(por_predecir))
+                predichas = dict(zip(por_predecir, probabilidades))
+
+            # Una fila por imagen en el orden de entrada: predicha, de la caché o con error
+            for i, (ruta, _, clave, probs_cache, error) in enumerate(leidas):
+                if i in predichas:
+                    escritor.escribir(ruta, predichas[i])
+                    if cache is not None:
+                        cache.guardar(clave, predichas[i])
+                elif probs_cache is not None:
+                    escritor.escribir(ruta, probs_cache)
+                    metricas.registro.contar('aciertos_cache')
+                else:
+                    escritor.escribir(ruta, error=error)
+                    metricas.registro.contar('errores')
+                    errores += 1
+
+            total += len(leidas)
+            archivo.flush()
+            print(f"\rImágenes procesadas: {total}", end='', flush=True)
+
+    transcurrido = time.perf_counter() - inicio
+    print("\n" + "="*30)
+    print(f"Imágenes analizadas: {total - errores}")
+    print(f"Imágenes con error: {errores}")
+    if cache is not None:
+        print(f"Resultados desde la caché: {cache.estadisticas()['aciertos']}")
+    print(f"Tiempo total: {transcurrido:.1f} s")
+    print(f"Velocidad: {total / transcurrido if transcurrido > 0 else 0:.1f} imágenes/s")
+    print(f"Resultados en: {ruta_salida}")
+    print("="*30)
 
 if __name__ == "__main__":
-    
-    if len(sys.argv) > 1:
-        ruta_foto = sys.argv[1]
-        predecir_imagen(ruta_foto)
+    parser = argparse.ArgumentParser(description="Clasifica la madurez de plátanos en imágenes")
+    parser.add_argument('imagen', nargs='?', help="Ruta de una imagen a analizar")
+    parser.add_argument('--directorio', help="Analizar todas las imágenes de una carpeta (recursivo)")
+    parser.add_argument('--lista', help="Archivo de texto con una ruta de imagen por línea")
+    parser.add_argument('--salida', default='resultados.csv', help="Archivo de resultados (.csv o .jsonl)")
+    parser.add_argument('--formato', choices=['csv', 'jsonl'], help="Formato de salida (por defecto según la extensión)")
+    parser.add_argument('--lote', type=int, default=TAMAÑO_LOTE, help="Imágenes por llamada a predict")
+    parser.add_argument('--trabajadores', type=int, help="Hilos para decodificar imágenes")
+    parser.add_argument('--sin-cache', action='store_true', help="No usar la caché de predicciones")
+    parser.add_argument('--sin-tflite', action='store_true', help="Usar el modelo Keras aunque exista el .tflite")
+    parser.add_argument('--calentar', action='store_true',
+                        help="Solo cargar el modelo y hacer una predicción de prueba (p. ej. al encender el equipo)")
+    parser.add_argument('--metricas', action='store_true', default=metricas.ACTIVAS,
+                        help="Medir el tiempo de cada etapa y guardarlo en metricas/predecir.json y .prom")
+    args = parser.parse_args()
+    usar_cache = not args.sin_cache
+    USAR_TFLITE = not args.sin_tflite
+    # El .tflite exportado trae sus clases; con el modelo Keras se usan las de arriba
+    CLASES = cargador_modelo.leer_clases(RUTA_MODELO, CLASES, USAR_TFLITE)
+    metricas.configurar('predecir', activas=args.metricas)
+
+    # Validar los argumentos antes de cargar nada pesado
+    if args.directorio and not os.path.isdir(args.directorio):
+        parser.error(f"no existe la carpeta '{args.directorio}'")
+    if args.lista and not os.path.isfile(args.lista):
+        parser.error(f"no existe el archivo '{args.lista}'")
+    if args.imagen and not os.path.isfile(args.imagen):
+        parser.error(f"no existe la imagen '{args.imagen}'")
+
+    if args.calentar:
+        calentar()
+    elif args.directorio or args.lista:
+        rutas = iterar_rutas(args.directorio, args.lista)
+        predecir_lote(rutas, args.salida, args.lote, args.trabajadores, args.formato, usar_cache)
+    elif args.imagen:
+        predecir_imagen(args.imagen, usar_cache)
     else:
-        
+        # El modelo se va cargando mientras se escribe la ruta
+        futuro_modelo = cargar_modelo_en_segundo_plano()
         ruta_fija = input("Introduce la ruta de la imagen a analizar (ej: prueba.jpg): ")
-        predecir_imagen(ruta_fija)
+        model = futuro_modelo.result()
+        if model is not None:
+            predecir_imagen(ruta_fija, usar_cache, model)
+
+    if metricas.registro.activas:
+        metricas.registro.mostrar()
+        metricas.registro.guardar()
+        print(f"Métricas en: {os.path.join(metricas.CARPETA_METRICAS, 'predecir.json')} y .prom")
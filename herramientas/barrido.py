@@ -0,0 +1,375 @@
+"""
+Barrido de hiperparámetros en paralelo para los dos clasificadores.
+
+Cada combinación del espacio de búsqueda (una prueba) se entrena en un proceso
+de un pool dimensionado según los núcleos y la memoria de la máquina. Todas
+las pruebas leen la misma caché uint8 del proyecto (datos.construir_cache) con
+memory mapping: las imágenes se decodifican una sola vez, antes de empezar, y
+el sistema operativo comparte esas páginas entre todos los procesos.
+
+Las pruebas débiles se detienen antes de tiempo con la regla de la mediana: al
+terminar cada época, si la mejor val_accuracy de la prueba está por debajo de
+la mediana de las demás pruebas en esa misma época, se abandona.
+
+Al final se mide la inferencia de cada modelo (uint8, como los predecir.py) y se
+muestra la clasificación: precisión contra tiempo de entrenamiento e inferencia.
+Las marcadas con * son la frontera de Pareto (ninguna otra es a la vez más
+precisa y más rápida de inferir).
+
+El espacio es un JSON {parámetro: [valores, ...]}; los parámetros que no
+aparecen quedan con el valor actual de entrenar.py / train_model.py.
+
+Uso:
+    python herramientas/barrido.py --proyecto banana
+    python herramientas/barrido.py --proyecto frutas --espacio espacio.json --procesos 2
+    python herramientas/barrido.py --proyecto banana --muestras 8 --salida barrido_banana.json
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROYECTOS = {
+    'banana': {
+        'carpeta': os.path.join(RAIZ, 'Proyecto Final SIC 2025'),
+        'modulos': os.path.join(RAIZ, 'Proyecto Final SIC 2025'),
+        'datos': 'dataset',
+        'tamaño': (150, 150),
+        'memoria_mb': 1500,  # Por prueba, aproximada
+        # Valores actuales de entrenar.py
+        'fijos': {'lote': 32, 'optimizador': 'adam', 'tasa': 0.001, 'epocas': 15, 'arquitectura': 'original'},
+        'espacio': {'lote': [16, 32, 64], 'optimizador': ['adam', 'rmsprop', 'sgd'], 'tasa': [0.001, 0.0003]},
+    },
+    'frutas': {
+        'carpeta': os.path.join(RAIZ, 'Hackathon SIC 2025'),
+        'modulos': os.path.join(RAIZ, 'Hackathon SIC 2025', 'scripts'),
+        'datos': 'data',
+        'tamaño': (224, 224),
+        'memoria_mb': 3000,
+        # Valores actuales de train_model.py (la etapa 2 siempre es SGD con momento)
+        'fijos': {'lote': 16, 'optimizador': 'rmsprop', 'tasa': 0.001, 'capa_descongelar': 125,
+                  'tasa_ajuste': 0.0001, 'epocas_etapa1': 10, 'epocas_etapa2': 10},
+        'espacio': {'lote': [16, 32], 'optimizador': ['rmsprop', 'adam'], 'capa_descongelar': [100, 125, 140]},
+    },
+}
+
+HILOS_POR_PRUEBA = 2   # Núcleos de TensorFlow para cada proceso del pool
+EPOCAS_MINIMAS = 2     # Ninguna prueba se detiene antes de esta época
+PRUEBAS_MINIMAS = 3    # Pruebas con esa época ya hecha para aplicar la regla de la mediana
+LOTE_INFERENCIA = 32
+REPETICIONES = 10
+SEMILLA = 42
+
+
+# ===================== ESPACIO DE BÚSQUEDA =====================
+
+def generar_pruebas(espacio, fijos, muestras=None, semilla=SEMILLA):
+    """Todas las combinaciones del espacio (o `muestras` al azar), completadas con los valores fijos"""
+    desconocidos = set(espacio) - set(fijos)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {sorted(desconocidos)} (válidos: {sorted(fijos)})")
+    nombres = list(espacio)
+    combinaciones = [dict(zip(nombres, valores)) for valores in itertools.product(*espacio.values())]
+    if muestras and muestras < len(combinaciones):
+        combinaciones = random.Random(semilla).sample(combinaciones, muestras)
+    return [dict(fijos, **combinacion) for combinacion in combinaciones]
+
+
+def procesos_por_defecto(memoria_por_prueba_mb):
+    """Tantos procesos como quepan en los núcleos (HILOS_POR_PRUEBA cada uno) y en la memoria"""
+    por_nucleos = (os.cpu_count() or 1) // HILOS_POR_PRUEBA
+    try:
+        memoria_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 2**20
+        por_memoria = int(memoria_mb // memoria_por_prueba_mb)
+    except (ValueError, OSError, AttributeError):
+        por_memoria = por_nucleos  # Sin sysconf (Windows) manda el número de núcleos
+    return max(1, min(por_nucleos, por_memoria))
+
+
+# ===================== PRUEBA (en un proceso del pool) =====================
+
+def iniciar_proceso(nombre, hilos):
+    """Inicializador del pool: antes de importar TensorFlow en el proceso"""
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(hilos)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ['OMP_NUM_THREADS'] = str(hilos)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    proyecto = PROYECTOS[nombre]
+    os.chdir(proyecto['carpeta'])
+    sys.path.insert(0, proyecto['modulos'])
+
+
+def crear_optimizador(nombre, tasa):
+    import tensorflow as tf
+    if nombre == 'sgd':
+        return tf.keras.optimizers.SGD(learning_rate=tasa, momentum=0.9)
+    return {'adam': tf.keras.optimizers.Adam, 'rmsprop': tf.keras.optimizers.RMSprop}[nombre](learning_rate=tasa)
+
+
+def crear_parada_mediana(numero, curvas):
+    """
+    Callback de la regla de la mediana. `curvas` es un diccionario compartido
+    entre procesos: {número de prueba: [val_accuracy por época]}.
+    """
+    import tensorflow as tf
+
+    class ParadaMediana(tf.keras.callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.valores = []
+            self.detenida = False
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.valores.append(logs['val_accuracy'])
+            curvas[numero] = list(self.valores)
+            epoca = len(self.valores)
+            if epoca < EPOCAS_MINIMAS:
+                return
+            otras = [max(curva[:epoca]) for clave, curva in curvas.items()
+                     if clave != numero and len(curva) >= epoca]
+            if len(otras) >= PRUEBAS_MINIMAS and max(self.valores) < statistics.median(otras):
+                self.detenida = True
+                self.model.stop_training = True
+
+    return ParadaMediana()
+
+
+def entrenar_banana(prueba, imagenes, etiquetas, clases, entrenamiento, validacion, callbacks):
+    import datos
+    import entrenar
+    modelo = entrenar.crear_modelo(prueba['arquitectura'])
+    modelo.compile(loss='categorical_crossentropy', optimizer=crear_optimizador(prueba['optimizador'], prueba['tasa']),
+                   metrics=['accuracy'])
+    datos_entrenamiento = datos.crear_dataset_memmap(imagenes, etiquetas, entrenamiento, len(clases),
+                                                     prueba['lote'], mezclar=True, aumentar=True)
+    datos_validacion = datos.crear_dataset_memmap(imagenes, etiquetas, validacion, len(clases), prueba['lote'])
+    modelo.fit(datos_entrenamiento, epochs=prueba['epocas'], validation_data=datos_validacion,
+               callbacks=callbacks, verbose=0)
+    return modelo, prueba['epocas']
+
+
+def entrenar_frutas(prueba, imagenes, etiquetas, clases, entrenamiento, validacion, callbacks, pesos):
+    """Las dos etapas de train_model.py: cabeza con la base congelada y después ajuste fino"""
+    import datos
+    import modelo_frutas
+    base, modelo = modelo_frutas.crear_modelo(pesos)
+    datos_entrenamiento = datos.crear_dataset_memmap(imagenes, etiquetas, entrenamiento, len(clases),
+                                                     prueba['lote'], mezclar=True)
+    datos_validacion = datos.crear_dataset_memmap(imagenes, etiquetas, validacion, len(clases), prueba['lote'])
+
+    for capa in base.layers:
+        capa.trainable = False
+    modelo.compile(optimizer=crear_optimizador(prueba['optimizador'], prueba['tasa']),
+                   loss='categorical_crossentropy', metrics=['accuracy'])
+    historial = modelo.fit(datos_entrenamiento, epochs=prueba['epocas_etapa1'], validation_data=datos_validacion,
+                           callbacks=callbacks, verbose=0)
+    if len(historial.epoch) < prueba['epocas_etapa1']:  # Detenida por la regla de la mediana
+        return modelo, prueba['epocas_etapa1'] + prueba['epocas_etapa2']
+
+    for capa in modelo.layers[:prueba['capa_descongelar']]:
+        capa.trainable = False
+    for capa in modelo.layers[prueba['capa_descongelar']:]:
+        capa.trainable = True
+    modelo.compile(optimizer=crear_optimizador('sgd', prueba['tasa_ajuste']),
+                   loss='categorical_crossentropy', metrics=['accuracy'])
+    # Las épocas siguen contando desde la etapa 1 para la regla de la mediana
+    modelo.fit(datos_entrenamiento, initial_epoch=prueba['epocas_etapa1'],
+               epochs=prueba['epocas_etapa1'] + prueba['epocas_etapa2'],
+               validation_data=datos_validacion, callbacks=callbacks, verbose=0)
+    return modelo, prueba['epocas_etapa1'] + prueba['epocas_etapa2']
+
+
+def medir_inferencia(modelo, imagenes, indices):
+    """Latencia con una imagen y rendimiento con lotes de LOTE_INFERENCIA (entrada uint8)"""
+    import numpy as np
+    import cargador_modelo
+    modelo = cargador_modelo.envolver_uint8(modelo)
+    lote = np.asarray(imagenes[np.sort(indices[:LOTE_INFERENCIA])])
+    medidas = {}
+    for nombre, x in (('uno', lote[:1]), ('lote', lote)):
+        modelo.predict_on_batch(x)  # Calentamiento
+        tiempos = []
+        for _ in range(REPETICIONES):
+            inicio = time.perf_counter()
+            modelo.predict_on_batch(x)
+            tiempos.append(time.perf_counter() - inicio)
+        medidas[nombre] = (statistics.median(tiempos), len(x))
+    return {
+        'ms_por_imagen': medidas['uno'][0] * 1000,
+        'imagenes_por_s': medidas['lote'][1] / medidas['lote'][0],
+    }
+
+
+def ejecutar_prueba(nombre, numero, prueba, curvas, pesos):
+    """Entrena una prueba y devuelve sus métricas (se ejecuta en un proceso del pool)"""
+    import tensorflow as tf
+    import datos
+
+    tf.keras.utils.set_random_seed(SEMILLA)
+    proyecto = PROYECTOS[nombre]
+    # La caché ya existe (la construyó el proceso principal): aquí solo se abre con mmap
+    imagenes, etiquetas, clases = datos.cargar_cache(proyecto['datos'], proyecto['tamaño'])
+    entrenamiento = datos.indices_subset(etiquetas, 0.2, 'training')
+    validacion = datos.indices_subset(etiquetas, 0.2, 'validation')
+
+    tiempos = []
+
+    class TiempoPorEpoca(tf.keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.inicio = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            tiempos.append(time.perf_counter() - self.inicio)
+
+    parada = crear_parada_mediana(numero, curvas)
+    callbacks = [TiempoPorEpoca(), parada]
+    inicio = time.perf_counter()
+    if nombre == 'banana':
+        modelo, planeadas = entrenar_banana(prueba, imagenes, etiquetas, clases, entrenamiento, validacion, callbacks)
+    else:
+        modelo, planeadas = entrenar_frutas(prueba, imagenes, etiquetas, clases, entrenamiento, validacion,
+                                            callbacks, pesos)
+    segundos = time.perf_counter() - inicio
+
+    resto = tiempos[1:] or tiempos
+    return {
+        'prueba': numero,
+        'parametros': prueba,
+        'val_accuracy': float(max(parada.valores)),
+        'curva': [float(v) for v in parada.valores],
+        'epocas_hechas': len(parada.valores),
+        'epocas_planeadas': planeadas,
+        'detenida': parada.detenida,
+        's_entrenamiento': segundos,
+        's_epoca': sum(resto) / len(resto),
+        'parametros_modelo': int(modelo.count_params()),
+        **medir_inferencia(modelo, imagenes, validacion),
+    }
+
+
+def ejecutar_prueba_pool(argumentos):
+    """ejecutar_prueba con los argumentos en una tupla, para Pool.imap_unordered"""
+    return ejecutar_prueba(*argumentos)
+
+
+# ===================== CLASIFICACIÓN =====================
+
+def marcar_pareto(resultados):
+    """Frontera de Pareto de precisión contra ms por imagen"""
+    for r in resultados:
+        r['pareto'] = not any(
+            o['val_accuracy'] >= r['val_accuracy'] and o['ms_por_imagen'] <= r['ms_por_imagen']
+            and (o['val_accuracy'] > r['val_accuracy'] or o['ms_por_imagen'] < r['ms_por_imagen'])
+            for o in resultados)
+
+
+def describir(parametros, espacio):
+    """Solo los parámetros que varían en el barrido"""
+    return ' '.join(f"{clave}={parametros[clave]}" for clave in espacio)
+
+
+def mostrar_clasificacion(resultados, espacio):
+    ancho = max([len('Parámetros')] + [len(describir(r['parametros'], espacio)) for r in resultados]) + 2
+    linea = "=" * (ancho + 74)
+    print("\n" + linea)
+    print(f"{'#':>3}  {'Parámetros':{ancho}}{'Val. acc':>9}{'Épocas':>9}{'Entreno s':>11}{'s/época':>9}"
+          f"{'ms/img':>9}{'img/s':>9}{'Parám.':>12}")
+    print(linea)
+    for posicion, r in enumerate(resultados, 1):
+        epocas = f"{r['epocas_hechas']}/{r['epocas_planeadas']}"
+        print(f"{posicion:>3}{'*' if r['pareto'] else ' '} {describir(r['parametros'], espacio):{ancho}}"
+              f"{r['val_accuracy']:>9.4f}{epocas:>9}{r['s_entrenamiento']:>11.1f}{r['s_epoca']:>9.2f}"
+              f"{r['ms_por_imagen']:>9.2f}{r['imagenes_por_s']:>9.1f}{r['parametros_modelo']:>12,}")
+    print(linea)
+    print(f"   * frontera de Pareto (precisión contra ms/img). ms/img con una imagen, img/s con lotes de "
+          f"{LOTE_INFERENCIA}; entrada uint8 como en los predecir.py.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Barrido de hiperparámetros en paralelo")
+    parser.add_argument('--proyecto', choices=sorted(PROYECTOS), required=True)
+    parser.add_argument('--espacio', help="JSON {parámetro: [valores]} (por defecto, el espacio de ejemplo del proyecto)")
+    parser.add_argument('--muestras', type=int, help="Probar solo N combinaciones al azar")
+    parser.add_argument('--procesos', type=int, help="Pruebas a la vez (por defecto, según núcleos y memoria)")
+    parser.add_argument('--sin-parada', action='store_true', help="Entrenar todas las pruebas hasta el final")
+    parser.add_argument('--pesos-aleatorios', action='store_true',
+                        help="frutas: MobileNetV2 sin pesos de ImageNet (sin conexión; solo para probar el barrido)")
+    parser.add_argument('--salida', help="JSON de resultados (por defecto barrido_<proyecto>.json)")
+    args = parser.parse_args()
+
+    proyecto = PROYECTOS[args.proyecto]
+    espacio = proyecto['espacio']
+    if args.espacio:
+        with open(args.espacio, 'r', encoding='utf-8') as f:
+            espacio = json.load(f)
+    try:
+        pruebas = generar_pruebas(espacio, proyecto['fijos'], args.muestras)
+    except ValueError as e:
+        parser.error(str(e))
+    procesos = min(args.procesos or procesos_por_defecto(proyecto['memoria_mb']), len(pruebas))
+    hilos = max(1, (os.cpu_count() or 1) // procesos)
+    salida = os.path.abspath(args.salida or f"barrido_{args.proyecto}.json")
+    pesos = None if args.pesos_aleatorios else 'imagenet'
+
+    # Lo que todas las pruebas harían a la vez se hace aquí una sola vez: decodificar
+    # el dataset a la caché uint8 y (frutas) descargar los pesos de MobileNetV2
+    iniciar_proceso(args.proyecto, hilos)
+    import datos
+    datos.construir_cache(proyecto['datos'], proyecto['tamaño'])
+    if args.proyecto == 'frutas' and pesos:
+        import modelo_frutas
+        modelo_frutas.crear_modelo(pesos)
+
+    print(f"{len(pruebas)} pruebas, {procesos} a la vez ({hilos} hilos cada una)")
+    resultados = []
+    inicio = time.perf_counter()
+    with multiprocessing.Manager() as gestor:
+        # Con un diccionario normal cada proceso recibe su copia y solo ve su propia
+        # curva, así que ninguna prueba se detiene
+        curvas = {} if args.sin_parada else gestor.dict()
+        # spawn: TensorFlow no se puede usar después de un fork; un proceso nuevo por
+        # prueba para que la memoria de un modelo no se acumule en la siguiente
+        # (multiprocessing.Pool: max_tasks_per_child de ProcessPoolExecutor es de Python 3.11)
+        contexto = multiprocessing.get_context('spawn')
+        with contexto.Pool(procesos, initializer=iniciar_proceso, initargs=(args.proyecto, hilos),
+                           maxtasksperchild=1) as pool:
+            tareas = [(args.proyecto, numero, prueba, curvas, pesos) for numero, prueba in enumerate(pruebas)]
+            for r in pool.imap_unordered(ejecutar_prueba_pool, tareas):
+                resultados.append(r)
+                estado = 'detenida' if r['detenida'] else 'completa'
+                print(f"[{len(resultados)}/{len(pruebas)}] {describir(r['parametros'], espacio)}: "
+                      f"val_accuracy {r['val_accuracy']:.4f}, {r['epocas_hechas']} épocas ({estado}), "
+                      f"{r['s_entrenamiento']:.1f} s")
+    segundos = time.perf_counter() - inicio
+
+    resultados.sort(key=lambda r: (-r['val_accuracy'], r['ms_por_imagen']))
+    marcar_pareto(resultados)
+    mostrar_clasificacion(resultados, espacio)
+
+    secuencial = sum(r['s_entrenamiento'] for r in resultados)
+    ahorradas = sum(r['epocas_planeadas'] - r['epocas_hechas'] for r in resultados)
+    print(f"\nBarrido terminado en {segundos:.1f} s ({secuencial:.1f} s de entrenamiento sumando "
+          f"todas las pruebas: {secuencial / segundos:.2f}x por el paralelismo)")
+    print(f"La regla de la mediana detuvo {sum(r['detenida'] for r in resultados)} pruebas "
+          f"y ahorró {ahorradas} épocas")
+
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump({
+            'proyecto': args.proyecto,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'espacio': espacio,
+            'procesos': procesos,
+            'hilos_por_proceso': hilos,
+            'segundos': segundos,
+            'clasificacion': resultados,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en: {salida}")
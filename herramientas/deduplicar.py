@@ -0,0 +1,341 @@
+"""
+Detección de imágenes casi duplicadas en las carpetas de entrenamiento.
+
+Calcula un hash perceptual (pHash de 64 bits: DCT de la imagen en gris a
+32x32) de cada imagen en varios procesos y busca los pares a distancia de
+Hamming <= --umbral con un índice multi-hash (multi-index hashing): el hash
+se parte en m bloques y, por el principio del palomar, dos hashes a esa
+distancia están a distancia <= umbral // m en al menos uno. Cada bloque se
+indexa con una tabla clave -> hashes y se buscan las variantes cercanas de
+cada clave; solo se comparan esos candidatos, no todos contra todos.
+
+Se buscan duplicados dentro de cada clase y entre clases (una misma foto en
+banana_madura y banana_podrida es además una etiqueta contradictoria). De
+cada grupo se conserva la imagen con más píxeles; el resto se informa en un
+CSV y, con --cuarentena, se mueve a otra carpeta conservando la estructura
+(no se borra nada).
+
+Los hashes se guardan en <carpeta>/.phash.npz y solo se recalculan para los
+archivos nuevos o modificados.
+
+Uso:
+    python herramientas/deduplicar.py "Hackathon SIC 2025/data"
+    python herramientas/deduplicar.py "Proyecto Final SIC 2025/dataset" --umbral 6 --reporte duplicados.csv
+    python herramientas/deduplicar.py "Hackathon SIC 2025/data" --cuarentena "Hackathon SIC 2025/cuarentena"
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import comb
+
+import numpy as np
+from PIL import Image
+
+UMBRAL = 4                # Bits distintos (de 64) para considerar dos imágenes casi iguales
+TAMAÑO_DCT = 32
+TAMAÑO_HASH = 8           # 8x8 coeficientes de baja frecuencia = 64 bits
+ARCHIVO_CACHE = '.phash.npz'
+EXTENSIONES = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+LOTE_TAREAS = 64          # Imágenes por tarea enviada a cada proceso
+BLOQUES_MINIMOS = 3       # Bloques de como mucho 22 bits en el índice
+
+# Matriz de la DCT-II ortonormal (evita depender de scipy)
+_k = np.arange(TAMAÑO_DCT)
+DCT = np.sqrt(2 / TAMAÑO_DCT) * np.cos(np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * TAMAÑO_DCT))
+DCT[0] /= np.sqrt(2)
+
+# Bits a 1 de cada byte, para contar bits de uint64 sin np.bitwise_count (numpy >= 2)
+BITS_POR_BYTE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+# ===================== HASH PERCEPTUAL =====================
+
+def phash(ruta):
+    """(hash uint64, ancho, alto) de la imagen, o None si no se puede leer"""
+    try:
+        with Image.open(ruta) as imagen:
+            ancho, alto = imagen.size
+            # En JPEG decodifica directamente a 1/2, 1/4 u 1/8 del tamaño: mucho más rápido
+            imagen.draft('L', (TAMAÑO_DCT * 2, TAMAÑO_DCT * 2))
+            gris = imagen.convert('L').resize((TAMAÑO_DCT, TAMAÑO_DCT), Image.BILINEAR)
+    except Exception:
+        return None
+    coeficientes = DCT @ np.asarray(gris, dtype=np.float32) @ DCT.T
+    bajos = coeficientes[:TAMAÑO_HASH, :TAMAÑO_HASH].ravel()
+    bits = bajos > np.median(bajos[1:])  # Sin la componente continua (brillo medio)
+    return int(np.packbits(bits).view('>u8')[0]), ancho, alto
+
+
+def _phash_lote(rutas):
+    return [phash(ruta) for ruta in rutas]
+
+
+def distancias(a, b):
+    """Distancia de Hamming elemento a elemento entre dos arrays uint64"""
+    x = np.atleast_1d(np.bitwise_xor(a, b))
+    d = BITS_POR_BYTE[x.view(np.uint8)].reshape(*x.shape, 8).sum(-1)
+    return d if np.ndim(a) or np.ndim(b) else d[0]
+
+
+# ===================== LISTADO Y CACHÉ =====================
+
+def listar_imagenes(carpeta, excluir=None):
+    """Rutas relativas a `carpeta` de todas las imágenes (en subcarpetas = clases)"""
+    excluir = os.path.abspath(excluir) if excluir else None
+    rutas = []
+    for raiz, subcarpetas, archivos in os.walk(carpeta):
+        subcarpetas[:] = sorted(d for d in subcarpetas
+                                if not d.startswith('.') and os.path.abspath(os.path.join(raiz, d)) != excluir)
+        for archivo in sorted(archivos):
+            if archivo.lower().endswith(EXTENSIONES):
+                rutas.append(os.path.relpath(os.path.join(raiz, archivo), carpeta))
+    return rutas
+
+
+def calcular_hashes(carpeta, rutas, procesos):
+    """
+    Hashes de todas las rutas, reutilizando los de la caché si el archivo no
+    cambió (mismo tamaño y fecha de modificación)
+    Devuelve (hashes uint64, píxeles, bytes, válidas bool, recalculadas)
+    """
+    ruta_cache = os.path.join(carpeta, ARCHIVO_CACHE)
+    previos = {}
+    if os.path.exists(ruta_cache):
+        cache = np.load(ruta_cache)
+        previos = {r: (h, p, b, m) for r, h, p, b, m in
+                   zip(cache['rutas'], cache['hashes'], cache['pixeles'], cache['bytes'], cache['modificado'])}
+
+    n = len(rutas)
+    hashes = np.zeros(n, dtype=np.uint64)
+    pixeles = np.zeros(n, dtype=np.int64)
+    tamaños = np.zeros(n, dtype=np.int64)
+    modificado = np.zeros(n, dtype=np.int64)
+    validas = np.ones(n, dtype=bool)
+    pendientes = []
+    for i, ruta in enumerate(rutas):
+        estado = os.stat(os.path.join(carpeta, ruta))
+        tamaños[i], modificado[i] = estado.st_size, estado.st_mtime_ns
+        previo = previos.get(ruta)
+        if previo is not None and previo[2] == tamaños[i] and previo[3] == modificado[i]:
+            hashes[i], pixeles[i] = previo[0], previo[1]
+            validas[i] = previo[1] > 0
+        else:
+            pendientes.append(i)
+
+    if pendientes:
+        absolutas = [os.path.join(carpeta, rutas[i]) for i in pendientes]
+        lotes = [absolutas[k:k + LOTE_TAREAS] for k in range(0, len(absolutas), LOTE_TAREAS)]
+        resultados = []
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            for j, lote in enumerate(pool.map(_phash_lote, lotes), 1):
+                resultados.extend(lote)
+                print(f"\r   Hashes: {len(resultados)}/{len(absolutas)}", end='', flush=True)
+        print()
+        for i, resultado in zip(pendientes, resultados):
+            if resultado is None:
+                validas[i], pixeles[i] = False, 0
+            else:
+                hashes[i], pixeles[i] = resultado[0], resultado[1] * resultado[2]
+
+        ruta_tmp = ruta_cache + '.tmp.npz'
+        np.savez(ruta_tmp, rutas=np.array(rutas, dtype=str), hashes=hashes, pixeles=pixeles,
+                 bytes=tamaños, modificado=modificado)
+        os.replace(ruta_tmp, ruta_cache)
+
+    return hashes, pixeles, tamaños, validas, len(pendientes)
+
+
+# ===================== ÍNDICE MULTI-HASH =====================
+
+def bloques(cantidad, bits=64):
+    """(desplazamiento, bits) de los `cantidad` bloques en que se parte el hash"""
+    limites = np.linspace(0, bits, cantidad + 1).astype(int)
+    return [(int(a), int(b - a)) for a, b in zip(limites[:-1], limites[1:])]
+
+
+def elegir_bloques(umbral, n):
+    """
+    Número de bloques con menor costo estimado. Con m bloques, dos hashes a
+    distancia <= umbral están a distancia <= umbral // m en algún bloque, así
+    que en cada bloque se prueban todas las variantes de la clave con hasta
+    umbral // m bits cambiados. Bloques cortos = muchas imágenes por clave;
+    bloques largos = muchas variantes
+    """
+    mejor = None
+    # Al menos 3 bloques (<= 22 bits) para poder indexar cada uno con una tabla de 2**bits entradas
+    for m in range(BLOQUES_MINIMOS, max(BLOQUES_MINIMOS, umbral + 1) + 1):
+        radio = umbral // m
+        costo = 0.0
+        for _, bits in bloques(m):
+            variantes = sum(comb(bits, r) for r in range(radio + 1))
+            costo += variantes * (1 + n / 2 ** bits)  # Búsquedas + candidatos por búsqueda
+        if mejor is None or costo < mejor[0]:
+            mejor = (costo, m)
+    return mejor[1]
+
+
+def buscar_pares(hashes, umbral=UMBRAL):
+    """Pares (i, j), i < j, con distancia de Hamming <= umbral, y sus distancias"""
+    if umbral >= 64:
+        raise ValueError("El umbral debe ser menor que 64")
+    n = len(hashes)
+    indices = np.arange(n)
+    encontrados = []
+    cantidad = elegir_bloques(umbral, n)
+    radio = umbral // cantidad
+
+    for desplazamiento, bits in bloques(cantidad):
+        claves = ((hashes >> np.uint64(desplazamiento)) & np.uint64((1 << bits) - 1)).astype(np.int64)
+        orden = np.argsort(claves, kind='stable')
+        # Tabla clave -> (primera posición en `orden`, cantidad de hashes con esa clave)
+        conteo = np.bincount(claves, minlength=1 << bits)
+        primera = np.cumsum(conteo) - conteo
+        for r in range(radio + 1):
+            for posiciones in combinations(range(bits), r):
+                buscadas = claves ^ sum(1 << p for p in posiciones)
+                desde = primera[buscadas]
+                cuantos = conteo[buscadas]
+                if not cuantos.any():
+                    continue
+                # Un candidato (i, orden[k]) por cada k en [desde[i], hasta[i])
+                i = np.repeat(indices, cuantos)
+                inicio_de_i = np.repeat(np.cumsum(cuantos) - cuantos, cuantos)
+                j = orden[np.repeat(desde, cuantos) + np.arange(len(i)) - inicio_de_i]
+                candidatos = i < j
+                i, j = i[candidatos], j[candidatos]
+                cerca = distancias(hashes[i], hashes[j]) <= umbral
+                encontrados.append(i[cerca].astype(np.int64) * n + j[cerca])
+
+    if not encontrados:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    claves = np.unique(np.concatenate(encontrados))
+    pares = np.stack([claves // n, claves % n], axis=1)
+    return pares, distancias(hashes[pares[:, 0]], hashes[pares[:, 1]])
+
+
+def agrupar(pares, n):
+    """Componentes conexas de los pares (propagando la etiqueta mínima); solo grupos de 2 o más"""
+    etiqueta = np.arange(n)
+    while True:
+        minimo = np.minimum(etiqueta[pares[:, 0]], etiqueta[pares[:, 1]])
+        nueva = etiqueta.copy()
+        np.minimum.at(nueva, pares[:, 0], minimo)
+        np.minimum.at(nueva, pares[:, 1], minimo)
+        nueva = nueva[nueva]  # Salto de punteros: acelera la convergencia en cadenas largas
+        if np.array_equal(nueva, etiqueta):
+            break
+        etiqueta = nueva
+    miembros = np.unique(pares)
+    orden = np.argsort(etiqueta[miembros], kind='stable')
+    miembros, etiquetas = miembros[orden], etiqueta[miembros][orden]
+    cortes = np.flatnonzero(np.diff(etiquetas)) + 1
+    return [grupo.tolist() for grupo in np.split(miembros, cortes)] if len(miembros) else []
+
+
+# ===================== PROGRAMA =====================
+
+def clase_de(ruta):
+    partes = ruta.split(os.sep)
+    return partes[0] if len(partes) > 1 else '.'
+
+
+def deduplicar(carpeta, umbral=UMBRAL, procesos=None, cuarentena=None, reporte=None):
+    """Busca casi duplicados en `carpeta`; devuelve las filas del reporte"""
+    inicio = time.time()
+    rutas = listar_imagenes(carpeta, excluir=cuarentena)
+    print(f"📁 {carpeta}: {len(rutas)} imágenes")
+    if not rutas:
+        return []
+
+    hashes, pixeles, tamaños, validas, recalculadas = calcular_hashes(carpeta, rutas, procesos)
+    t_hashes = time.time() - inicio
+    ilegibles = [rutas[i] for i in np.flatnonzero(~validas)]
+    indices = np.flatnonzero(validas)
+
+    t0 = time.time()
+    pares, _ = buscar_pares(hashes[indices], umbral)
+    grupos = agrupar(pares, len(indices))
+    t_busqueda = time.time() - t0
+
+    filas = []
+    for numero, grupo in enumerate(grupos, 1):
+        grupo = [int(indices[g]) for g in grupo]
+        # Se conserva la de más píxeles; a igualdad, el archivo más grande y luego el nombre
+        conservar = min(grupo, key=lambda i: (-pixeles[i], -tamaños[i], rutas[i]))
+        for i in grupo:
+            if i == conservar:
+                continue
+            filas.append({
+                'grupo': numero,
+                'conservar': rutas[conservar],
+                'duplicado': rutas[i],
+                'distancia': int(distancias(hashes[conservar], hashes[i])),
+                'clase_conservada': clase_de(rutas[conservar]),
+                'clase_duplicado': clase_de(rutas[i]),
+                'entre_clases': clase_de(rutas[conservar]) != clase_de(rutas[i]),
+            })
+
+    entre_clases = sum(f['entre_clases'] for f in filas)
+    print(f"   Hashes: {t_hashes:.1f}s ({recalculadas} calculados, {len(rutas) - recalculadas} de la caché)"
+          f" | Búsqueda: {t_busqueda:.2f}s ({len(pares)} pares a distancia <= {umbral})")
+    print(f"   Grupos: {len(grupos)} | Duplicados: {len(filas)} "
+          f"({len(filas) - entre_clases} en la misma clase, {entre_clases} entre clases)")
+    if ilegibles:
+        print(f"   ⚠️  {len(ilegibles)} archivos no se pudieron leer (p. ej. {ilegibles[0]})")
+
+    if reporte:
+        with open(reporte, 'w', newline='', encoding='utf-8') as f:
+            escritor = csv.DictWriter(f, fieldnames=['grupo', 'conservar', 'duplicado', 'distancia',
+                                                     'clase_conservada', 'clase_duplicado', 'entre_clases'])
+            escritor.writeheader()
+            escritor.writerows(filas)
+        print(f"   📄 Reporte: {reporte}")
+
+    if cuarentena:
+        for fila in filas:
+            destino = os.path.join(cuarentena, fila['duplicado'])
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            shutil.move(os.path.join(carpeta, fila['duplicado']), destino)
+        print(f"   🚚 {len(filas)} duplicados movidos a {cuarentena}")
+
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca imágenes casi duplicadas con hash perceptual")
+    parser.add_argument('carpetas', nargs='+', help="Carpetas con una subcarpeta por clase (data/, dataset/...)")
+    parser.add_argument('--umbral', type=int, default=UMBRAL,
+                        help=f"Distancia de Hamming máxima entre hashes de 64 bits (por defecto {UMBRAL})")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos para calcular hashes (todos los núcleos)")
+    parser.add_argument('--reporte', help="CSV con los duplicados (por defecto <carpeta>/duplicados.csv)")
+    parser.add_argument('--cuarentena', help="Mover los duplicados a esta carpeta (si no, solo se informa)")
+    parser.add_argument('--solo-reporte', action='store_true', help="No escribir el CSV, solo el resumen")
+    args = parser.parse_args()
+
+    total = 0
+    for carpeta in args.carpetas:
+        if not os.path.isdir(carpeta):
+            print(f"❌ No existe la carpeta: {carpeta}")
+            sys.exit(1)
+        nombre = os.path.basename(os.path.normpath(carpeta))
+        reporte = None if args.solo_reporte else (args.reporte or os.path.join(carpeta, 'duplicados.csv'))
+        if reporte and args.reporte and len(args.carpetas) > 1:
+            raiz, extension = os.path.splitext(args.reporte)
+            reporte = f"{raiz}_{nombre}{extension}"
+        cuarentena = os.path.join(args.cuarentena, nombre) if args.cuarentena and len(args.carpetas) > 1 else args.cuarentena
+        if cuarentena and os.path.abspath(cuarentena).startswith(os.path.abspath(carpeta) + os.sep):
+            print(f"⚠️  {cuarentena} está dentro de {carpeta}: el entrenamiento la leería como otra clase")
+        total += len(deduplicar(carpeta, args.umbral, args.procesos, cuarentena, reporte))
+
+    if total and not args.cuarentena:
+        print("\nPara apartarlos del entrenamiento: --cuarentena <carpeta> (se mueven, no se borran)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Mide el tiempo hasta la primera predicción de los predecir.py.
+
+Cada escenario se ejecuta varias veces en un proceso nuevo, igual que dentro de
+un bucle de shell, y se mide desde que arranca el proceso hasta que imprime el
+resultado (y hasta que termina). Escenarios por defecto:
+
+- Keras: modelo Keras, sin caché de predicciones
+- TFLite: modelo .tflite (si se exportó), sin caché de predicciones
+- Caché: la imagen ya está en la caché de predicciones
+
+Con --comando se pueden añadir otros, por ejemplo una versión anterior del
+script para comparar antes/después.
+
+Uso:
+    python herramientas/medir_arranque.py --proyecto banana --imagen foto.jpg
+    python herramientas/medir_arranque.py --proyecto frutas --imagen fruta.jpg --repeticiones 10
+    python herramientas/medir_arranque.py --proyecto banana --imagen foto.jpg \\
+        --comando "antes=python predecir_antes.py {imagen}"
+"""
+
+import argparse
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROYECTOS = {
+    'banana': {
+        'carpeta': os.path.join(RAIZ, 'Proyecto Final SIC 2025'),
+        'script': 'predecir.py',
+        'tflite': os.path.join('modelo', 'modelo_banana.tflite'),
+        'marca': 'Estado detectado',
+    },
+    'frutas': {
+        'carpeta': os.path.join(RAIZ, 'Hackathon SIC 2025'),
+        'script': os.path.join('scripts', 'predecir.py'),
+        'tflite': os.path.join('models', 'modelo_frutas.tflite'),
+        'marca': 'Predicción:',
+    },
+}
+
+REPETICIONES = 5
+
+
+def escenarios_por_defecto(proyecto):
+    """Lista de (nombre, argumentos extra para predecir.py, preparar_cache)"""
+    escenarios = [('Keras', ['--sin-tflite', '--sin-cache'], False)]
+    if os.path.exists(os.path.join(proyecto['carpeta'], proyecto['tflite'])):
+        escenarios.append(('TFLite', ['--sin-cache'], False))
+    escenarios.append(('Caché de predicciones', [], True))
+    return escenarios
+
+
+def ejecutar(comando, carpeta, marca):
+    """
+    Ejecuta el comando y devuelve (segundos hasta la línea con `marca`,
+    segundos hasta que termina). El primero es None si la marca no aparece.
+    """
+    entorno = dict(os.environ, PYTHONUNBUFFERED='1')
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(comando, cwd=carpeta, env=entorno, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True, encoding='utf-8', errors='replace')
+    hasta_prediccion = None
+    for linea in proceso.stdout:
+        if hasta_prediccion is None and marca in linea:
+            hasta_prediccion = time.perf_counter() - inicio
+    proceso.wait()
+    return hasta_prediccion, time.perf_counter() - inicio
+
+
+def medir(nombre, comando, carpeta, marca, repeticiones, preparar=False):
+    if preparar:
+        ejecutar(comando, carpeta, marca)  # Deja el resultado en la caché
+
+    hasta_prediccion, totales = [], []
+    for _ in range(repeticiones):
+        prediccion, total = ejecutar(comando, carpeta, marca)
+        if prediccion is None:
+            print(f"  {nombre}: no se obtuvo la predicción ({' '.join(comando)})")
+            return None
+        hasta_prediccion.append(prediccion)
+        totales.append(total)
+
+    resultado = {
+        'escenario': nombre,
+        'comando': comando,
+        'primera_prediccion_s': statistics.median(hasta_prediccion),
+        'primera_prediccion_min_s': min(hasta_prediccion),
+        'total_s': statistics.median(totales),
+    }
+    print(f"  {nombre}: {resultado['primera_prediccion_s']:.2f} s")
+    return resultado
+
+
+def mostrar_tabla(resultados):
+    referencia = resultados[0]['primera_prediccion_s']
+    print("\n" + "=" * 78)
+    print(f"{'Escenario':28}{'1ª predicción':>16}{'(mínimo)':>12}{'Proceso':>12}{'Mejora':>10}")
+    print("=" * 78)
+    for r in resultados:
+        print(f"{r['escenario']:28}{r['primera_prediccion_s']:>14.2f} s{r['primera_prediccion_min_s']:>10.2f} s"
+              f"{r['total_s']:>10.2f} s{referencia / r['primera_prediccion_s']:>9.1f}x")
+    print("=" * 78)
+    print("Mediana de cada escenario; 'Mejora' es relativa a la primera fila.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide el tiempo hasta la primera predicción de predecir.py")
+    parser.add_argument('--proyecto', choices=sorted(PROYECTOS), default='banana')
+    parser.add_argument('--imagen', required=True, help="Imagen a predecir en cada ejecución")
+    parser.add_argument('--carpeta', help="Carpeta del proyecto (por defecto, la de este repositorio)")
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--comando', action='append', default=[], metavar='NOMBRE=COMANDO',
+                        help="Escenario adicional; {imagen} se reemplaza por la ruta de la imagen. "
+                             "Se ejecuta en la carpeta del proyecto")
+    parser.add_argument('--solo-comandos', action='store_true', help="No medir los escenarios por defecto")
+    parser.add_argument('--salida', help="Guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    proyecto = dict(PROYECTOS[args.proyecto])
+    if args.carpeta:
+        proyecto['carpeta'] = os.path.abspath(args.carpeta)
+    imagen = os.path.abspath(args.imagen)
+    if not os.path.isfile(imagen):
+        parser.error(f"no existe la imagen '{args.imagen}'")
+
+    escenarios = []
+    for texto in args.comando:
+        nombre, _, comando = texto.partition('=')
+        if not comando:
+            parser.error(f"--comando debe tener la forma NOMBRE=COMANDO: '{texto}'")
+        partes = [imagen if p == '{imagen}' else p for p in shlex.split(comando)]
+        if partes[0] == 'python':
+            partes[0] = sys.executable
+        escenarios.append((nombre, partes, False))
+    if not args.solo_comandos:
+        base = [sys.executable, proyecto['script'], imagen]
+        escenarios += [(nombre, base + extra, preparar)
+                       for nombre, extra, preparar in escenarios_por_defecto(proyecto)]
+
+    print(f"Midiendo {args.proyecto} ({args.repeticiones} ejecuciones por escenario)...")
+    resultados = [r for r in (medir(nombre, comando, proyecto['carpeta'], proyecto['marca'],
+                                    args.repeticiones, preparar)
+                              for nombre, comando, preparar in escenarios) if r]
+    if resultados:
+        mostrar_tabla(resultados)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"Resultados en: {args.salida}")
@@ -0,0 +1,331 @@
+"""
+Benchmark de preprocesamiento e inferencia de los dos clasificadores.
+
+Funciona sin conexión y sin dataset: genera imágenes sintéticas (siempre las
+mismas, con semilla fija) y mide por separado
+
+- decodificar el JPEG y redimensionar con 'nearest' (como los predecir.py y
+  las apps), además de la función de lectura real de cada proyecto
+- la latencia y el rendimiento de predict con lotes de 1 a 256 imágenes uint8
+  (la normalización va dentro del modelo y queda incluida en este tiempo)
+
+para el modelo de plátanos (150x150) y el de frutas (224x224). Cada proyecto se
+mide en un proceso aparte, con sus propios módulos. Si no hay modelo entrenado
+(o con --modelo-aleatorio) se usa la misma arquitectura con pesos aleatorios.
+
+Los resultados se guardan en JSON; con --referencia se comparan con una corrida
+anterior y se marcan las regresiones (el código de salida es 1 si hay alguna).
+
+Uso:
+    python herramientas/medir_rendimiento.py --salida referencia.json
+    python herramientas/medir_rendimiento.py --referencia referencia.json --salida actual.json
+    python herramientas/medir_rendimiento.py --proyectos banana --lotes 1,8,64 --motor tflite
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROYECTOS = {
+    'banana': {
+        'carpeta': os.path.join(RAIZ, 'Proyecto Final SIC 2025'),
+        'modulos': os.path.join(RAIZ, 'Proyecto Final SIC 2025'),
+        'modelo': os.path.join('modelo', 'modelo_banana.h5'),
+        'tamaño': (150, 150),
+    },
+    'frutas': {
+        'carpeta': os.path.join(RAIZ, 'Hackathon SIC 2025'),
+        'modulos': os.path.join(RAIZ, 'Hackathon SIC 2025', 'scripts'),
+        'modelo': os.path.join('models', 'modelo_frutas'),
+        'tamaño': (224, 224),
+    },
+}
+
+LOTES = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+IMAGENES = 32               # Imágenes sintéticas para medir el preprocesamiento
+TAMAÑO_ORIGEN = (1280, 960)  # Ancho x alto, como una foto de celular
+REPETICIONES = 5
+TIEMPO_MINIMO = 1.0         # Segundos mínimos de medición por tamaño de lote
+SEMILLA = 0
+UMBRAL = 0.10               # Empeorar más de un 10% cuenta como regresión
+
+
+# ===================== IMÁGENES SINTÉTICAS =====================
+
+def imagenes_sinteticas(cantidad, tamaño=TAMAÑO_ORIGEN, semilla=SEMILLA):
+    """
+    JPEGs deterministas: degradado de color más ruido (el ruido puro se
+    comprime mal y se decodifica más lento que una foto real)
+    """
+    rng = np.random.default_rng(semilla)
+    ancho, alto = tamaño
+    y, x = np.mgrid[0:alto, 0:ancho].astype(np.float32)
+    imagenes = []
+    for _ in range(cantidad):
+        color = rng.uniform(0, 255, size=(2, 3)).astype(np.float32)
+        t = (x / ancho)[..., None]
+        base = color[0] * (1 - t) + color[1] * t + 20 * np.sin(y / rng.uniform(20, 80))[..., None]
+        ruido = rng.normal(0, 12, size=(alto, ancho, 3)).astype(np.float32)
+        pixeles = np.clip(base + ruido, 0, 255).astype(np.uint8)
+        salida = io.BytesIO()
+        Image.fromarray(pixeles).save(salida, format='JPEG', quality=90)
+        imagenes.append(salida.getvalue())
+    return imagenes
+
+
+# ===================== MEDICIONES (en el proceso de cada proyecto) =====================
+
+def medir_por_imagen(funcion, entradas, repeticiones):
+    """Milisegundos por imagen: mediana y mínimo de `repeticiones` pasadas sobre todas las entradas"""
+    pasadas = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for entrada in entradas:
+            funcion(entrada)
+        pasadas.append((time.perf_counter() - inicio) * 1000 / len(entradas))
+    return {'ms_por_imagen': statistics.median(pasadas), 'ms_por_imagen_min': min(pasadas)}
+
+
+def medir_preprocesamiento(contenidos, tamaño, leer_imagen, repeticiones):
+    """Cada etapa por separado, más la función de lectura del proyecto de principio a fin"""
+    def decodificar(contenido):
+        img = Image.open(io.BytesIO(contenido))
+        return img.convert('RGB') if img.mode != 'RGB' else img.copy()
+
+    decodificadas = [decodificar(c) for c in contenidos]
+
+    return {
+        'decodificar': medir_por_imagen(decodificar, contenidos, repeticiones),
+        'redimensionar_nearest': medir_por_imagen(
+            lambda img: img.resize(tamaño[::-1], Image.NEAREST), decodificadas, repeticiones),
+        'lectura_proyecto': medir_por_imagen(
+            lambda c: leer_imagen(io.BytesIO(c)), contenidos, repeticiones),
+    }
+
+
+def medir_inferencia(modelo, tamaño, lotes, repeticiones, tiempo_minimo):
+    """Latencia (mediana y p95) y rendimiento de predict_on_batch para cada tamaño de lote"""
+    rng = np.random.default_rng(SEMILLA)
+    resultados = {}
+    for tamaño_lote in lotes:
+        x = rng.integers(0, 256, (tamaño_lote, tamaño[0], tamaño[1], 3), dtype=np.uint8)
+        modelo.predict_on_batch(x)  # Calentamiento (y cambio de forma en TFLite)
+        tiempos = []
+        inicio = time.perf_counter()
+        while len(tiempos) < repeticiones or time.perf_counter() - inicio < tiempo_minimo:
+            t = time.perf_counter()
+            modelo.predict_on_batch(x)
+            tiempos.append(time.perf_counter() - t)
+        mediana = statistics.median(tiempos)
+        resultados[str(tamaño_lote)] = {
+            'latencia_ms': mediana * 1000,
+            'latencia_p95_ms': float(np.percentile(tiempos, 95)) * 1000,
+            'imagenes_por_s': tamaño_lote / mediana,
+            'llamadas': len(tiempos),
+        }
+        print(f"  lote {tamaño_lote:>4}: {mediana * 1000:9.2f} ms  {tamaño_lote / mediana:9.1f} img/s",
+              file=sys.stderr)
+    return resultados
+
+
+def crear_modelo_aleatorio(nombre):
+    """Misma arquitectura que el entrenamiento, con pesos aleatorios"""
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(SEMILLA)
+    if nombre == 'banana':
+        import entrenar
+        return entrenar.crear_modelo()
+    import modelo_frutas
+    return modelo_frutas.crear_modelo(pesos=None)[1]
+
+
+def medir_proyecto(nombre, args):
+    """Se ejecuta dentro de la carpeta del proyecto, con sus módulos en sys.path"""
+    proyecto = PROYECTOS[nombre]
+    os.chdir(proyecto['carpeta'])
+    sys.path.insert(0, proyecto['modulos'])
+    import cargador_modelo
+
+    if nombre == 'banana':
+        import predecir
+        leer_imagen = predecir.cargar_imagen
+    else:
+        import datos
+        leer_imagen = lambda archivo: datos.leer_imagen_uint8(archivo, proyecto['tamaño'])
+
+    print(f"[{nombre}] preprocesamiento ({args.imagenes} imágenes de "
+          f"{TAMAÑO_ORIGEN[0]}x{TAMAÑO_ORIGEN[1]})...", file=sys.stderr)
+    contenidos = imagenes_sinteticas(args.imagenes)
+    preprocesamiento = medir_preprocesamiento(contenidos, proyecto['tamaño'], leer_imagen, args.repeticiones)
+
+    if args.modelo_aleatorio or not os.path.exists(proyecto['modelo']):
+        modelo, origen_modelo = cargador_modelo.envolver_uint8(crear_modelo_aleatorio(nombre)), 'aleatorio'
+    else:
+        usar_tflite = args.motor == 'tflite'
+        modelo = cargador_modelo.cargar_modelo(proyecto['modelo'], usar_tflite)
+        origen_modelo = cargador_modelo.ruta_artefacto(proyecto['modelo'], usar_tflite)
+    motor = 'tflite' if isinstance(modelo, cargador_modelo.ModeloTFLite) else 'keras'
+
+    print(f"[{nombre}] inferencia ({motor}, modelo {origen_modelo})...", file=sys.stderr)
+    inferencia = medir_inferencia(modelo, proyecto['tamaño'], args.lotes, args.repeticiones, args.tiempo_minimo)
+
+    return {
+        'modelo': origen_modelo,
+        'motor': motor,
+        'tamaño': list(proyecto['tamaño']),
+        'preprocesamiento': preprocesamiento,
+        'inferencia': inferencia,
+    }
+
+
+def medir_en_subproceso(nombre, argumentos):
+    """Cada proyecto en un proceso nuevo: sus módulos se llaman igual que los del otro"""
+    salida = subprocess.run([sys.executable, os.path.abspath(__file__), '--interno', nombre] + argumentos,
+                            stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+# ===================== ENTORNO Y COMPARACIÓN =====================
+
+def describir_entorno():
+    entorno = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': Image.__version__,
+        'sistema': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+    try:
+        from importlib.metadata import version
+        entorno['tensorflow'] = version('tensorflow')
+    except Exception:
+        entorno['tensorflow'] = None
+    return entorno
+
+
+def metricas(resultados):
+    """
+    Aplana los resultados a {nombre: (valor, mayor_es_mejor)} para comparar
+    dos corridas
+    """
+    planas = {}
+    for proyecto, datos_proyecto in resultados['proyectos'].items():
+        for etapa, valores in datos_proyecto['preprocesamiento'].items():
+            planas[f"{proyecto} preprocesamiento {etapa} (ms/img)"] = (valores['ms_por_imagen'], False)
+        for lote, valores in datos_proyecto['inferencia'].items():
+            planas[f"{proyecto} lote {lote} latencia (ms)"] = (valores['latencia_ms'], False)
+            planas[f"{proyecto} lote {lote} rendimiento (img/s)"] = (valores['imagenes_por_s'], True)
+    return planas
+
+
+def comparar(actual, referencia, umbral):
+    """Muestra el cambio de cada métrica y devuelve la lista de regresiones"""
+    for proyecto in actual['proyectos']:
+        previo = referencia['proyectos'].get(proyecto)
+        if previo and (previo['modelo'], previo['motor']) != (actual['proyectos'][proyecto]['modelo'],
+                                                             actual['proyectos'][proyecto]['motor']):
+            print(f"Aviso: {proyecto} se midió con otro modelo o motor que la referencia")
+    for clave in ('procesador', 'cpus', 'tensorflow'):
+        if actual['entorno'].get(clave) != referencia['entorno'].get(clave):
+            print(f"Aviso: cambió '{clave}' ({referencia['entorno'].get(clave)} -> {actual['entorno'].get(clave)}); "
+                  f"los tiempos no son del todo comparables")
+
+    antes, ahora = metricas(referencia), metricas(actual)
+    regresiones = []
+    print("\n" + "=" * 100)
+    print(f"{'Métrica':62}{'Referencia':>12}{'Actual':>12}{'Cambio':>10}")
+    print("=" * 100)
+    for nombre, (valor, mayor_es_mejor) in ahora.items():
+        if nombre not in antes:
+            continue
+        previo = antes[nombre][0]
+        cambio = (valor - previo) / previo if previo else 0.0
+        empeora = -cambio if mayor_es_mejor else cambio
+        marca = ''
+        if empeora > umbral:
+            marca = '  REGRESIÓN'
+            regresiones.append(nombre)
+        elif empeora < -umbral:
+            marca = '  mejora'
+        print(f"{nombre:62}{previo:>12.3f}{valor:>12.3f}{cambio * 100:>+9.1f}%{marca}")
+    print("=" * 100)
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de preprocesamiento e inferencia de ambos modelos")
+    parser.add_argument('--proyectos', nargs='+', choices=sorted(PROYECTOS), default=sorted(PROYECTOS))
+    parser.add_argument('--lotes', default=','.join(map(str, LOTES)),
+                        help="Tamaños de lote separados por comas (por defecto 1 a 256)")
+    parser.add_argument('--imagenes', type=int, default=IMAGENES, help="Imágenes sintéticas para el preprocesamiento")
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--tiempo-minimo', type=float, default=TIEMPO_MINIMO,
+                        help="Segundos mínimos de medición por tamaño de lote")
+    parser.add_argument('--motor', choices=['keras', 'tflite'], default='keras',
+                        help="tflite usa el .tflite exportado (si existe y está al día)")
+    parser.add_argument('--modelo-aleatorio', action='store_true',
+                        help="Usar la arquitectura con pesos aleatorios aunque exista el modelo entrenado")
+    parser.add_argument('--salida', help="Guardar los resultados en JSON")
+    parser.add_argument('--referencia', help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument('--umbral', type=float, default=UMBRAL,
+                        help="Empeoramiento relativo que cuenta como regresión (0.10 = 10%%)")
+    parser.add_argument('--interno', choices=sorted(PROYECTOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    try:
+        args.lotes = [int(n) for n in args.lotes.split(',')]
+    except ValueError:
+        parser.error(f"--lotes debe ser una lista de enteros separados por comas: '{args.lotes}'")
+    if args.referencia and not os.path.isfile(args.referencia):
+        parser.error(f"no existe la referencia '{args.referencia}'")
+
+    if args.interno:
+        print(json.dumps(medir_proyecto(args.interno, args)))
+        sys.exit(0)
+
+    argumentos = ['--lotes', ','.join(map(str, args.lotes)), '--imagenes', str(args.imagenes),
+                  '--repeticiones', str(args.repeticiones), '--tiempo-minimo', str(args.tiempo_minimo),
+                  '--motor', args.motor] + (['--modelo-aleatorio'] if args.modelo_aleatorio else [])
+    resultados = {
+        'version': 1,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': describir_entorno(),
+        'configuracion': {
+            'lotes': args.lotes, 'imagenes': args.imagenes, 'tamaño_origen': list(TAMAÑO_ORIGEN),
+            'repeticiones': args.repeticiones, 'tiempo_minimo_s': args.tiempo_minimo, 'semilla': SEMILLA,
+        },
+        'proyectos': {nombre: medir_en_subproceso(nombre, argumentos) for nombre in args.proyectos},
+    }
+
+    for nombre, r in resultados['proyectos'].items():
+        print(f"\n{nombre} ({r['motor']}, modelo {r['modelo']}, {r['tamaño'][0]}x{r['tamaño'][1]})")
+        for etapa, valores in r['preprocesamiento'].items():
+            print(f"  {etapa:24}{valores['ms_por_imagen']:>9.3f} ms/img")
+        for lote, valores in r['inferencia'].items():
+            print(f"  lote {lote:>4}: {valores['latencia_ms']:9.2f} ms (p95 {valores['latencia_p95_ms']:.2f})"
+                  f"  {valores['imagenes_por_s']:9.1f} img/s")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados en: {args.salida}")
+
+    if args.referencia:
+        with open(args.referencia, 'r', encoding='utf-8') as f:
+            regresiones = comparar(resultados, json.load(f), args.umbral)
+        if regresiones:
+            print(f"{len(regresiones)} regresiones de más del {args.umbral * 100:.0f}%")
+            sys.exit(1)
+        print(f"Sin regresiones de más del {args.umbral * 100:.0f}%")
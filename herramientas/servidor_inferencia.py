@@ -0,0 +1,268 @@
+"""
+Servicio HTTP de inferencia para los clasificadores de plátanos y de frutas.
+
+Carga cada modelo una sola vez y agrupa las peticiones concurrentes en un único
+lote de predict (micro-lotes, con el micro_lotes.py de cada proyecto, el mismo
+que usa su app): la primera imagen que llega abre una ventana de pocos
+milisegundos y todo lo que entre en esa ventana se predice junto.
+
+Uso:
+    python herramientas/servidor_inferencia.py                      # ambos modelos
+    python herramientas/servidor_inferencia.py --modelos banana --ventana-ms 10
+
+Endpoints:
+    POST /predecir/<modelo>   cuerpo: bytes de una imagen, o JSON {"imagenes": [base64, ...]}
+    GET  /estadisticas        profundidad de cola y tamaños de lote por modelo
+    GET  /salud
+
+Prueba de carga contra un servidor ya levantado:
+    python herramientas/servidor_inferencia.py --prueba-carga banana --imagen foto.jpg
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import base64
+import argparse
+import importlib.util
+import threading
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from PIL import Image
+
+# CONFIGURACIÓN
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = "127.0.0.1"
+PUERTO = 8600
+LOTE_MAXIMO = 64
+VENTANA_MS = 5
+
+MODELOS = {
+    'banana': {
+        'ruta': os.path.join(RAIZ, "Proyecto Final SIC 2025", "modelo", "modelo_banana.h5"),
+        'modulos': os.path.join(RAIZ, "Proyecto Final SIC 2025"),
+        'tamaño': (150, 150),
+        'clases': ['inmaduro', 'maduro', 'podrido', 'sobremaduro'],
+    },
+    'frutas': {
+        'ruta': os.path.join(RAIZ, "Hackathon SIC 2025", "models", "modelo_frutas.h5"),
+        'modulos': os.path.join(RAIZ, "Hackathon SIC 2025", "scripts"),
+        'tamaño': (224, 224),
+        'etiquetas': os.path.join(RAIZ, "Hackathon SIC 2025", "models", "etiquetas.txt"),
+    },
+}
+
+
+def leer_clases(config, num_salidas):
+    """Clases del modelo: la lista fija o las de etiquetas.txt"""
+    if 'clases' in config:
+        clases = config['clases']
+    else:
+        with open(config['etiquetas'], 'r', encoding='utf-8') as f:
+            clases = [linea.strip() for linea in f if linea.strip()]
+    if len(clases) != num_salidas:
+        raise ValueError(f"El modelo tiene {num_salidas} salidas pero hay {len(clases)} clases")
+    return clases
+
+
+def modulo_proyecto(nombre, modulo):
+    """
+    Importa `modulo` de la carpeta del proyecto del modelo `nombre`. Los dos
+    proyectos tienen módulos con el mismo nombre (cargador_modelo, micro_lotes...),
+    así que cada uno se registra aparte como <modulo>_<nombre>.
+    """
+    clave = f"{modulo}_{nombre}"
+    if clave not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            clave, os.path.join(MODELOS[nombre]['modulos'], f"{modulo}.py"))
+        sys.modules[clave] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules[clave])
+    return sys.modules[clave]
+
+
+def decodificar_imagen(contenido, tamaño):
+    """
+    Bytes de imagen -> uint8 (alto, ancho, 3), igual que los predecir.py. Se
+    reduce aquí y no en el modelo para poder juntar las peticiones en un lote
+    """
+    with Image.open(io.BytesIO(contenido)) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img = img.resize((tamaño[1], tamaño[0]), Image.NEAREST)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def formatear_resultado(probabilidades, clases):
+    """Misma información que muestran los scripts de consola (valores entre 0 y 1)"""
+    indice = int(np.argmax(probabilidades))
+    top5 = np.argsort(probabilidades)[::-1][:5]
+    return {
+        'clase': clases[indice],
+        'confianza': round(float(probabilidades[indice]), 6),
+        'probabilidades': {c: round(float(p), 6) for c, p in zip(clases, probabilidades)},
+        'top5': [{'clase': clases[i], 'probabilidad': round(float(probabilidades[i]), 6)} for i in top5],
+    }
+
+
+class ManejadorPeticiones(BaseHTTPRequestHandler):
+    servicios = {}  # nombre -> {'lotes': MicroLotes, 'clases': [...], 'tamaño': (alto, ancho)}
+    peticiones = Counter()
+    bloqueo = threading.Lock()
+
+    def log_message(self, formato, *args):
+        pass  # Sin una línea por petición en la consola
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == '/salud':
+            self._responder(200, {'estado': 'ok', 'modelos': sorted(self.servicios)})
+        elif self.path == '/estadisticas':
+            self._responder(200, {
+                'peticiones': dict(self.peticiones),
+                'modelos': {n: s['lotes'].estadisticas() for n, s in self.servicios.items()},
+            })
+        else:
+            self._responder(404, {'error': 'Ruta no encontrada'})
+
+    def do_POST(self):
+        partes = self.path.strip('/').split('/')
+        if len(partes) != 2 or partes[0] != 'predecir' or partes[1] not in self.servicios:
+            self._responder(404, {'error': f"Usa /predecir/<{'|'.join(sorted(self.servicios))}>"})
+            return
+        servicio = self.servicios[partes[1]]
+        cuerpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                contenidos = [base64.b64decode(b) for b in json.loads(cuerpo)['imagenes']]
+                multiple = True
+            else:
+                contenidos = [cuerpo]
+                multiple = False
+            imagenes = np.stack([decodificar_imagen(c, servicio['tamaño']) for c in contenidos])
+        except Exception as e:
+            self._responder(400, {'error': f"No se pudo leer la imagen: {e}"})
+            return
+
+        try:
+            probabilidades = servicio['lotes'].enviar(imagenes).result()
+        except Exception as e:
+            self._responder(500, {'error': f"Error en la predicción: {e}"})
+            return
+
+        with self.bloqueo:
+            self.peticiones[partes[1]] += 1
+        resultados = [formatear_resultado(p, servicio['clases']) for p in probabilidades]
+        self._responder(200, {'resultados': resultados} if multiple else resultados[0])
+
+
+def cargar_servicio(nombre, lote_maximo, ventana_ms):
+    """
+    Carga el modelo `nombre` como lo hace su proyecto (el .tflite si existe, si
+    no el Keras envuelto para uint8) y le prepara sus micro-lotes. None si no
+    hay ningún archivo del modelo
+    """
+    config = MODELOS[nombre]
+    cargador_modelo = modulo_proyecto(nombre, 'cargador_modelo')
+    micro_lotes = modulo_proyecto(nombre, 'micro_lotes')
+    ruta = cargador_modelo.ruta_artefacto(config['ruta'])
+    if not os.path.exists(ruta):
+        print(f"Aviso: no se encontró el modelo '{nombre}' ({config['ruta']} ni su .tflite); se omite")
+        return None
+    print(f"Cargando modelo '{nombre}' desde {ruta} ...")
+    modelo = cargador_modelo.cargar_modelo(config['ruta'])
+    # Primera predicción fuera de las peticiones (construye el grafo o reserva los tensores)
+    salida = modelo.predict_on_batch(np.zeros((1,) + config['tamaño'] + (3,), dtype=np.uint8))
+    # Un .tflite exportado por el proyecto ya trae sus clases
+    clases = getattr(modelo, 'clases', None) or leer_clases(config, salida.shape[-1])
+    return {
+        # El MicroLotes de la app del proyecto; el modelo ya está cargado, así que el hilo no se suelta
+        'lotes': micro_lotes.MicroLotes(lambda: modelo, lote_maximo, ventana_ms, inactividad_s=None),
+        'clases': clases,
+        'tamaño': config['tamaño'],
+    }
+
+
+def iniciar_servidor(nombres_modelos, host=HOST, puerto=PUERTO, lote_maximo=LOTE_MAXIMO, ventana_ms=VENTANA_MS):
+    for nombre in nombres_modelos:
+        servicio = cargar_servicio(nombre, lote_maximo, ventana_ms)
+        if servicio is not None:
+            ManejadorPeticiones.servicios[nombre] = servicio
+    if not ManejadorPeticiones.servicios:
+        print(f"ERROR: no se encontró ninguno de los modelos ({', '.join(nombres_modelos)}). "
+              f"Entrena o exporta alguno, o indica su ruta con --ruta-banana / --ruta-frutas")
+        sys.exit(1)
+
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorPeticiones)
+    servidor.daemon_threads = True
+    print(f"Servidor escuchando en http://{host}:{puerto} "
+          f"(lote máximo {lote_maximo}, ventana {ventana_ms} ms)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServidor detenido")
+
+
+def prueba_carga(url, ruta_imagen, peticiones, concurrencia):
+    """Lanza peticiones concurrentes de una imagen y mide peticiones/s y latencias"""
+    with open(ruta_imagen, 'rb') as f:
+        contenido = f.read()
+
+    def una_peticion(_):
+        inicio = time.perf_counter()
+        req = urllib.request.Request(url, data=contenido, headers={'Content-Type': 'application/octet-stream'})
+        with urllib.request.urlopen(req) as resp:
+            resp.read()
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        latencias = sorted(pool.map(una_peticion, range(peticiones)))
+    total = time.perf_counter() - inicio
+
+    print(f"Peticiones: {peticiones} con concurrencia {concurrencia}")
+    print(f"Rendimiento: {peticiones / total:.1f} peticiones/s")
+    print(f"Latencia p50: {1000 * latencias[len(latencias) // 2]:.1f} ms, "
+          f"p95: {1000 * latencias[int(len(latencias) * 0.95) - 1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio HTTP de inferencia con micro-lotes")
+    parser.add_argument('--modelos', nargs='+', choices=sorted(MODELOS), default=sorted(MODELOS))
+    parser.add_argument('--ruta-banana', help="Ruta alternativa del modelo de plátanos")
+    parser.add_argument('--ruta-frutas', help="Ruta alternativa del modelo de frutas")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--lote-maximo', type=int, default=LOTE_MAXIMO, help="Máximo de imágenes por predict")
+    parser.add_argument('--ventana-ms', type=float, default=VENTANA_MS,
+                        help="Milisegundos que se esperan para juntar peticiones en un lote")
+    parser.add_argument('--prueba-carga', metavar='MODELO', help="Medir un servidor ya levantado")
+    parser.add_argument('--imagen', help="Imagen para la prueba de carga")
+    parser.add_argument('--peticiones', type=int, default=500)
+    parser.add_argument('--concurrencia', type=int, default=32)
+    args = parser.parse_args()
+
+    if args.prueba_carga:
+        if not args.imagen:
+            parser.error("--prueba-carga necesita --imagen")
+        prueba_carga(f"http://{args.host}:{args.puerto}/predecir/{args.prueba_carga}",
+                     args.imagen, args.peticiones, args.concurrencia)
+        sys.exit(0)
+
+    if args.ruta_banana:
+        MODELOS['banana']['ruta'] = args.ruta_banana
+    if args.ruta_frutas:
+        MODELOS['frutas']['ruta'] = args.ruta_frutas
+    iniciar_servidor(args.modelos, args.host, args.puerto, args.lote_maximo, args.ventana_ms)